@@ -0,0 +1,67 @@
+"""Encode/decode cost and stored size of the cache codecs.
+
+Run with: python bench_cache_codecs.py
+
+Payloads are shaped like what the app caches: a GPT response entry built
+from the fake_openai_server itinerary, a User.get_by_id record, the
+supported currency list and an exchange rate table. "legacy" is the old
+path: json.dumps on write, json.loads (with a raw string fallback) on
+read. "legacy x2" adds the extra json.dumps/json.loads callers used to do.
+Sizes are what Redis stores, before compression of large values.
+"""
+import json
+import timeit
+
+import cache_codecs
+from cache_codecs import decode_value, encode_value
+from currency_data import CURRENCY_DATA
+from fake_openai_server import build_itinerary
+
+def sample_payloads():
+    itinerary = build_itinerary([{'content': "travelers visiting Japan with the following\nDuration: 7 days"}],
+                                max_days=7)
+    codes = sorted(CURRENCY_DATA)
+    return {
+        'itinerary': {'content': itinerary, 'model': 'gpt-4'},
+        'user': {
+            'id': 1042, 'email': 'traveler@example.com', 'username': 'traveler', 'phone_number': '+60123456789',
+            'subscription_tier': 'premium', 'itineraries_generated_this_month': 3,
+            'last_reset_date': '2024-11-01T00:00:00', 'is_admin': False, 'stripe_customer_id': 'cus_Q1w2e3r4t5y6',
+            'subscription_status': 'active', 'subscription_end_date': '2025-11-01T00:00:00',
+            'preferred_currency': 'MYR'
+        },
+        'currencies': {
+            code: {'name': info.name, 'symbol': info.symbol, 'decimal_places': info.decimal_places, 'flag': info.flag}
+            for code, info in CURRENCY_DATA.items()
+        },
+        'rates': {code: str(round(1 + index * 0.731, 4)) for index, code in enumerate(codes)}
+    }
+
+def legacy_loads(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+def strategies():
+    yield 'legacy', json.dumps, legacy_loads
+    yield 'legacy x2', lambda value: json.dumps(json.dumps(value)), lambda text: json.loads(legacy_loads(text))
+    for name in cache_codecs.CODECS:
+        yield name, lambda value, name=name: encode_value(value, codec=name), decode_value
+
+def time_per_call(func, number=2000):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    print(f"{'payload':>10} {'codec':>10} {'stored B':>9} {'encode':>9} {'decode':>9}")
+    for payload_name, payload in sample_payloads().items():
+        for name, encode, decode in strategies():
+            stored = encode(payload)
+            assert decode(stored) == payload
+            encode_us = time_per_call(lambda: encode(payload))
+            decode_us = time_per_call(lambda: decode(stored))
+            print(f"{payload_name:>10} {name:>10} {len(stored.encode('utf-8')):9d} "
+                  f"{encode_us:7.1f}us {decode_us:7.1f}us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Bytes saved and CPU cost of compressing cached itineraries.
+
+Run with: python bench_compression.py [itinerary.md ...]
+
+Without arguments the canned itineraries from fake_openai_server are used.
+They are more repetitive than real model output, so pass a few exported
+itineraries for realistic ratios. Sizes are what Redis and the database
+store, including the base64 and header overhead.
+"""
+import sys
+import json
+import timeit
+
+import compression
+from fake_openai_server import build_itinerary
+
+def sample_itineraries(paths):
+    if paths:
+        samples = {}
+        for path in paths:
+            with open(path, encoding='utf-8') as itinerary_file:
+                samples[path] = itinerary_file.read()
+        return samples
+    return {
+        f"{days} days": build_itinerary([{'content': f"travelers visiting Japan with the following\nDuration: {days} days"}],
+                                        max_days=days)
+        for days in (3, 7, 14)
+    }
+
+def codecs():
+    yield 'zlib', 1
+    yield 'zlib', 6
+    yield 'zlib', 9
+    if compression.zstandard is not None:
+        yield 'zstd', 3
+        yield 'zstd', 10
+
+def time_per_call(func, number=200):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    samples = sample_itineraries(sys.argv[1:])
+    print(f"{'sample':>12} {'codec':>8} {'raw B':>8} {'stored B':>9} {'saved':>6} {'compress':>10} {'decompress':>11}")
+
+    for name, text in samples.items():
+        # Stored the way GPTModelHandler caches a response
+        payload = json.dumps({'content': text, 'model': 'gpt-4'})
+        raw = len(payload.encode('utf-8'))
+
+        for codec, level in codecs():
+            compression.COMPRESSION_LEVEL = level
+            stored = compression.compress_text(payload, threshold=0, codec=codec)
+            assert compression.decompress_text(stored) == payload
+
+            compress_us = time_per_call(lambda: compression.compress_text(payload, threshold=0, codec=codec))
+            decompress_us = time_per_call(lambda: compression.decompress_text(stored))
+            print(f"{name[-12:]:>12} {codec + '-' + str(level):>8} {raw:8d} {len(stored):9d} "
+                  f"{1 - len(stored) / raw:6.0%} {compress_us:8.1f}us {decompress_us:9.1f}us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Latency of CacheManager reads with and without the in-process L1 cache.
+
+Run with: python bench_local_cache.py
+
+Needs the Redis that CacheManager connects to (UPSTASH_REDIS_URL, or
+localhost:6380). Writes a few destination_rules:bench* keys and removes
+them afterwards. Remote Redis (Upstash) round trips are far slower than a
+local server, so the gap in production is larger than shown here.
+"""
+import sys
+import time
+import timeit
+
+from cache_manager import CacheManager
+from local_cache import LocalCache
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    local = LocalCache()
+    local.set('destination_rules:bench', {'min_budget_per_day': {'base': 150}})
+    print(f"LocalCache.get hit:       {time_per_call(lambda: local.get('destination_rules:bench'), 200000):8.2f}us")
+    print(f"LocalCache.get miss:      {time_per_call(lambda: local.get('destination_rules:none'), 200000):8.2f}us")
+
+    cache_manager = CacheManager()
+    if not cache_manager.redis or cache_manager.l1_bus is None:
+        print("Redis unavailable or L1_CACHE_ENABLED=false, skipping CacheManager timings")
+        return 1
+
+    deadline = time.monotonic() + 5
+    while not cache_manager.l1_bus.listening and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    cache_manager.set('destination_rules:bench', {'min_budget_per_day': {'base': 150}}, timeout=60)
+    cache_manager.set('destination_rules_bench', {'min_budget_per_day': {'base': 150}}, timeout=60)
+    try:
+        cache_manager.get('destination_rules:bench')
+        l1_us = time_per_call(lambda: cache_manager.get('destination_rules:bench'), 100000)
+        redis_us = time_per_call(lambda: cache_manager.get('destination_rules_bench'), 500)
+        print(f"CacheManager.get via L1:  {l1_us:8.2f}us")
+        print(f"CacheManager.get via Redis: {redis_us:6.1f}us")
+        print(cache_manager.get_l1_stats())
+    finally:
+        cache_manager.delete('destination_rules:bench')
+        cache_manager.delete('destination_rules_bench')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Microbenchmark for prompt assembly with and without compiled template variants.
+
+Run with: python bench_prompt_templates.py [iterations]
+
+"cold" clears every compiled variant before each call, which is the same
+work as rebuilding all static sections per request; "warm" reuses them.
+"""
+import sys
+import timeit
+from datetime import date
+from types import SimpleNamespace
+
+import prompt_templates
+from itinerary_generator import assemble_final_prompt, build_system_prompt
+
+def field(data, choices=None):
+    return SimpleNamespace(data=data, choices=choices)
+
+def make_form(halal_food=True, currency='MYR', days=5):
+    """A stand-in for ItineraryForm with the fields prompt assembly reads"""
+    return SimpleNamespace(
+        citizenship=field('malaysia'),
+        destinations=field('japan', [('japan', 'Japan')]),
+        start_date=field(date(2025, 3, 1)),
+        end_date=field(date(2025, 3, days)),
+        num_adults=field(2),
+        num_youth=field(1),
+        num_children=field(1),
+        num_infants=field(0),
+        budget=field(8000.0),
+        currency=field(currency),
+        include_flights=field(True),
+        include_accommodation=field(True),
+        travel_focus=field(['cultural', 'food_hunting'],
+                           [('cultural', 'Cultural'), ('food_hunting', 'Food Hunting')]),
+        accommodation_location=field('Shinjuku'),
+        accommodation_name=field('Hotel Gracery'),
+        need_guide=field(False),
+        halal_food=field(halal_food),
+        vegan_food=field(False),
+        wheelchair_accessible=field(False),
+        specific_locations=field('Tokyo Tower, Senso-ji')
+    )
+
+def build_prompts(form):
+    return build_system_prompt(form), assemble_final_prompt(form)
+
+def build_prompts_cold(form):
+    prompt_templates.cache_clear()
+    return build_prompts(form)
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    form = make_form()
+    build_prompts(form)
+
+    results = {}
+    for label, func in (('cold', build_prompts_cold), ('warm', build_prompts)):
+        best = min(timeit.repeat(lambda: func(form), number=iterations, repeat=5))
+        results[label] = best / iterations * 1e6
+        print(f"{label:>5}: {results[label]:8.1f} us per request")
+
+    print(f"speedup: {results['cold'] / results['warm']:.2f}x")
+
+if __name__ == '__main__':
+    main()
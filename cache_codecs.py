@@ -0,0 +1,112 @@
+import os
+import json
+import base64
+import logging
+from functools import partial
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Codec for new cache values: 'json' or 'msgpack' (install the msgpack extra).
+# Values are decoded by their header, so switching is safe.
+CACHE_CODEC = os.getenv('CACHE_CODEC', 'json')
+
+# Encoded values start with a control character that never begins JSON or the
+# plain text older code stored, then a type/codec id and ':'. Large values are
+# wrapped again by compression.compress_text, whose header is '\x1e'.
+MAGIC = '\x1f'
+TEXT_ID = 't1'
+HEADER_LENGTH = len(MAGIC) + 3  # magic, id, ':'
+
+class Codec:
+    """Serializer for structured cache values.
+
+    dumps must return str: the cache client decodes responses, so binary
+    formats are base64 encoded.
+    """
+
+    def __init__(self, name, codec_id, dumps, loads):
+        self.name = name
+        self.codec_id = codec_id
+        self.dumps = dumps
+        self.loads = loads
+
+    def encode(self, value):
+        return f"{MAGIC}{self.codec_id}:{self.dumps(value)}"
+
+    def decode(self, text):
+        return self.loads(text[HEADER_LENGTH:])
+
+class JsonCodec(Codec):
+    def __init__(self):
+        # json.dumps builds a new encoder per call when given options
+        super().__init__('json', 'j1', json.JSONEncoder(separators=(',', ':')).encode, json.loads)
+        self._decoder = json.JSONDecoder()
+
+    def decode(self, text):
+        # Parse in place rather than copying large values to drop the header
+        return self._decoder.raw_decode(text, HEADER_LENGTH)[0]
+
+def base64_codec(name, codec_id, dumps, loads):
+    """Codec for a serializer producing bytes"""
+    return Codec(name, codec_id,
+                 lambda value: base64.b64encode(dumps(value)).decode('ascii'),
+                 lambda text: loads(base64.b64decode(text)))
+
+CODECS = {}
+CODECS_BY_ID = {}
+
+def register_codec(codec):
+    if codec.codec_id == TEXT_ID:
+        raise ValueError(f"Codec id {TEXT_ID} is reserved for text")
+    CODECS[codec.name] = codec
+    CODECS_BY_ID[codec.codec_id] = codec
+
+# Only formats that are safe to decode from a shared store belong here. Values
+# of a retired codec (b1, marshal) fail to decode and are read as cache misses.
+register_codec(JsonCodec())
+if msgpack is not None:
+    register_codec(base64_codec('msgpack', 'm1', partial(msgpack.packb, use_bin_type=True),
+                                partial(msgpack.unpackb, raw=False, strict_map_key=False)))
+
+if CACHE_CODEC == 'msgpack' and msgpack is None:
+    raise ImportError("CACHE_CODEC=msgpack needs the msgpack package: pip install '.[msgpack]'")
+if CACHE_CODEC not in CODECS:
+    logger.warning(f"Cache codec {CACHE_CODEC} unavailable, encoding with json")
+    CACHE_CODEC = 'json'
+
+def encode_value(value, codec=None):
+    """The str stored for value.
+
+    Text is kept as-is behind a text header, so it is never mistaken for
+    JSON on the way back. Plain ints stay bare so Redis INCR still works
+    on them. Everything else goes through the codec.
+    """
+    if isinstance(value, str):
+        return f"{MAGIC}{TEXT_ID}:{value}"
+    if type(value) is int:
+        return str(value)
+    return CODECS[codec or CACHE_CODEC].encode(value)
+
+def is_encoded(text):
+    return isinstance(text, str) and text.startswith(MAGIC)
+
+def decode_value(text):
+    """Inverse of encode_value; values without a header are JSON or raw text"""
+    if is_encoded(text):
+        codec_id = text[1:3]
+        if codec_id == TEXT_ID:
+            return text[HEADER_LENGTH:]
+        codec = CODECS_BY_ID.get(codec_id)
+        if codec is None:
+            raise ValueError(f"Cached value uses unavailable codec {codec_id}")
+        return codec.decode(text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
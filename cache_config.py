@@ -3,6 +3,7 @@ import os
 from datetime import timedelta
 import logging
 import urllib.parse
+from redis_config import ROLE_CACHE, get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -114,63 +115,11 @@ def configure_redis_fallback(app):
         app.config['CACHE_TYPE'] = 'simple'
         return False
 
-# Base connection pool settings
-POOL_CONFIG = {
-    'max_connections': 10,
-    'socket_timeout': 5,
-    'socket_connect_timeout': 5,
-    'socket_keepalive': True,
-    'retry_on_timeout': True,
-    'retry_on_error': [redis.exceptions.ConnectionError],
-    'max_retries': 3,
-    'decode_responses': True
-}
-
-# SSL configuration for secure connections
-SSL_CONFIG = {
-    'ssl': True,
-    'ssl_cert_reqs': None
-}
-
 # Parse Redis URL
 REDIS_URL = parse_redis_url(os.getenv('UPSTASH_REDIS_URL', 'redis://localhost:6380'))
 
-try:
-    # Create a copy of POOL_CONFIG to avoid modifying the original
-    connection_config = POOL_CONFIG.copy()
-
-    # Update connection config with SSL settings only for secure connections
-    if REDIS_URL.startswith('rediss://'):
-        logger.info("Using SSL configuration for secure Redis connection")
-        connection_config.update(SSL_CONFIG)
-    else:
-        logger.info("Using standard Redis connection without SSL")
-
-    # Create connection pool with appropriate configuration
-    REDIS_CONNECTION_POOL = redis.ConnectionPool.from_url(
-        url=REDIS_URL,
-        **connection_config
-    )
-    logger.info("Successfully created Redis connection pool")
-
-except Exception as e:
-    logger.error(f"Failed to create Redis connection pool: {str(e)}")
-    REDIS_CONNECTION_POOL = None
-
-# Final Redis configuration
-REDIS_CONFIG = {
-    'connection_pool': REDIS_CONNECTION_POOL,
-    'decode_responses': True
-}
-
 def get_redis_client():
-    """Get a Redis client with the current configuration."""
-    try:
-        if REDIS_CONNECTION_POOL:
-            return redis.Redis(connection_pool=REDIS_CONNECTION_POOL)
-        return None
-    except Exception as e:
-        logger.error(f"Failed to create Redis client: {str(e)}")
-        return None
+    """Get the shared pooled Redis client for cached data."""
+    return get_redis(ROLE_CACHE)
 
 logger.info(f"Redis configuration initialized with URL type: {'SSL' if REDIS_URL.startswith('rediss://') else 'Standard'}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+import json
+import hashlib
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when prompt construction changes so stale cached itineraries stop matching
+CACHE_KEY_VERSION = 'v1'
+
+def _normalize(value):
+    """Recursively normalize a value so equal requests serialize identically"""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        # Multi-select values (e.g. travel focus) carry no meaningful order
+        if all(isinstance(item, str) for item in items):
+            return sorted(items)
+        return items
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value.normalize(), 'f')
+    if isinstance(value, float):
+        # Avoid 5000 vs 5000.0 producing different keys
+        return int(value) if value.is_integer() else round(value, 6)
+    return value
+
+def canonical_json(data):
+    """Serialize data to a canonical JSON string (sorted keys, no whitespace)"""
+    return json.dumps(_normalize(data), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+def _digest(payload):
+    return hashlib.sha256(canonical_json(payload).encode('utf-8')).hexdigest()
+
+def request_digest(request_data, model, temperature):
+    """Stable digest of an itinerary request, shared by every worker and restart.
+
+    request_data is the dict produced by itinerary_generator.prepare_cache_data.
+    """
+    return _digest({
+        'version': CACHE_KEY_VERSION,
+        'request': request_data,
+        'model': model,
+        'temperature': temperature
+    })
+
+def prompt_digest(system_prompt, user_prompt, model, temperature):
+    """Stable digest of a raw prompt pair, used when no request data is available"""
+    return _digest({
+        'version': CACHE_KEY_VERSION,
+        'system': system_prompt,
+        'user': user_prompt,
+        'model': model,
+        'temperature': temperature
+    })
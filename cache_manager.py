@@ -2,17 +2,59 @@
 # Part 1: Imports and Initial Setup
 import os
 import json
+import math
+import time
+import uuid
+import random
 import redis
 import logging
-import time
 from functools import wraps
-from urllib.parse import urlparse
 from datetime import datetime
+from compression import compress_text, decompress_text
+from cache_codecs import decode_value, encode_value, is_encoded
+from redis_config import ROLE_CACHE, SCAN_BATCH_SIZE, delete_matching, get_redis, reset_redis
+from local_cache import L1_CACHE_ENABLED, MISSING, InvalidationBus, LocalCache
+from single_flight import SingleFlight
 
 # Configure logger
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# get_with_fallback: seconds a value is still served after it goes stale while
+# one worker refreshes it, and how eagerly refreshes start before expiry
+# (XFetch beta; 0 disables early refresh, above 1 refreshes earlier)
+STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 300))
+XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', 1.0))
+REFRESH_LOCK_TIMEOUT = 30  # seconds a crashed refresher can block others
+COLD_MISS_WAIT = 10  # seconds to wait for another worker filling an empty key
+
+# Tag of every currency and exchange rate entry, dropped by clear_currency_cache
+CURRENCY_TAG = 'currency'
+
+# Add ARGV[2..] to every tag set in KEYS. A tag set lives as long as its
+# longest-lived member: ARGV[1] is the members' TTL in seconds, 0 for none.
+TAG_KEYS_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+for _, tag_key in ipairs(KEYS) do
+    local added = 0
+    for i = 2, #ARGV do
+        added = added + redis.call('SADD', tag_key, ARGV[i])
+    end
+    local current = redis.call('TTL', tag_key)
+    if ttl == 0 then
+        redis.call('PERSIST', tag_key)
+    elseif current == -1 then
+        -- A new set; an older set without a TTL holds a key that never expires
+        if added == redis.call('SCARD', tag_key) then
+            redis.call('EXPIRE', tag_key, ttl)
+        end
+    elseif current < ttl then
+        redis.call('EXPIRE', tag_key, ttl)
+    end
+end
+return 1
+"""
+
 def cache_enabled(func):
     """Decorator to handle cache operations safely"""
     @wraps(func)
@@ -27,107 +69,162 @@ def cache_enabled(func):
             return None
     return wrapper
 
-def parse_redis_url(url):
-    """Parse Redis URL, handling both standard Redis URLs and Upstash HTTPS URLs."""
-    try:
-        if not url:
-            logger.warning("No Redis URL provided, using default localhost")
-            return "redis://localhost:6380"
-
-        if url.startswith('https://'):
-            # Parse Upstash URL format
-            parsed = urlparse(url)
-
-            # Extract auth from netloc or username/password from path
-            if '@' in parsed.netloc:
-                auth = parsed.netloc.split('@')[0]
-                host = parsed.netloc.split('@')[1]
-            else:
-                auth = parsed.username + ':' + parsed.password if parsed.username and parsed.password else None
-                host = parsed.hostname
-
-            if not auth or not host:
-                logger.error("Invalid Upstash URL format")
-                return "redis://localhost:6380"
-
-            # Construct Redis URL
-            return f"rediss://{auth}@{host}"
-
-        elif url.startswith('redis://') or url.startswith('rediss://'):
-            return url
-
-        else:
-            logger.warning(f"Unrecognized Redis URL format: {url}")
-            return "redis://localhost:6380"
-
-    except Exception as e:
-        logger.error(f"Error parsing Redis URL: {str(e)}")
-        return "redis://localhost:6380"
-
 # Part 2: Class definition and core methods
 class CacheManager:
     _instance = None
     _connection_attempts = 0
-    MAX_RETRIES = 3
-    RETRY_DELAY = 1  # seconds
+    TAG_PREFIX = 'tag:'
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(CacheManager, cls).__new__(cls)
+            cls._instance.l1_bus = InvalidationBus(LocalCache()) if L1_CACHE_ENABLED else None
             cls._instance._init_connection()
         return cls._instance
 
     def _init_connection(self):
-        """Initialize Redis connection with retries"""
-        self.redis = None
-        retry_count = 0
-        # Get and parse Redis URL
-        redis_url = parse_redis_url(os.getenv('UPSTASH_REDIS_URL', 'redis://localhost:6380'))
-        logger.debug(f"Attempting to connect to Redis at {redis_url}")
-        connection_config = {
-            'decode_responses': True,
-            'socket_timeout': 5,
-            'socket_connect_timeout': 5,
-            'socket_keepalive': True,
-            'retry_on_timeout': True
-        }
-
-        # Add SSL config for secure connections
-        if redis_url.startswith('rediss://'):
-            connection_config.update({
-                'ssl': True,
-                'ssl_cert_reqs': None
-            })
-
-        while retry_count < self.MAX_RETRIES:
-            try:
-                self.redis = redis.from_url(
-                    url=redis_url,
-                    **connection_config
-                )
-                self.redis.ping()
-                logger.info(f"Successfully connected to Redis at {redis_url}")
-                break
-            except redis.RedisError as e:
-                retry_count += 1
-                logger.warning(f"Redis connection attempt {retry_count} failed: {str(e)}")
-                if retry_count < self.MAX_RETRIES:
-                    time.sleep(self.RETRY_DELAY)
-                else:
-                    logger.error("Failed to connect to Redis after maximum retries")
-                    self.redis = None
+        """Use the process-wide pooled Redis client for cached data"""
+        self.redis = get_redis(ROLE_CACHE)
+        self._tag_script = self.redis.register_script(TAG_KEYS_SCRIPT) if self.redis else None
+        if self.redis is None:
+            logger.error("Redis unavailable, cache disabled")
+        if self.l1_bus is not None:
+            self.l1_bus.start(self.redis)
+
+    # In-process (L1) cache in front of Redis, see local_cache.py
+    def _local_cache(self):
+        """The L1 cache, or None while it is disabled or cannot be kept coherent"""
+        if self.l1_bus is None or not self.redis or not self.l1_bus.active(self.redis):
+            return None
+        return self.l1_bus.local
+
+    def _read(self, keys, parse):
+        """{key: parse(stored value) or None}, served from the L1 cache where possible"""
+        local = self._local_cache()
+        result = {}
+        missing = []
+        for key in keys:
+            value = local.get(key) if local is not None else MISSING
+            if value is MISSING:
+                missing.append(key)
+            else:
+                result[key] = value
+        if not missing:
+            return result
+
+        cached = [key for key in missing if local is not None and local.namespace(key)]
+        if cached:
+            # One round trip for the values and the remaining TTLs the L1 copies may not outlive
+            generation = local.generation
+            pipe = self.redis.pipeline()
+            for key in missing:
+                pipe.get(key)
+            for key in cached:
+                pipe.pttl(key)
+            replies = pipe.execute()
+            raw_values, ttls = replies[:len(missing)], dict(zip(cached, replies[len(missing):]))
+        else:
+            raw_values, ttls = self.redis.mget(missing), {}
+
+        for key, raw in zip(missing, raw_values):
+            value = parse(raw) if raw else None
+            result[key] = value
+            if value is not None and key in ttls and ttls[key] != -2:
+                local.set(key, value, ttl=ttls[key] / 1000 if ttls[key] > 0 else None, generation=generation)
+        return result
+
+    def _invalidate(self, key):
+        """Drop key (or a 'prefix*') from every worker's L1 cache after writing it"""
+        if self.l1_bus is not None and (key.endswith('*') or self.l1_bus.local.namespace(key)):
+            self.l1_bus.publish(key)
+
+    def get_l1_stats(self):
+        """Hit ratio and size of this process's L1 cache, or None when disabled"""
+        if self.l1_bus is None:
+            return None
+        return dict(self.l1_bus.local.get_stats(), listening=self.l1_bus.listening)
+
+    @staticmethod
+    def _parse_value(raw):
+        value = decompress_text(raw)
+        if not value:
+            return None
+        return decode_value(value)
+
+    @staticmethod
+    def _parse_rate(raw):
+        # Rates are stored bare by set_currency_rate and encoded by set()
+        return str(decode_value(raw)) if is_encoded(raw) else raw
+
+    # Tag sets: tag:<tag> holds the keys written with that tag
+    def _tag_keys(self, pipe, keys, tags, timeout):
+        """Queue adding keys to each tag's set on pipe"""
+        tag_keys = [f"{self.TAG_PREFIX}{tag}" for tag in tags]
+        self._tag_script(keys=tag_keys, args=[int(timeout or 0), *keys], client=pipe)
+
+    @cache_enabled
+    def invalidate_tag(self, tag, batch_size=None):
+        """Delete every key written with tag; returns how many were deleted.
+
+        The tag set is renamed away first, so keys tagged meanwhile start a
+        new set instead of being lost, then drained with SSCAN and UNLINK in
+        batches. Cost depends on the tag's size, not the keyspace.
+        """
+        if not self.redis:
+            return 0
+
+        batch_size = batch_size or SCAN_BATCH_SIZE
+        draining_key = f"{self.TAG_PREFIX}{tag}:invalidating:{uuid.uuid4().hex}"
+        try:
+            self.redis.rename(f"{self.TAG_PREFIX}{tag}", draining_key)
+        except redis.ResponseError:
+            return 0  # No keys with this tag
+
+        deleted = 0
+        batch = []
+        for key in self.redis.sscan_iter(draining_key, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += self._unlink_batch(batch)
+                batch = []
+        if batch:
+            deleted += self._unlink_batch(batch)
+        self.redis.unlink(draining_key)
+        logger.info(f"Invalidated {deleted} keys tagged {tag}")
+        return deleted
+
+    def _unlink_batch(self, keys):
+        deleted = self.redis.unlink(*keys)
+        for key in keys:
+            self._invalidate(key)
+        return deleted
+
+    @cache_enabled
+    def delete_pattern(self, pattern, batch_size=None):
+        """Delete keys matching a glob pattern with SCAN; returns how many were deleted"""
+        if not self.redis:
+            return 0
+
+        deleted = delete_matching(self.redis, pattern, batch_size)
+        self._invalidate(pattern if pattern.endswith('*') else '*')
+        return deleted
 
     # Basic Cache Operations
     @cache_enabled
-    def set(self, key, value, timeout=None):
-        """Set value in cache with optional timeout"""
+    def set(self, key, value, timeout=None, tags=None):
+        """Set value in cache with optional timeout and tags (see invalidate_tag)"""
         if not self.redis:
             return None
 
-        if isinstance(value, (dict, list)):
-            value = json.dumps(value)
-
-        self.redis.set(key, value, ex=timeout)
+        value = compress_text(encode_value(value))
+        if tags:
+            pipe = self.redis.pipeline()
+            pipe.set(key, value, ex=timeout)
+            self._tag_keys(pipe, [key], tags, timeout)
+            pipe.execute()
+        else:
+            self.redis.set(key, value, ex=timeout)
+        self._invalidate(key)
 
     @cache_enabled
     def get(self, key):
@@ -135,23 +232,34 @@ class CacheManager:
         if not self.redis:
             return None
         try:
-            value = self.redis.get(key)
-            if value:
-                try:
-                    return json.loads(value)
-                except json.JSONDecodeError:
-                    return value  # Return raw string if not JSON
-            return None
+            local = self._local_cache()
+            if local is not None:
+                value = local.get(key)
+                if value is not MISSING:
+                    return value
+            return self._read([key], self._parse_value)[key]
         except Exception as e:
             logger.error(f"Error getting value from cache: {str(e)}")
             return None
 
+    @cache_enabled
+    def add(self, key, value, timeout=None):
+        """Set value only if key does not exist (SET NX); returns whether it was set"""
+        if not self.redis:
+            return None
+
+        added = bool(self.redis.set(key, compress_text(encode_value(value)), ex=timeout, nx=True))
+        if added:
+            self._invalidate(key)
+        return added
+
     @cache_enabled
     def delete(self, key):
         """Delete value from cache"""
         if not self.redis:
             return None
         self.redis.delete(key)
+        self._invalidate(key)
 
     @cache_enabled
     def exists(self, key):
@@ -165,7 +273,9 @@ class CacheManager:
         """Set expiration time for a key"""
         if not self.redis:
             return None
-        return self.redis.expire(key, seconds)
+        result = self.redis.expire(key, seconds)
+        self._invalidate(key)
+        return result
 
     @cache_enabled
     def increment(self, key):
@@ -174,6 +284,13 @@ class CacheManager:
             return None
         return self.redis.incr(key)
 
+    @cache_enabled
+    def decrement(self, key):
+        """Decrement a value in cache"""
+        if not self.redis:
+            return None
+        return self.redis.decr(key)
+
     # Part 3: Currency operations methods
     # Currency Operations
     def get_currency_rates(self):
@@ -181,10 +298,7 @@ class CacheManager:
         if not self.redis:
             return None
         try:
-            rates = self.redis.get('currency:rates')
-            if rates:
-                return json.loads(rates)
-            return None
+            return self._read(['currency:rates'], json.loads)['currency:rates']
         except Exception as e:
             logger.error(f"Error getting currency rates: {str(e)}")
             return None
@@ -196,8 +310,12 @@ class CacheManager:
         try:
             # Ensure all rates are strings
             string_rates = {k: str(v) for k, v in rates.items()}
-            self.redis.setex('currency:rates', timeout, json.dumps(string_rates))
-            self.redis.set('rates_last_update', datetime.now().isoformat())
+            pipe = self.redis.pipeline()
+            pipe.setex('currency:rates', timeout, json.dumps(string_rates))
+            pipe.set('rates_last_update', datetime.now().isoformat())
+            self._tag_keys(pipe, ['currency:rates'], [CURRENCY_TAG], timeout)
+            pipe.execute()
+            self._invalidate('currency:rates')
             return True
         except Exception as e:
             logger.error(f"Error setting currency rates: {str(e)}")
@@ -214,7 +332,11 @@ class CacheManager:
         rate_str = str(rate)
         if self.redis:
             try:
-                self.redis.set(key, rate_str, ex=timeout)
+                pipe = self.redis.pipeline()
+                pipe.set(key, rate_str, ex=timeout)
+                self._tag_keys(pipe, [key], [CURRENCY_TAG], timeout)
+                pipe.execute()
+                self._invalidate(key)
                 return True
             except Exception as e:
                 logger.error(f"Error setting currency rate: {str(e)}")
@@ -229,8 +351,7 @@ class CacheManager:
 
         key = f"rate:{from_currency}:{to_currency}"
         try:
-            value = self.redis.get(key)
-            return value  # Return raw string value
+            return self._read([key], self._parse_rate)[key]  # Return raw string value
         except Exception as e:
             logger.error(f"Error getting currency rate: {str(e)}")
             return None
@@ -256,9 +377,10 @@ class CacheManager:
         if not self.redis:
             return False
         try:
-            keys = self.redis.keys('currency:*')
-            if keys:
-                self.redis.delete(*keys)
+            deleted = self.invalidate_tag(CURRENCY_TAG)
+            if deleted is None:
+                return False
+            logger.info(f"Cleared {deleted} currency cache keys")
             return True
         except Exception as e:
             logger.error(f"Error clearing currency cache: {str(e)}")
@@ -269,12 +391,9 @@ class CacheManager:
         if not self.redis:
             return {}
         try:
-            pipeline = self.redis.pipeline()
             keys = [f"rate:{from_curr}:{to_curr}" for from_curr, to_curr in currency_pairs]
-            for key in keys:
-                pipeline.get(key)
-            values = pipeline.execute()
-            return dict(zip(currency_pairs, values))
+            values = self._read(keys, self._parse_rate)
+            return {pair: values[key] for pair, key in zip(currency_pairs, keys)}
         except Exception as e:
             logger.error(f"Error getting multiple rates: {str(e)}")
             return {}
@@ -287,30 +406,23 @@ class CacheManager:
         if not self.redis:
             return None
 
-        values = self.redis.mget(keys)
-        result = {}
-        for key, value in zip(keys, values):
-            if value:
-                try:
-                    result[key] = json.loads(value)
-                except json.JSONDecodeError:
-                    result[key] = value
-            else:
-                result[key] = None
-        return result
+        return self._read(keys, self._parse_value)
 
     @cache_enabled
-    def set_many(self, mapping, timeout=None):
-        """Set multiple key-value pairs with optional timeout"""
+    def set_many(self, mapping, timeout=None, tags=None):
+        """Set multiple key-value pairs with optional timeout and tags"""
         if not self.redis:
             return None
 
         pipeline = self.redis.pipeline()
         for key, value in mapping.items():
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            pipeline.set(key, value, ex=timeout)
-        return pipeline.execute()
+            pipeline.set(key, compress_text(encode_value(value)), ex=timeout)
+        if tags and mapping:
+            self._tag_keys(pipeline, list(mapping), tags, timeout)
+        result = pipeline.execute()[:len(mapping)]
+        for key in mapping:
+            self._invalidate(key)
+        return result
 
     # User Data Operations
     def cache_user_data(self, user_id, data, timeout=1800):
@@ -349,15 +461,73 @@ class CacheManager:
             return None
 
     # Utility Methods
-    def get_with_fallback(self, key, fallback_function, timeout=3600):
-        """Get cached value with automatic fallback"""
-        value = self.get(key)
-        if value is None:
-            value = fallback_function()
-            if value is not None:
-                self.set(key, value, timeout=timeout)
+    def get_with_fallback(self, key, fallback_function, timeout=3600, stale_ttl=None, beta=None, tags=None):
+        """Get cached value, computing it with fallback_function when needed.
+
+        The value is fresh for timeout seconds and then served stale for up
+        to stale_ttl more while one worker, holding a short Redis lock,
+        recomputes it. Before it expires the refresh also starts early with
+        a probability that rises near expiry and with how long
+        fallback_function took (XFetch), so hot keys are usually refreshed
+        before anyone sees them stale. On an empty key one worker computes
+        and the others wait for its result.
+
+        Values are stored in an envelope: read the key only through here.
+        tags are passed to set() (see invalidate_tag).
+        """
+        stale_ttl = STALE_TTL if stale_ttl is None else stale_ttl
+        beta = XFETCH_BETA if beta is None else beta
+        if not self.redis:
+            return fallback_function()
+
+        def refresh():
+            return self._compute_and_store(key, fallback_function, timeout, stale_ttl, tags)
+
+        single_flight = SingleFlight(self.redis, lock_timeout=REFRESH_LOCK_TIMEOUT,
+                                     wait_timeout=COLD_MISS_WAIT, poll_interval=0.05)
+        entry = self.get(key)
+        if not self._is_envelope(entry):
+            if entry is None:
+                return single_flight.do(key, refresh, load=lambda: self._unwrap(self.get(key)))
+            # Stored by plain set() before: serve it, but replace it with an envelope
+            entry = {'value': entry, 'computed_in': 0, 'fresh_until': 0}
+
+        if not self._should_refresh(entry, beta):
+            return entry['value']
+        try:
+            refreshed, value = single_flight.do_if_idle(key, refresh)
+        except Exception as e:
+            logger.error(f"Error refreshing {key}, serving stale value: {str(e)}")
+            return entry['value']
+        return value if refreshed and value is not None else entry['value']
+
+    def _compute_and_store(self, key, fallback_function, timeout, stale_ttl, tags=None):
+        started_at = time.time()
+        value = fallback_function()
+        finished_at = time.time()
+        if value is not None:
+            self.set(key, {
+                'value': value,
+                'computed_in': round(finished_at - started_at, 3),
+                'fresh_until': finished_at + timeout
+            }, timeout=int(timeout + stale_ttl), tags=tags)
         return value
 
+    @staticmethod
+    def _is_envelope(entry):
+        return isinstance(entry, dict) and entry.keys() == {'value', 'computed_in', 'fresh_until'}
+
+    def _unwrap(self, entry):
+        return entry['value'] if self._is_envelope(entry) else None
+
+    @staticmethod
+    def _should_refresh(entry, beta):
+        """Stale, or XFetch: now - computed_in * beta * ln(U) >= fresh_until"""
+        remaining = entry['fresh_until'] - time.time()
+        if remaining <= 0:
+            return True
+        return -entry['computed_in'] * beta * math.log(1.0 - random.random()) >= remaining
+
     def get_status(self):
         """Get Redis connection status"""
         if not self.redis:
@@ -369,6 +539,7 @@ class CacheManager:
 
     def reconnect(self):
         """Force a reconnection to Redis"""
+        reset_redis(ROLE_CACHE)
         self._init_connection()
         return self.get_status()
 
@@ -376,6 +547,7 @@ class CacheManager:
         """Clear all cache data (use with caution)"""
         if self.redis:
             self.redis.flushdb()
+            self._invalidate('*')
             logger.warning("Cache cleared entirely")
 
     def ensure_connection(self):
@@ -0,0 +1,287 @@
+"""Pre-generate itineraries for the most common trip shapes.
+
+A shape is a request as the itinerary cache sees it after normalization
+(destination, trip length, start weekday, season, budget band, travellers
+and preferences). Shapes come from recent Itinerary rows, a JSON config
+file or the built-in destination presets, and are generated slowly in the
+background so peak-hour requests for them are served from the cache:
+
+    python cache_warmer.py --source itineraries --top 20 --rate 4
+    python cache_warmer.py --source config --config warm_shapes.json --tiers gold_wanderer
+
+A config file is a list of shapes, e.g.
+    [{"destination": "japan", "days": 5, "budget": 8000, "currency": "MYR",
+      "travel_focus": ["food_hunting", "cultural"], "num_adults": 2}]
+Missing fields take the values in DEFAULT_SHAPE.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+from flask_login import login_user
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fields of a request shape not given in a config file
+DEFAULT_SHAPE = {
+    'citizenship': 'malaysia',
+    'specific_locations': '',
+    'travel_focus': ['cultural', 'food_hunting'],
+    'currency': 'MYR',
+    'include_flights': True,
+    'include_accommodation': True,
+    'num_adults': 2,
+    'num_youth': 0,
+    'num_children': 0,
+    'num_infants': 0,
+    'halal_food': False,
+    'vegan_food': False,
+    'wheelchair_accessible': False,
+    'need_guide': False,
+    'accommodation_location': '',
+    'accommodation_name': ''
+}
+
+# Trip length, lead time and weekday of preset and config shapes
+DEFAULT_DAYS = 5
+DEFAULT_LEAD_DAYS = 30
+DEFAULT_WEEKDAY = 'Saturday'
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Preset budgets are this multiple of the destination's recommended minimum
+PRESET_BUDGET_FACTOR = 1.5
+
+# One tier per model, since cached itineraries are per model
+DEFAULT_TIERS = ['solo_backpacker', 'gold_wanderer']
+
+# Warmed itineraries stay cached this long, so a nightly run covers the next day
+WARM_TTL = int(os.getenv('CACHE_WARM_TTL', 24 * 3600))
+
+def next_start_date(today, weekday=DEFAULT_WEEKDAY, lead_days=DEFAULT_LEAD_DAYS):
+    """First date on the given weekday at least lead_days from today"""
+    earliest = today + timedelta(days=lead_days)
+    return earliest + timedelta(days=(WEEKDAYS.index(weekday) - earliest.weekday()) % 7)
+
+def move_to_future(data, today):
+    """Move a past trip forward by whole 52-week years, keeping weekday, length and season"""
+    start = date.fromisoformat(data['start_date'])
+    end = date.fromisoformat(data['end_date'])
+    if start > today:
+        return data
+
+    years = (today - start).days // 364 + 1
+    shift = timedelta(weeks=52 * years)
+    return dict(data, start_date=(start + shift).isoformat(), end_date=(end + shift).isoformat())
+
+def shape_key(data):
+    """Requests with the same key are served by the same cached itinerary"""
+    from cache_keys import request_digest
+    from request_normalization import normalize_request
+    return request_digest(normalize_request(data), 'shape', 0)
+
+def top_shapes(requests, limit):
+    """The limit most frequent shapes, each represented by its first request.
+
+    Pass requests newest first so the representative is the latest one.
+    Returns (request, count) pairs, most frequent first.
+    """
+    counts = Counter()
+    representatives = {}
+    for data in requests:
+        key = shape_key(data)
+        counts[key] += 1
+        representatives.setdefault(key, data)
+    return [(representatives[key], count) for key, count in counts.most_common(limit)]
+
+def shapes_from_itineraries(limit, since_days=30, today=None):
+    """Most requested shapes among Itinerary rows created in the last since_days"""
+    from models import Itinerary
+    from itinerary_jobs import request_data_from_itinerary
+
+    today = today or date.today()
+    rows = (Itinerary.query
+            .filter(Itinerary.created_at >= datetime.utcnow() - timedelta(days=since_days))
+            .filter(Itinerary.start_date.isnot(None), Itinerary.end_date.isnot(None))
+            .order_by(Itinerary.created_at.desc())
+            .all())
+    requests = [move_to_future(request_data_from_itinerary(row), today) for row in rows]
+    return top_shapes(requests, limit)
+
+def shape_request_data(shape, today=None):
+    """Full request data for a config or preset shape"""
+    today = today or date.today()
+    shape = dict(shape)
+    shape.pop('count', None)
+    days = int(shape.pop('days', DEFAULT_DAYS))
+    weekday = shape.pop('start_weekday', DEFAULT_WEEKDAY).title()
+    lead_days = int(shape.pop('lead_days', DEFAULT_LEAD_DAYS))
+
+    if 'destination' not in shape or 'budget' not in shape:
+        raise ValueError(f"Shape needs a destination and a budget: {shape}")
+    if weekday not in WEEKDAYS:
+        raise ValueError(f"Unknown start_weekday: {weekday}")
+
+    start = date.fromisoformat(shape.pop('start_date')) if 'start_date' in shape \
+        else next_start_date(today, weekday, lead_days)
+    data = dict(DEFAULT_SHAPE, **shape)
+    data['budget'] = float(data['budget'])
+    data['start_date'] = start.isoformat()
+    data['end_date'] = (start + timedelta(days=days - 1)).isoformat()
+    return data
+
+def shapes_from_config(path, limit, today=None):
+    """Shapes listed in a JSON config file, in file order"""
+    with open(path) as config_file:
+        shapes = json.load(config_file)
+    if not isinstance(shapes, list):
+        raise ValueError(f"{path} must contain a list of shapes")
+    return [(shape_request_data(shape, today), shape.get('count', 1)) for shape in shapes[:limit]]
+
+def preset_budget(destination, days, num_adults, include_flights=True, include_accommodation=True):
+    """Comfortable budget for a preset: a multiple of the destination's minimum"""
+    from destination_validation import DESTINATION_RULES, DEFAULT_RULES
+
+    minimum = DESTINATION_RULES.get(destination, DEFAULT_RULES)['min_budget_per_day']
+    per_day = minimum['base']
+    if include_accommodation:
+        per_day += minimum['accommodation']
+    if include_flights:
+        per_day += minimum['flights']
+    return round(float(per_day) * days * num_adults * PRESET_BUDGET_FACTOR, -2)
+
+def shapes_from_presets(limit, today=None):
+    """One default shape per destination with budget rules, then the other form destinations"""
+    from forms import ItineraryForm
+    from destination_validation import DESTINATION_RULES
+
+    destinations = list(DESTINATION_RULES)
+    destinations += [value for value, _ in ItineraryForm.destinations.kwargs['choices']
+                     if value not in DESTINATION_RULES and value != 'surprise_me']
+
+    shapes = []
+    for destination in destinations[:limit]:
+        budget = preset_budget(destination, DEFAULT_DAYS, DEFAULT_SHAPE['num_adults'])
+        shapes.append((shape_request_data({'destination': destination, 'budget': budget}, today), 1))
+    return shapes
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart"""
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self.next_at = 0.0
+
+    def wait(self):
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_at = time.monotonic() + self.interval
+
+def warm_shape(app, user, data, ttl=WARM_TTL):
+    """Generate one shape into the cache; returns 'cached', 'generated' or 'degraded'"""
+    from forms import ItineraryForm
+    from itinerary_jobs import form_data_from_request
+    from itinerary_generator import (generate_itinerary, get_bucketed_itinerary, get_bucket_cache_key,
+                                     is_degraded_itinerary, cache_manager, BUCKET_CACHE_PREFIX)
+
+    with app.test_request_context():
+        login_user(user)
+        form = ItineraryForm(formdata=None, data=form_data_from_request(data), meta={'csrf': False})
+        bucket_key = f"{BUCKET_CACHE_PREFIX}{get_bucket_cache_key(form)}"
+
+        if get_bucketed_itinerary(form) is not None:
+            status = 'cached'
+        else:
+            content = generate_itinerary(form)
+            if is_degraded_itinerary(content):
+                return 'degraded'
+            status = 'generated'
+
+        # Keep warmed entries past the normal expiry so they last until peak hours
+        cache_manager.expire(bucket_key, ttl)
+        return status
+
+def warm_user(tier):
+    """Unsaved user standing in for a customer of the given tier.
+
+    It is only ever current_user on the warming thread: the model and tier
+    are passed to per-day generation threads (see generate_itinerary_parallel),
+    which never load the user from the database.
+    """
+    from models import User
+    return User(id=0, email='cache-warmer@localhost', username='cache-warmer',
+                subscription_tier=tier, subscription_status='active')
+
+def run(args):
+    from app import create_app
+    from rate_limiter import RateLimitExceeded
+
+    app = create_app()
+    with app.app_context():
+        if args.source == 'itineraries':
+            shapes = shapes_from_itineraries(args.top, args.since_days)
+        elif args.source == 'config':
+            shapes = shapes_from_config(args.config, args.top)
+        else:
+            shapes = shapes_from_presets(args.top)
+
+    logger.info(f"Warming {len(shapes)} shapes for tiers {', '.join(args.tiers)}")
+    for data, count in shapes:
+        logger.info(f"  {data['destination']} {data['start_date']}..{data['end_date']} "
+                    f"{data['budget']:.0f} {data['currency']} ({count} requests)")
+    if args.dry_run:
+        return 0
+
+    limiter = RateLimiter(args.rate)
+    results = Counter()
+    for tier in args.tiers:
+        user = warm_user(tier)
+        for data, _ in shapes:
+            limiter.wait()
+            try:
+                status = warm_shape(app, user, data, args.ttl)
+            except RateLimitExceeded as e:
+                logger.warning(f"Rate limited, skipping {data['destination']} for {tier}: {str(e)}")
+                status = 'rate_limited'
+            except Exception as e:
+                logger.error(f"Error warming {data['destination']} for {tier}: {str(e)}")
+                status = 'failed'
+
+            results[status] += 1
+            logger.info(f"{data['destination']} ({tier}): {status}")
+            if status == 'degraded':
+                # OpenAI is unavailable; do not add load while it recovers
+                logger.warning("OpenAI circuit is open, stopping cache warming")
+                return 1
+
+    logger.info(f"Cache warming finished: {dict(results)}")
+    return 1 if results['failed'] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate itineraries for popular trip shapes')
+    parser.add_argument('--source', choices=['itineraries', 'config', 'presets'], default='itineraries',
+                        help='Where request shapes come from')
+    parser.add_argument('--config', help='JSON file listing shapes (with --source config)')
+    parser.add_argument('--top', type=int, default=20, help='Number of shapes to warm')
+    parser.add_argument('--since-days', type=int, default=30,
+                        help='Look at itineraries created in this many past days')
+    parser.add_argument('--tiers', type=lambda value: value.split(','), default=DEFAULT_TIERS,
+                        help='Comma-separated subscription tiers to warm for')
+    parser.add_argument('--rate', type=float, default=float(os.getenv('CACHE_WARM_RATE', 2)),
+                        help='Generations per minute')
+    parser.add_argument('--ttl', type=int, default=WARM_TTL, help='Seconds warmed itineraries stay cached')
+    parser.add_argument('--dry-run', action='store_true', help='List the shapes without generating')
+    args = parser.parse_args()
+
+    if args.source == 'config' and not args.config:
+        parser.error('--config is required with --source config')
+
+    sys.exit(run(args))
+
+if __name__ == '__main__':
+    main()
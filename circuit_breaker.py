@@ -0,0 +1,222 @@
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit is open"""
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable. Please try again in {retry_after:.0f} seconds.")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Circuit breaker whose state is shared by all workers through Redis.
+
+    Calls are counted in short time buckets. When enough calls in the window
+    fail or take longer than slow_call_seconds, the circuit opens and every
+    worker fails fast for open_seconds. After that one caller is let through
+    as a probe (half-open): success closes the circuit, failure reopens it.
+    Without Redis the state is kept in this process.
+    """
+    KEY_PREFIX = 'circuit:'
+    BUCKETS = 6
+
+    def __init__(self, redis_client, name, failure_ratio=0.5, min_calls=10, window=60,
+                 slow_call_seconds=60, open_seconds=30, probe_timeout=180, failure_filter=None):
+        self.redis = redis_client
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self.failure_filter = failure_filter
+        self.bucket_seconds = max(1, window // self.BUCKETS)
+
+        prefix = f"{self.KEY_PREFIX}{name}:"
+        self.open_key = f"{prefix}open"
+        self.tripped_key = f"{prefix}tripped"
+        self.probe_key = f"{prefix}probe"
+        self.stats_prefix = f"{prefix}stats:"
+
+        self._local = {}
+        self._lock = threading.Lock()
+
+    # Storage: Redis when available, otherwise this process
+
+    def _local_get(self, key):
+        value, expires_at = self._local.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._local.pop(key, None)
+            return None
+        return value
+
+    def _ttl(self, key):
+        """Seconds until key expires, or None when it does not exist"""
+        if self.redis:
+            try:
+                ttl = self.redis.ttl(key)
+                return None if ttl is None or ttl == -2 else max(ttl, 0)
+            except Exception as e:
+                logger.warning(f"Circuit state unavailable, using local state: {str(e)}")
+        with self._lock:
+            if self._local_get(key) is None:
+                return None
+            expires_at = self._local[key][1]
+            return max(0, expires_at - time.monotonic()) if expires_at else 0
+
+    def _set(self, key, ex, nx=False):
+        if self.redis:
+            try:
+                return bool(self.redis.set(key, 1, ex=ex, nx=nx))
+            except Exception as e:
+                logger.warning(f"Circuit state unavailable, using local state: {str(e)}")
+        with self._lock:
+            if nx and self._local_get(key) is not None:
+                return False
+            self._local[key] = (1, time.monotonic() + ex)
+            return True
+
+    def _delete(self, *keys):
+        if self.redis:
+            try:
+                self.redis.delete(*keys)
+                return
+            except Exception as e:
+                logger.warning(f"Circuit state unavailable, using local state: {str(e)}")
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _bucket_keys(self, now=None):
+        current = int((now or time.time()) // self.bucket_seconds)
+        return [f"{self.stats_prefix}{current - offset}" for offset in range(self.BUCKETS)]
+
+    def _record(self, failed):
+        key = self._bucket_keys()[0]
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hincrby(key, 'calls', 1)
+                if failed:
+                    pipe.hincrby(key, 'failures', 1)
+                pipe.expire(key, self.window + self.bucket_seconds)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Circuit state unavailable, using local state: {str(e)}")
+        with self._lock:
+            counts = self._local_get(key) or {'calls': 0, 'failures': 0}
+            counts['calls'] += 1
+            counts['failures'] += int(failed)
+            self._local[key] = (counts, time.monotonic() + self.window + self.bucket_seconds)
+
+    def get_window_counts(self):
+        """(calls, failures) over the sliding window"""
+        keys = self._bucket_keys()
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                for key in keys:
+                    pipe.hmget(key, 'calls', 'failures')
+                rows = pipe.execute()
+                return (sum(int(calls or 0) for calls, _ in rows),
+                        sum(int(failures or 0) for _, failures in rows))
+            except Exception as e:
+                logger.warning(f"Circuit state unavailable, using local state: {str(e)}")
+        with self._lock:
+            rows = [self._local_get(key) or {'calls': 0, 'failures': 0} for key in keys]
+            return sum(row['calls'] for row in rows), sum(row['failures'] for row in rows)
+
+    # State transitions
+
+    def get_state(self):
+        """'open', 'half_open' or 'closed'"""
+        if self._ttl(self.open_key) is not None:
+            return 'open'
+        if self._ttl(self.tripped_key) is not None:
+            return 'half_open'
+        return 'closed'
+
+    def trip(self):
+        """Open the circuit for open_seconds"""
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds}s")
+        self._set(self.open_key, self.open_seconds)
+        # Remember that we tripped so the first call afterwards is a probe
+        self._set(self.tripped_key, self.open_seconds + self.window * 10)
+        self._delete(self.probe_key)
+
+    def reset(self):
+        """Close the circuit and forget past failures"""
+        self._delete(self.open_key, self.tripped_key, self.probe_key, *self._bucket_keys())
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are blocked; return True for a probe call"""
+        retry_after = self._ttl(self.open_key)
+        if retry_after is not None:
+            raise CircuitOpenError(self.name, retry_after)
+
+        if self._ttl(self.tripped_key) is not None:
+            if self._set(self.probe_key, self.probe_timeout, nx=True):
+                logger.info(f"Circuit {self.name} half-open, sending probe")
+                return True
+            raise CircuitOpenError(self.name, self.open_seconds)
+
+        return False
+
+    def on_success(self, elapsed, probe=False):
+        slow = elapsed > self.slow_call_seconds
+        if probe:
+            if slow:
+                logger.warning(f"Circuit {self.name} probe took {elapsed:.1f}s")
+                self.trip()
+            else:
+                logger.info(f"Circuit {self.name} closed after successful probe")
+                self.reset()
+            return
+
+        self._record(failed=slow)
+        if slow:
+            self._evaluate()
+
+    def on_failure(self, probe=False):
+        if probe:
+            self.trip()
+            return
+        self._record(failed=True)
+        self._evaluate()
+
+    def release_probe(self):
+        """Let another caller probe after a probe call that says nothing about health"""
+        self._delete(self.probe_key)
+
+    def _evaluate(self):
+        calls, failures = self.get_window_counts()
+        if calls >= self.min_calls and failures / calls >= self.failure_ratio:
+            logger.warning(f"Circuit {self.name}: {failures}/{calls} calls failed or were slow")
+            self.trip()
+
+    def is_failure(self, error):
+        """Whether an exception says something about the dependency's health"""
+        if isinstance(error, (ValueError, CircuitOpenError)):
+            return False
+        return self.failure_filter(error) if self.failure_filter else True
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker"""
+        probe = self.before_call()
+        started_at = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.on_failure(probe)
+            elif probe:
+                self.release_probe()
+            raise
+        self.on_success(time.monotonic() - started_at, probe)
+        return result
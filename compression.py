@@ -0,0 +1,90 @@
+import os
+import zlib
+import base64
+import logging
+from sqlalchemy.types import Text, TypeDecorator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Values at least this many bytes long are compressed; shorter ones are not worth it
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_THRESHOLD = int(os.getenv('COMPRESSION_THRESHOLD', 1024))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+
+# 'zstd' needs the zstandard package; zlib is always available
+COMPRESSION_CODEC = os.getenv('COMPRESSION_CODEC', 'zlib')
+if COMPRESSION_CODEC == 'zstd' and zstandard is None:
+    logger.warning("zstandard not installed, compressing with zlib")
+    COMPRESSION_CODEC = 'zlib'
+
+# Compressed values start with a control character that never begins JSON or
+# markdown, then a codec id. Anything else is an old, uncompressed value.
+MAGIC = '\x1e'
+CODEC_IDS = {'zlib': 'z1', 'zstd': 's1'}
+CODECS_BY_ID = {codec_id: codec for codec, codec_id in CODEC_IDS.items()}
+HEADER_LENGTH = len(MAGIC) + 3  # magic, codec id, ':'
+
+def compress_bytes(data, codec=None, level=None):
+    codec = codec or COMPRESSION_CODEC
+    level = level or COMPRESSION_LEVEL
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+def decompress_bytes(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("Value was compressed with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MAGIC) and value[1:3] in CODECS_BY_ID
+
+def compress_text(text, threshold=None, codec=None):
+    """Compress text into a str that Redis and Text columns store as-is.
+
+    Redis clients here decode responses and the database column is Text, so
+    the compressed bytes are base64 encoded behind a magic header. Values
+    below the threshold, or that would not get smaller, are returned unchanged.
+    """
+    if not COMPRESSION_ENABLED or not isinstance(text, str) or is_compressed(text):
+        return text
+
+    data = text.encode('utf-8')
+    if len(data) < (COMPRESSION_THRESHOLD if threshold is None else threshold):
+        return text
+
+    codec = codec or COMPRESSION_CODEC
+    compressed = f"{MAGIC}{CODEC_IDS[codec]}:{base64.b64encode(compress_bytes(data, codec)).decode('ascii')}"
+    return compressed if len(compressed) < len(data) else text
+
+def decompress_text(value):
+    """Inverse of compress_text; uncompressed values pass through unchanged"""
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if not is_compressed(value):
+        return value
+    codec = CODECS_BY_ID[value[1:3]]
+    return decompress_bytes(base64.b64decode(value[HEADER_LENGTH:]), codec).decode('utf-8')
+
+class CompressedText(TypeDecorator):
+    """Text column that stores large values compressed.
+
+    Rows written before compression was enabled are read back unchanged.
+    Compressed values cannot be searched with LIKE.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value) if value is not None else None
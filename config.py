@@ -124,23 +124,17 @@ class Config:
   SESSION_PERMANENT = False
   PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
 
-  # Configure Redis session if URL available
-  if REDIS_URL:
-      SESSION_REDIS = redis.from_url(
-          REDIS_URL,
-          encoding="utf-8",
-          decode_responses=True,
-          socket_timeout=5,
-          retry_on_timeout=True
-      )
-  else:
-      SESSION_TYPE = 'filesystem'
+  # Set by extensions.init_app to the pooled session client from redis_config
+  SESSION_REDIS = None
 
   # Cache configuration
   CACHE_TYPE = 'redis'
   CACHE_REDIS_URL = REDIS_URL
   CACHE_DEFAULT_TIMEOUT = 300
 
+  # Background itinerary generation (run itinerary_worker.py alongside the web server)
+  ITINERARY_JOBS_ENABLED = os.getenv('ITINERARY_JOBS_ENABLED', 'false').lower() == 'true'
+
   # OAuth configuration
   GOOGLE_OAUTH_CLIENT_ID = os.getenv('GOOGLE_OAUTH_CLIENT_ID')
   GOOGLE_OAUTH_CLIENT_SECRET = os.getenv('GOOGLE_OAUTH_CLIENT_SECRET')
@@ -0,0 +1,4 @@
+import os
+
+# Tests run without network access, so the tokenizer vocabulary may be missing
+os.environ.setdefault('TOKEN_COUNT_FALLBACK_ENABLED', 'true')
@@ -0,0 +1,107 @@
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How much of a cut-off answer is sent back to the model to continue from
+CONTINUATION_TAIL_CHARS = 2000
+
+# Longest repeated text removed where a continuation overlaps what came before
+MAX_OVERLAP_CHARS = 300
+
+CONTINUATION_PROMPT = (
+    "Your answer was cut off; its last part is shown above. Continue exactly where it stops, "
+    "mid-sentence if needed. Do not repeat anything already written and do not add an introduction."
+)
+
+def output_tail(text, max_chars=CONTINUATION_TAIL_CHARS):
+    """The end of text, starting on a line boundary when one is close"""
+    if len(text) <= max_chars:
+        return text
+    tail = text[-max_chars:]
+    newline = tail.find('\n')
+    if 0 <= newline < max_chars // 4:
+        tail = tail[newline + 1:]
+    return tail
+
+def build_continuation_messages(messages, output):
+    """The original request followed by the tail of the cut-off answer and a request to go on"""
+    return messages + [
+        {"role": "assistant", "content": output_tail(output)},
+        {"role": "user", "content": CONTINUATION_PROMPT}
+    ]
+
+def trim_overlap(previous, continuation, max_overlap=MAX_OVERLAP_CHARS):
+    """Drop the start of continuation when it repeats the end of previous"""
+    limit = min(len(previous), len(continuation), max_overlap)
+    for size in range(limit, 0, -1):
+        if previous.endswith(continuation[:size]):
+            # Short matches are usually coincidence (a space, a newline)
+            return continuation[size:] if size >= 8 else continuation
+    return continuation
+
+def merge_continuation(previous, continuation):
+    return previous + trim_overlap(previous, continuation)
+
+class ContinuationTracker:
+    """Counts how often completions hit the length limit, by tier and trip length.
+
+    For each (tier, trip days) it keeps the number of requests, the
+    continuation calls they needed and how many were still cut off after the
+    last one. Shared through Redis; without it counts are per process.
+    """
+    STATS_KEY = 'gpt_model:continuations'
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prefix(tier, trip_days):
+        return f"{tier or 'anonymous'}:{trip_days or 0}"
+
+    def record(self, tier, trip_days, continuations, truncated):
+        prefix = self._prefix(tier, trip_days)
+        counts = {'requests': 1, 'continuations': continuations, 'truncated': int(truncated)}
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                for name, value in counts.items():
+                    if value:
+                        pipe.hincrby(self.STATS_KEY, f"{prefix}:{name}", value)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Error recording continuation stats: {str(e)}")
+        with self._lock:
+            for name, value in counts.items():
+                field = f"{prefix}:{name}"
+                self._local[field] = self._local.get(field, 0) + value
+
+    def get_stats(self):
+        """{tier: {trip_days: {'requests', 'continuations', 'truncated', 'continuations_per_request'}}}"""
+        raw = None
+        if self.redis:
+            try:
+                raw = self.redis.hgetall(self.STATS_KEY)
+            except Exception as e:
+                logger.warning(f"Error reading continuation stats: {str(e)}")
+        if raw is None:
+            with self._lock:
+                raw = dict(self._local)
+
+        stats = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            tier, trip_days, name = field.rsplit(':', 2)
+            row = stats.setdefault(tier, {}).setdefault(int(trip_days),
+                                                        {'requests': 0, 'continuations': 0, 'truncated': 0})
+            row[name] = int(value)
+
+        for rows in stats.values():
+            for row in rows.values():
+                row['continuations_per_request'] = (round(row['continuations'] / row['requests'], 3)
+                                                    if row['requests'] else 0.0)
+        return stats
@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
-from cache_manager import CacheManager
+from cache_manager import CacheManager, CURRENCY_TAG
 from currency_data import (
     get_currency_info, 
     format_currency, 
@@ -24,34 +24,6 @@ currency_routes = Blueprint('currency_routes', __name__)
 # Initialize cache manager
 cache_manager = CacheManager()
 
-def get_redis():
-    """Get Redis connection using Replit secrets"""
-    try:
-        redis_url = os.environ.get('UPSTASH_REDIS_URL')
-        redis_token = os.environ.get('UPSTASH_REDIS_TOKEN')
-
-        if not redis_url or not redis_token:
-            logger.warning("Upstash Redis credentials not found")
-            return None
-
-        redis_client = redis.from_url(
-            redis_url,
-            username="default",
-            password=redis_token,
-            decode_responses=True,
-            socket_timeout=5,
-            retry_on_timeout=True
-        )
-
-        # Test connection
-        redis_client.ping()
-        logger.info("Successfully connected to Upstash Redis")
-        return redis_client
-
-    except Exception as e:
-        logger.error(f"Failed to connect to Redis: {str(e)}")
-        return None
-
 def cache_enabled(f):
     """Decorator to handle Redis cache operations"""
     @wraps(f)
@@ -76,7 +48,7 @@ def get_supported_currencies():
         cached_data = cache_manager.get(cache_key)
 
         if cached_data:
-            return jsonify(json.loads(cached_data))
+            return jsonify(cached_data)
 
         # If not in cache, prepare fresh data
         currencies = {
@@ -90,7 +62,7 @@ def get_supported_currencies():
         }
 
         # Cache for 24 hours
-        cache_manager.set(cache_key, json.dumps(currencies), timeout=86400)
+        cache_manager.set(cache_key, currencies, timeout=86400, tags=[CURRENCY_TAG])
 
         return jsonify(currencies)
 
@@ -103,29 +75,7 @@ def get_supported_currencies():
 def get_exchange_rates():
     """Get current exchange rates"""
     try:
-        redis_client = get_redis()
-        if redis_client:
-            # Try to get from Redis cache
-            cached_rates = redis_client.get('currency:rates')
-            if cached_rates:
-                return jsonify({'rates': json.loads(cached_rates)})
-
-        # If not in Redis or no Redis connection, try backup cache
-        cached_rates = cache_manager.get('exchange_rates')
-        if cached_rates:
-            return jsonify({'rates': json.loads(cached_rates)})
-
-        # If no cache hit, fetch fresh rates (implement your rate fetching logic)
-        rates = fetch_fresh_rates()  # You'll need to implement this
-
-        # Cache in Redis if available
-        if redis_client:
-            redis_client.setex('currency:rates', 3600, json.dumps(rates))  # 1 hour cache
-
-        # Backup cache
-        cache_manager.set('exchange_rates', json.dumps(rates), timeout=3600)
-
-        return jsonify({'rates': rates})
+        return jsonify({'rates': get_rates()})
 
     except Exception as e:
         logger.error(f"Error getting exchange rates: {str(e)}")
@@ -154,7 +104,7 @@ def convert_currency():
         if not rate:
             # Get fresh rate and cache it
             rate = get_conversion_rate(from_currency, to_currency)  # Implement this
-            cache_manager.set(cache_key, str(rate), timeout=3600)  # 1 hour cache
+            cache_manager.set(cache_key, str(rate), timeout=3600, tags=[CURRENCY_TAG])  # 1 hour cache
 
         converted_amount = Decimal(str(amount)) * Decimal(str(rate))
 
@@ -219,9 +169,28 @@ def fetch_fresh_rates():
         'GBP': 0.19
     }
 
+def load_fresh_rates():
+    """Fetch rates and share them with every worker"""
+    rates = fetch_fresh_rates()
+    # Written through CacheManager so every worker drops its local copy
+    cache_manager.set_currency_rates(rates, timeout=3600)  # 1 hour cache
+    return rates
+
+def get_rates():
+    """Exchange rates against MYR.
+
+    The shared table comes first. Without it the fetched rates are cached
+    with get_with_fallback, so when they expire one worker fetches again
+    while the others keep serving the last ones.
+    """
+    rates = cache_manager.get_currency_rates()
+    if rates:
+        return rates
+    return cache_manager.get_with_fallback('exchange_rates', load_fresh_rates, timeout=3600, tags=[CURRENCY_TAG])
+
 def get_conversion_rate(from_currency, to_currency):
     """Get conversion rate between two currencies"""
-    rates = fetch_fresh_rates()
+    rates = get_rates()
     if from_currency == to_currency:
         return Decimal('1.0')
 
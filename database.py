@@ -5,6 +5,7 @@ from flask_caching import Cache
 from redis_helper import get_redis_connection, init_redis_cache, clear_redis_session
 import redis
 import os
+from redis_config import get_redis_client
 import logging
 
 # Configure logging
@@ -40,16 +41,9 @@ def init_extensions(app):
             try:
                 # Configure Redis for session handling
                 app.config['SESSION_TYPE'] = 'redis'
-                app.config['SESSION_REDIS'] = redis.from_url(
-                    redis_url,
-                    encoding="utf-8",
-                    decode_responses=False,  # Important for session data
-                    socket_timeout=5,
-                    retry_on_timeout=True,
-                    socket_connect_timeout=5,
-                    socket_keepalive=True,
-                    health_check_interval=30
-                )
+                app.config['SESSION_REDIS'] = get_redis_client()
+                if app.config['SESSION_REDIS'] is None:
+                    raise redis.ConnectionError("Redis unavailable")
                 app.config['SESSION_PERMANENT'] = False
                 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
                 app.config['SESSION_KEY_PREFIX'] = 'session:'
@@ -126,37 +120,8 @@ def init_extensions(app):
         raise e
 
 def get_redis():
-    """Get Redis connection using environment variables"""
-    try:
-        redis_url = os.environ.get('UPSTASH_REDIS_URL')
-        redis_token = os.environ.get('UPSTASH_REDIS_TOKEN')
-
-        if not redis_url or not redis_token:
-            logger.warning("Redis credentials not found")
-            return None
-
-        redis_client = redis.from_url(
-            redis_url,
-            username="default",
-            password=redis_token,
-            decode_responses=False,  # Important: Set to False for session data
-            socket_timeout=5,
-            retry_on_timeout=True,
-            socket_connect_timeout=5,
-            socket_keepalive=True,
-            charset='utf-8',
-            encoding='utf-8',
-            health_check_interval=30
-        )
-
-        # Test connection
-        redis_client.ping()
-        logger.info("Successfully connected to Redis")
-        return redis_client
-
-    except Exception as e:
-        logger.error(f"Failed to connect to Redis: {str(e)}")
-        return None
+    """Get the pooled Redis client for session data"""
+    return get_redis_client()
 
 def get_db():
     """Get database instance."""
@@ -1,6 +1,6 @@
 import logging
 from decimal import Decimal
-from cache_manager import CacheManager, cache_enabled
+from cache_manager import CacheManager, CURRENCY_TAG, cache_enabled
 from currency_data import format_currency, get_currency_info
 
 # Configure logging
@@ -105,7 +105,7 @@ def convert_currency_if_needed(amount, from_currency, to_currency):
     if not rate:
         # TODO: Implement actual exchange rate API call
         rate = Decimal('1.0')  # Default to 1.0 for now
-        cache_manager.set(cache_key, str(rate), timeout=3600)  # Cache for 1 hour
+        cache_manager.set(cache_key, str(rate), timeout=3600, tags=[CURRENCY_TAG])  # Cache for 1 hour
 
     return amount * Decimal(str(rate))
 
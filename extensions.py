@@ -4,6 +4,7 @@ from flask_session import Session
 from flask_caching import Cache
 import redis
 import os
+from redis_config import ROLE_SESSION, get_redis, warm_up
 import logging
 from datetime import timedelta
 
@@ -18,37 +19,11 @@ cache = Cache()
 session = Session()
 
 def get_redis_client():
-    """Get Redis client with fallback options"""
-    try:
-        redis_url = os.getenv('UPSTASH_REDIS_URL')
-        if not redis_url:
-            logger.warning("No Redis URL provided, using filesystem session")
-            return None
-
-        # Configure Redis client with robust settings
-        client = redis.from_url(
-            redis_url,
-            decode_responses=False,  # Important for session data
-            socket_timeout=5,
-            retry_on_timeout=True,
-            retry_on_error=[redis.ConnectionError],
-            socket_connect_timeout=5,
-            socket_keepalive=True,
-            health_check_interval=30,
-            max_connections=10
-        )
-
-        # Test connection
-        client.ping()
-        logger.info("Successfully connected to Redis")
-        return client
-
-    except (redis.ConnectionError, redis.RedisError) as e:
-        logger.error(f"Redis connection error: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error connecting to Redis: {str(e)}")
+    """Get the pooled Redis client for sessions, or None to use the filesystem"""
+    if not os.getenv('UPSTASH_REDIS_URL'):
+        logger.warning("No Redis URL provided, using filesystem session")
         return None
+    return get_redis(ROLE_SESSION)
 
 def init_app(app):
     """Initialize all Flask extensions"""
@@ -75,6 +50,9 @@ def init_app(app):
         app.config['SESSION_USE_SIGNER'] = True
         app.config['SESSION_KEY_PREFIX'] = 'session:'
 
+        # Create the Redis pools now so no request pays for connection setup
+        warm_up()
+
         # Try to set up Redis
         redis_client = get_redis_client()
         if redis_client:
@@ -115,17 +93,6 @@ def init_app(app):
             logger.error(f"Redis error: {str(error)}")
             return {'error': 'Cache service temporarily unavailable'}, 503
 
-        # Session cleanup on app shutdown
-        @app.teardown_appcontext
-        def cleanup_session(exception=None):
-            try:
-                if 'redis' in app.config.get('SESSION_TYPE', ''):
-                    redis_client = app.config.get('SESSION_REDIS')
-                    if redis_client:
-                        redis_client.close()
-            except Exception as e:
-                logger.error(f"Error during session cleanup: {str(e)}")
-
         logger.info("Successfully initialized all extensions")
         return True
 
@@ -0,0 +1,236 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves canned itineraries with configurable latency, token rate, error
+injection and streaming, so load and tail-latency tests run offline and cost
+nothing. Point the app at it with:
+
+    python fake_openai_server.py --port 8001 --latency lognormal:2,0.5 --token-rate 40
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=sk-fake-local-testing-key python main.py
+
+Settings can be changed while running with POST /fake/config.
+"""
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'latency': 'fixed:0.5',       # time to first token: fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA
+    'token_rate': 50.0,           # completion tokens per second, 0 for instant
+    'error_rate': 0.0,            # fraction of requests that fail
+    'error_status': 500,          # HTTP status for injected errors (429, 500, 503, ...)
+    'retry_after': 1,             # Retry-After seconds sent with 429/503
+    'max_days': 14                # cap on days in the canned itinerary
+}
+
+ERROR_TYPES = {
+    429: ('rate_limit_exceeded', 'Rate limit reached for requests'),
+    500: ('server_error', 'The server had an error while processing your request'),
+    503: ('server_error', 'The engine is currently overloaded, please try again later')
+}
+
+DURATION_PATTERN = re.compile(r'Duration:\s*(\d+)\s*days?', re.IGNORECASE)
+DESTINATION_PATTERN = re.compile(r'travelers visiting (.+?) with the following', re.IGNORECASE)
+TOKEN_PATTERN = re.compile(r'\s*\S+|\s+$')
+
+def sample_latency(spec, rng):
+    """Draw a latency in seconds from a distribution spec"""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    if kind == 'fixed':
+        return values[0]
+    if kind == 'uniform':
+        return rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        median, sigma = values
+        return rng.lognormvariate(0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def split_tokens(text):
+    """Approximate tokens as whitespace-delimited words"""
+    return TOKEN_PATTERN.findall(text)
+
+def count_prompt_tokens(messages):
+    return sum(len(message.get('content') or '') // 4 + 3 for message in messages) + 3
+
+def build_itinerary(messages, max_days):
+    """Canned itinerary shaped like a real one for the prompt's trip length"""
+    prompt = '\n'.join(message.get('content') or '' for message in messages)
+    duration = DURATION_PATTERN.search(prompt)
+    days = min(int(duration.group(1)) if duration else 3, max_days)
+    destination = DESTINATION_PATTERN.search(prompt)
+    destination = destination.group(1) if destination else 'your destination'
+
+    sections = [f"# {days}-Day Itinerary for {destination}\n\n"
+                "## Trip Overview\nA balanced plan mixing landmarks, local food and rest time.\n"]
+    for day in range(1, days + 1):
+        sections.append(
+            f"\n## Day {day}\n"
+            "### Early Morning (06:00-09:00)\n"
+            "* 07:00 Breakfast at [Local Market](https://www.google.com/maps/search/?api=1&query=Local%20Market) - 25.00\n"
+            "### Morning Activities (09:00-12:00)\n"
+            "* 09:30 Visit [City Museum](https://www.google.com/maps/search/?api=1&query=City%20Museum) - 40.00, 20 min by metro\n"
+            "### Afternoon Activities (12:00-17:00)\n"
+            "* 12:30 Lunch at [Old Town Food Street](https://www.google.com/maps/search/?api=1&query=Old%20Town%20Food%20Street) - 35.00\n"
+            "* 14:00 Walk through [Riverside Park](https://www.google.com/maps/search/?api=1&query=Riverside%20Park) - free\n"
+            "### Evening Activities (17:00-22:00)\n"
+            "* 19:00 Dinner at [Harbour View Restaurant](https://www.google.com/maps/search/?api=1&query=Harbour%20View%20Restaurant) - 80.00\n"
+        )
+    sections.append("\n## Cost Summary\nEstimated total within the requested budget, taxes included.\n")
+    return ''.join(sections)
+
+def create_app(settings=None, seed=None):
+    """Build the fake API app"""
+    app = Flask(__name__)
+    config = dict(DEFAULT_SETTINGS, **(settings or {}))
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    def draw(func, *args):
+        with rng_lock:
+            return func(*args)
+
+    def error_response():
+        status = int(config['error_status'])
+        error_type, message = ERROR_TYPES.get(status, ('server_error', 'Injected error'))
+        response = jsonify({'error': {'message': message, 'type': error_type, 'param': None, 'code': error_type}})
+        response.status_code = status
+        if status in (429, 503):
+            response.headers['Retry-After'] = str(config['retry_after'])
+        return response
+
+    def token_delay():
+        rate = float(config['token_rate'])
+        return 1.0 / rate if rate > 0 else 0
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        body = request.get_json(force=True)
+        messages = body.get('messages', [])
+        model = body.get('model', 'gpt-3.5-turbo')
+        max_tokens = body.get('max_tokens') or 4096
+
+        if draw(rng.random) < float(config['error_rate']):
+            logger.info(f"Injecting {config['error_status']} error")
+            return error_response()
+
+        tokens = split_tokens(build_itinerary(messages, int(config['max_days'])))
+        finish_reason = 'stop'
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = 'length'
+
+        usage = {
+            'prompt_tokens': count_prompt_tokens(messages),
+            'completion_tokens': len(tokens),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        first_token_delay = draw(sample_latency, config['latency'], rng)
+        per_token = token_delay()
+
+        if not body.get('stream'):
+            time.sleep(first_token_delay + per_token * len(tokens))
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': finish_reason
+                }],
+                'usage': usage
+            })
+
+        include_usage = (body.get('stream_options') or {}).get('include_usage')
+
+        def chunk(delta, finish=None, chunk_usage=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [] if chunk_usage else [{'index': 0, 'delta': delta, 'finish_reason': finish}]
+            }
+            if include_usage:
+                payload['usage'] = chunk_usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        def generate():
+            time.sleep(first_token_delay)
+            yield chunk({'role': 'assistant', 'content': ''})
+            for token in tokens:
+                yield chunk({'content': token})
+                if per_token:
+                    time.sleep(per_token)
+            yield chunk({}, finish=finish_reason)
+            if include_usage:
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+    @app.route('/v1/models', methods=['GET'])
+    def list_models():
+        return jsonify({'object': 'list', 'data': [
+            {'id': model, 'object': 'model', 'owned_by': 'fake'} for model in ('gpt-3.5-turbo', 'gpt-4')
+        ]})
+
+    @app.route('/fake/config', methods=['GET', 'POST'])
+    def fake_config():
+        """Read or update the fake server's behaviour while it runs"""
+        if request.method == 'POST':
+            updates = request.get_json(force=True) or {}
+            unknown = set(updates) - set(DEFAULT_SETTINGS)
+            if unknown:
+                return jsonify({'error': f"Unknown settings: {', '.join(sorted(unknown))}"}), 400
+            if 'latency' in updates:
+                try:
+                    sample_latency(updates['latency'], random.Random())
+                except (ValueError, IndexError) as e:
+                    return jsonify({'error': str(e)}), 400
+            config.update(updates)
+            logger.info(f"Fake OpenAI settings updated: {updates}")
+        return jsonify(config)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake OpenAI chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', default=DEFAULT_SETTINGS['latency'],
+                        help='Time to first token: fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--token-rate', type=float, default=DEFAULT_SETTINGS['token_rate'],
+                        help='Completion tokens per second (0 for instant)')
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_SETTINGS['error_rate'],
+                        help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=DEFAULT_SETTINGS['error_status'],
+                        help='HTTP status of injected errors')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible latency and errors')
+    args = parser.parse_args()
+
+    app = create_app({
+        'latency': args.latency,
+        'token_rate': args.token_rate,
+        'error_rate': args.error_rate,
+        'error_status': args.error_status
+    }, seed=args.seed)
+    logger.info(f"Fake OpenAI API listening on http://{args.host}:{args.port}/v1")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
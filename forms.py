@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, IntegerField, BooleanField, DateField, SelectField, SelectMultipleField, widgets
+from wtforms import StringField, FloatField, IntegerField, BooleanField, DateField, SelectField, SelectMultipleField, TextAreaField, widgets
 from wtforms.validators import DataRequired, NumberRange, Length, ValidationError, Email, Regexp
 from currency_data import CURRENCY_DATA, get_currency_display_name
 
@@ -170,4 +170,10 @@ class ItineraryForm(FlaskForm):
     def get_budget_display(self):
         """Get the budget amount with currency display"""
         from currency_data import format_currency
-        return format_currency(self.budget.data, self.currency.data)
\ No newline at end of file
+        return format_currency(self.budget.data, self.currency.data)
+
+
+class DayRevisionForm(FlaskForm):
+    change_request = TextAreaField('What should change?',
+                                   validators=[DataRequired(),
+                                               Length(max=500)])
@@ -2,41 +2,39 @@ import os
 import openai
 import logging
 from datetime import datetime, timedelta
-from functools import wraps
 import time
 from flask_login import current_user
-from openai import OpenAI
-import redis
 import json
+from cache_keys import prompt_digest
+from redis_config import ROLE_CACHE, ROLE_RATE_LIMIT, get_redis
+from single_flight import SingleFlight
+from token_budget import CONTEXT_WINDOWS, count_message_tokens, count_tokens, completion_budget
+from rate_limiter import TokenBucketRateLimiter, RateLimitExceeded
+from openai_client import get_openai_client, get_request_timeout, last_connection_timing
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from hedging import HedgePolicy, HedgeCancelled, hedged_call
+from retry_policy import RetryPolicy, UpstreamAuthError, classify_error
+from compression import compress_text, decompress_text
+from continuation import ContinuationTracker, build_continuation_messages, merge_continuation, trim_overlap, MAX_OVERLAP_CHARS
+from telemetry import CallMetrics, Telemetry
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def retry_with_backoff(func):
-    """Decorator for exponential backoff retry logic"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        max_retries = 3
-        retry_delay = 1  # initial delay in seconds
-
-        for attempt in range(max_retries):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                if attempt == max_retries - 1:  # Last attempt
-                    raise e
-
-                wait_time = (2 ** attempt) * retry_delay
-                logger.warning(f"Attempt {attempt + 1} failed. Waiting {wait_time} seconds...")
-                time.sleep(wait_time)
-        return None
-    return wrapper
-
 class GPTModelHandler:
-    # Rate limiting settings
+    # Rate limiting settings (requests per minute, shared by all workers)
     MAX_CALLS_PER_MINUTE = 50
-    call_history = []
-    _redis_client = None
+    MODEL_RATE_LIMITS = {
+        'gpt-3.5-turbo': 50,
+        'gpt-4': 30
+    }
+    # Per-tier share of each model's limit so free users cannot starve paid tiers
+    TIER_RATE_LIMITS = {
+        ('gpt-3.5-turbo', 'solo_backpacker'): 30,
+        ('gpt-3.5-turbo', 'tandem_trekker'): 40
+    }
+    MAX_RATE_LIMIT_WAIT = 30  # seconds a request may queue for a token
+    _rate_limiter = None
 
     # Model mapping based on subscription tiers
     MODEL_MAPPING = {
@@ -47,46 +45,139 @@ class GPTModelHandler:
     }
 
     # Token limits per model
-    TOKEN_LIMITS = {
-        'gpt-3.5-turbo': 16385,
-        'gpt-4': 8192
-    }
+    TOKEN_LIMITS = CONTEXT_WINDOWS
+
+    # Models that accept response_format={'type': 'json_object'}
+    JSON_MODE_MODELS = {'gpt-3.5-turbo'}
 
     # Cache configuration
     CACHE_EXPIRY = 3600  # 1 hour in seconds
+    TRUNCATED_CACHE_EXPIRY = 60  # still cut off after MAX_CONTINUATIONS: long enough for single-flight waiters
     CACHE_PREFIX = 'gpt_model:'
+    CACHE_STATS_KEY = 'gpt_model:stats'
+
+    # Single-flight settings for identical concurrent requests
+    SINGLE_FLIGHT_LOCK_TIMEOUT = 180  # seconds, longer than a slow gpt-4 call
+    SINGLE_FLIGHT_WAIT_TIMEOUT = 120  # seconds before waiters call the API themselves
+    _single_flight = None
+
+    # Circuit breaker around the OpenAI API, shared by all workers
+    CIRCUIT_FAILURE_RATIO = 0.5  # open when half the calls in the window fail or are slow
+    CIRCUIT_MIN_CALLS = 10
+    CIRCUIT_WINDOW = 60  # seconds
+    CIRCUIT_SLOW_CALL_SECONDS = 90
+    CIRCUIT_OPEN_SECONDS = 30
+    _circuit_breaker = None
+
+    # Hedging: if the primary model has no first token after this percentile of
+    # recent first-token latency, race a request on the hedge model against it
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 0.95))
+    HEDGE_MODELS = {
+        'gpt-4': 'gpt-3.5-turbo',
+        'gpt-3.5-turbo': 'gpt-3.5-turbo'  # no faster model: a duplicate request still cuts the tail
+    }
+    HEDGE_DEFAULT_DELAYS = {  # seconds, until enough latency samples exist
+        'gpt-4': 20,
+        'gpt-3.5-turbo': 8
+    }
+    # Fraction of each tier's requests per hour that may be hedged
+    HEDGE_TIER_BUDGETS = {
+        'tandem_trekker': 0.05,
+        'gold_wanderer': 0.1,
+        'business': 0.1
+    }
+    _hedge_policy = None
+
+    # Retries of failed API calls (see retry_policy.RetryPolicy)
+    RETRY_MAX_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 1.0  # seconds, doubled per attempt with full jitter
+    RETRY_MAX_DELAY = 20.0
+    RETRY_BUDGET_RATIO = 0.1  # retries per request across all workers, on top of a small floor
+    REQUEST_DEADLINE = 150  # seconds for all attempts of one generation
+    _retry_policy = None
+
+    # Follow-up requests when a completion stops at max_tokens
+    MAX_CONTINUATIONS = int(os.getenv('MAX_CONTINUATIONS', 2))
+    _continuation_tracker = None
+
+    # Latency, token and cost histograms (see telemetry.Telemetry)
+    _telemetry = None
 
     @classmethod
     def get_redis(cls):
-        """Get or create Redis connection using Replit secrets"""
-        if cls._redis_client is None:
-            try:
-                redis_url = os.environ.get('UPSTASH_REDIS_URL')
-                redis_token = os.environ.get('UPSTASH_REDIS_TOKEN')
-
-                if not redis_url or not redis_token:
-                    logger.warning("Upstash Redis credentials not found")
-                    return None
-
-                cls._redis_client = redis.from_url(
-                    redis_url,
-                    username="default",
-                    password=redis_token,
-                    decode_responses=True,
-                    socket_timeout=5,
-                    retry_on_timeout=True
-                )
-                # Test connection
-                cls._redis_client.ping()
-                logger.info("Successfully connected to Upstash Redis")
-            except Exception as e:
-                logger.error(f"Failed to connect to Redis: {str(e)}")
-                cls._redis_client = None
+        """Get the shared pooled Redis client for cached responses and coordination state"""
+        return get_redis(ROLE_CACHE)
+
+    @classmethod
+    def get_single_flight(cls):
+        """Get the single-flight coordinator for identical in-flight requests"""
+        if cls._single_flight is None or cls._single_flight.redis is not cls.get_redis():
+            cls._single_flight = SingleFlight(
+                cls.get_redis(),
+                lock_timeout=cls.SINGLE_FLIGHT_LOCK_TIMEOUT,
+                wait_timeout=cls.SINGLE_FLIGHT_WAIT_TIMEOUT
+            )
+        return cls._single_flight
+
+    @classmethod
+    def get_circuit_breaker(cls):
+        """Get the circuit breaker guarding OpenAI calls"""
+        if cls._circuit_breaker is None or cls._circuit_breaker.redis is not cls.get_redis():
+            cls._circuit_breaker = CircuitBreaker(
+                cls.get_redis(),
+                'openai',
+                failure_ratio=cls.CIRCUIT_FAILURE_RATIO,
+                min_calls=cls.CIRCUIT_MIN_CALLS,
+                window=cls.CIRCUIT_WINDOW,
+                slow_call_seconds=cls.CIRCUIT_SLOW_CALL_SECONDS,
+                open_seconds=cls.CIRCUIT_OPEN_SECONDS,
+                probe_timeout=cls.SINGLE_FLIGHT_LOCK_TIMEOUT,
+                # Bad requests and invalid keys say nothing about OpenAI's health
+                failure_filter=lambda error: classify_error(error).retryable
+            )
+        return cls._circuit_breaker
 
-        return cls._redis_client
+    @classmethod
+    def get_retry_policy(cls):
+        """Get the retry policy shared across workers"""
+        if cls._retry_policy is None or cls._retry_policy.redis is not cls.get_redis():
+            cls._retry_policy = RetryPolicy(
+                cls.get_redis(),
+                max_attempts=cls.RETRY_MAX_ATTEMPTS,
+                base_delay=cls.RETRY_BASE_DELAY,
+                max_delay=cls.RETRY_MAX_DELAY,
+                budget_ratio=cls.RETRY_BUDGET_RATIO
+            )
+        return cls._retry_policy
+
+    @classmethod
+    def get_hedge_policy(cls):
+        """Get the hedging policy shared across workers"""
+        if cls._hedge_policy is None or cls._hedge_policy.redis is not cls.get_redis():
+            cls._hedge_policy = HedgePolicy(
+                cls.get_redis(),
+                percentile=cls.HEDGE_PERCENTILE,
+                default_delays=cls.HEDGE_DEFAULT_DELAYS,
+                tier_budgets=cls.HEDGE_TIER_BUDGETS
+            )
+        return cls._hedge_policy
 
     @classmethod
-    def get_cached_response(cls, prompt_hash):
+    def get_continuation_tracker(cls):
+        """Get the shared counters of continuations per tier and trip length"""
+        if cls._continuation_tracker is None or cls._continuation_tracker.redis is not cls.get_redis():
+            cls._continuation_tracker = ContinuationTracker(cls.get_redis())
+        return cls._continuation_tracker
+
+    @classmethod
+    def get_telemetry(cls):
+        """Get the shared latency, token and cost histograms"""
+        if cls._telemetry is None or cls._telemetry.redis is not cls.get_redis():
+            cls._telemetry = Telemetry(cls.get_redis())
+        return cls._telemetry
+
+    @classmethod
+    def get_cached_response(cls, prompt_hash, record_stats=True):
         """Get cached response from Redis"""
         try:
             redis_client = cls.get_redis()
@@ -96,9 +187,13 @@ class GPTModelHandler:
             cache_key = f"{cls.CACHE_PREFIX}{prompt_hash}"
             cached_data = redis_client.get(cache_key)
 
+            # Track hit ratio across all workers
+            if record_stats:
+                redis_client.hincrby(cls.CACHE_STATS_KEY, 'hits' if cached_data else 'misses', 1)
+
             if cached_data:
                 logger.info("Cache hit for prompt")
-                return json.loads(cached_data)
+                return json.loads(decompress_text(cached_data))
 
         except Exception as e:
             logger.warning(f"Error getting cached response: {str(e)}")
@@ -106,8 +201,30 @@ class GPTModelHandler:
         return None
 
     @classmethod
-    def cache_response(cls, prompt_hash, response_data):
-        """Cache response in Redis"""
+    def get_cache_stats(cls):
+        """Get shared cache hit/miss counters and the resulting hit ratio"""
+        try:
+            redis_client = cls.get_redis()
+            if not redis_client:
+                return None
+
+            stats = redis_client.hgetall(cls.CACHE_STATS_KEY)
+            hits = int(stats.get('hits', 0))
+            misses = int(stats.get('misses', 0))
+            total = hits + misses
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / total, 4) if total else 0.0
+            }
+
+        except Exception as e:
+            logger.warning(f"Error getting cache stats: {str(e)}")
+            return None
+
+    @classmethod
+    def cache_response(cls, prompt_hash, response_data, truncated=False):
+        """Cache response in Redis; a truncated response only briefly"""
         try:
             redis_client = cls.get_redis()
             if not redis_client:
@@ -116,8 +233,8 @@ class GPTModelHandler:
             cache_key = f"{cls.CACHE_PREFIX}{prompt_hash}"
             redis_client.setex(
                 cache_key,
-                cls.CACHE_EXPIRY,
-                json.dumps(response_data)
+                cls.TRUNCATED_CACHE_EXPIRY if truncated else cls.CACHE_EXPIRY,
+                compress_text(json.dumps(response_data))
             )
             logger.info("Successfully cached response")
 
@@ -141,90 +258,468 @@ class GPTModelHandler:
         )
 
     @classmethod
-    def _rate_limit_check(cls):
-        """Check if we've exceeded our rate limit"""
-        now = datetime.now()
-        cls.call_history = [t for t in cls.call_history if (now - t).seconds < 60]
-        if len(cls.call_history) >= cls.MAX_CALLS_PER_MINUTE:
-            return False
-        cls.call_history.append(now)
-        return True
+    def get_user_context(cls):
+        """(model, tier, user_id) of the current user.
+
+        Resolve it on the request thread and pass it to generate_itinerary
+        from worker threads, which have no current_user of their own.
+        """
+        if not current_user.is_authenticated:
+            return cls.get_model_for_user(), None, None
+        return cls.get_model_for_user(), current_user.subscription_tier, current_user.id
+
+    @classmethod
+    def get_rate_limiter(cls):
+        """Get the Redis-backed token bucket limiter shared across workers"""
+        redis_client = get_redis(ROLE_RATE_LIMIT)
+        if cls._rate_limiter is None or cls._rate_limiter.redis is not redis_client:
+            cls._rate_limiter = TokenBucketRateLimiter(
+                redis_client,
+                cls.MODEL_RATE_LIMITS,
+                cls.TIER_RATE_LIMITS,
+                default_limit=cls.MAX_CALLS_PER_MINUTE
+            )
+        return cls._rate_limiter
+
+    @classmethod
+    def _rate_limit_check(cls, model, tier):
+        """Wait for a rate limit token, raising RateLimitExceeded if the queue is too long"""
+        waited = cls.get_rate_limiter().wait(model, tier, max_wait=cls.MAX_RATE_LIMIT_WAIT)
+        if waited:
+            logger.info(f"Waited {waited:.2f}s for {model} rate limit token")
 
     @classmethod
     def validate_api_key(cls):
-        """Validate OpenAI API key format"""
+        """Validate OpenAI API key format; a bad key is an auth error, not a bad request"""
         api_key = os.getenv('OPENAI_API_KEY')
         if not isinstance(api_key, str) or len(api_key) < 20:
-            raise ValueError("Invalid API key format")
+            raise UpstreamAuthError("Invalid API key format")
         return api_key
 
     @classmethod
-    @retry_with_backoff
-    def generate_itinerary(cls, system_prompt, user_prompt, temperature=0.7):
-        """Generate itinerary using appropriate GPT model based on user's subscription"""
+    def generate_itinerary(cls, system_prompt, user_prompt, temperature=0.7, cache_key=None, trip_days=None,
+                           response_format=None, user_context=None):
+        """Generate itinerary using appropriate GPT model based on user's subscription
+
+        cache_key should come from cache_keys.request_digest so identical trips
+        share one cache entry; without it the prompts themselves are digested.
+        trip_days sizes the completion budget for the user's tier.
+        response_format is sent to models in JSON_MODE_MODELS. Failures
+        are raised as retry_policy.ItineraryGenerationError subclasses.
+        Latency, token usage, cost and retries are recorded in get_telemetry().
+        user_context is the (model, tier, user_id) from get_user_context(),
+        required when called outside the request thread.
+        """
+        model = tier = None
         try:
-            if not cls._rate_limit_check():
-                raise Exception("Rate limit exceeded. Please try again later.")
+            model, tier, user_id = user_context or cls.get_user_context()
+            call = CallMetrics(model, tier)
 
-            # Generate a unique hash for the prompt combination
-            prompt_hash = hash(f"{system_prompt}{user_prompt}{temperature}")
+            # Stable digest so every worker and restart shares cache entries
+            prompt_hash = cache_key or prompt_digest(system_prompt, user_prompt, model, temperature)
 
             # Check cache first
             cached_response = cls.get_cached_response(prompt_hash)
             if cached_response:
                 logger.info("Using cached response")
+                cls.get_telemetry().observe(call, 'hit')
                 return cached_response
 
-            model = cls.get_model_for_user()
-            logger.info(f"Using model {model} for user {current_user.id} with subscription {current_user.subscription_tier}")
+            logger.info(f"Using model {model} for user {user_id} with subscription {tier}")
 
-            api_key = cls.validate_api_key()
-            client = OpenAI(api_key=api_key)
+            def attempt():
+                # Only real API calls draw from the rate limit, not cache hits
+                cls._rate_limit_check(model, tier)
+                call.start_attempt()
+                return cls.get_circuit_breaker().call(
+                    cls._request_completion, model, system_prompt, user_prompt, temperature, trip_days,
+                    response_format, call, tier
+                )
+
+            def compute():
+                response_content, truncated = cls.get_retry_policy().call(
+                    attempt,
+                    deadline=cls.REQUEST_DEADLINE,
+                    model=model,
+                    passthrough=(CircuitOpenError, RateLimitExceeded)
+                )
+                # Cache before the lock is released so waiting workers find it
+                cls.cache_response(prompt_hash, response_content, truncated)
+                return response_content
+
+            # Identical in-flight requests wait for the first caller's result
+            try:
+                response_content = cls.get_single_flight().do(
+                    prompt_hash,
+                    compute=compute,
+                    load=lambda: cls.get_cached_response(prompt_hash, record_stats=False)
+                )
+            except Exception:
+                cls.get_telemetry().observe(call, 'error')
+                raise
+            # Waiters that got another worker's result made no API call
+            cls.get_telemetry().observe(call, 'miss' if call.attempts else 'hit')
+            return response_content
+
+        except (CircuitOpenError, RateLimitExceeded):
+            raise
+        except Exception as e:
+            error = classify_error(e, model)
+            logger.error(f"Error generating itinerary with {model} for {tier}: "
+                         f"{type(error).__name__}: {str(e)}")
+            if error is e:
+                raise
+            raise error from e
 
-            # Log token usage for cost tracking
-            system_tokens = len(system_prompt.split())
-            user_tokens = len(user_prompt.split())
-            estimated_tokens = system_tokens + user_tokens
-            logger.info(f"Estimated input tokens: {estimated_tokens}")
+    @classmethod
+    def _build_messages(cls, system_prompt, user_prompt):
+        """Build the chat messages for an itinerary request"""
+        return [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": user_prompt
+            }
+        ]
+
+    @classmethod
+    def get_completion_budget(cls, model, messages, trip_days=None, tier=None):
+        """Count prompt tokens and pick max_tokens for the user's tier and trip length"""
+        prompt_tokens = count_message_tokens(messages, model)
+        max_tokens = completion_budget(model, prompt_tokens, subscription_tier=tier, trip_days=trip_days)
+        logger.info(f"Prompt tokens: {prompt_tokens}, completion budget: {max_tokens}")
+        return max_tokens
+
+    @classmethod
+    def _log_request_timing(cls, model, started_at):
+        """Log request latency and whether the pooled connection saved a handshake"""
+        timing = last_connection_timing()
+        elapsed = time.monotonic() - started_at
+        if timing is None:
+            logger.info(f"{model} responded in {elapsed:.2f}s")
+        elif timing.new_connection:
+            logger.info(f"{model} responded in {elapsed:.2f}s, "
+                        f"new connection took {timing.setup_seconds * 1000:.0f}ms")
+        else:
+            logger.info(f"{model} responded in {elapsed:.2f}s on a reused connection")
 
+    @classmethod
+    def _request_completion(cls, model, system_prompt, user_prompt, temperature, trip_days=None,
+                            response_format=None, call=None, tier=None):
+        """Call the chat completions API, hedging slow calls.
+
+        Returns (content, truncated), truncated being whether the text is
+        still cut off after MAX_CONTINUATIONS continuations.
+        """
+        messages = cls._build_messages(system_prompt, user_prompt)
+        max_tokens = cls.get_completion_budget(model, messages, trip_days, tier)
+
+        policy = cls.get_hedge_policy()
+        hedge_model = cls.HEDGE_MODELS.get(model)
+        if not hedge_model or not policy.get_budget(tier):
+            response_content, continuations, truncated = cls._complete(
+                model, messages, max_tokens, temperature, response_format=response_format, call=call)
+            cls.get_continuation_tracker().record(tier, trip_days, continuations, truncated)
+            return response_content, truncated
+
+        policy.record_request(tier)
+        hedge_max_tokens = max_tokens
+        if hedge_model != model:
+            hedge_max_tokens = cls.get_completion_budget(hedge_model, messages, trip_days, tier)
+
+        def should_hedge():
+            if not policy.has_budget(tier):
+                logger.info(f"Hedge budget for {tier} used up, waiting on {model}")
+                return False
+            if cls.get_rate_limiter().acquire(hedge_model, tier):
+                logger.info(f"No rate limit headroom to hedge on {hedge_model}")
+                return False
+            policy.record_hedge(tier)
+            return True
+
+        # Worker threads have no request context, so everything user-specific is passed in
+        (response_content, continuations, truncated), winner = hedged_call(
+            lambda first_token, cancelled: cls._complete(
+                model, messages, max_tokens, temperature, first_token, cancelled, response_format, call),
+            lambda first_token, cancelled: cls._complete(
+                hedge_model, messages, hedge_max_tokens, temperature, first_token, cancelled, response_format, call),
+            delay=policy.get_delay(model),
+            should_hedge=should_hedge
+        )
+        if winner == 'secondary':
+            logger.info(f"Hedged request on {hedge_model} finished before {model}")
+        cls.get_continuation_tracker().record(tier, trip_days, continuations, truncated)
+        return response_content, truncated
+
+    @classmethod
+    def _complete(cls, model, messages, max_tokens, temperature, first_token=None, cancelled=None,
+                  response_format=None, call=None):
+        """Run a chat completion, continuing it while it stops at the length limit.
+
+        Returns (content, continuations, truncated): the merged text, the
+        number of follow-up requests and whether it was still cut off after
+        MAX_CONTINUATIONS of them.
+        """
+        content, finish_reason = cls._complete_once(
+            model, messages, max_tokens, temperature, first_token, cancelled, response_format, call)
+
+        continuations = 0
+        # Text appended to a cut-off JSON document would not parse either; it is left to fail parsing
+        while finish_reason == 'length' and not response_format and continuations < cls.MAX_CONTINUATIONS:
+            follow_up = build_continuation_messages(messages, content)
+            budget = cls.get_continuation_budget(model, follow_up, max_tokens)
+            if not budget:
+                break
+            continuations += 1
+            logger.info(f"{model} stopped at the length limit, requesting continuation {continuations}")
+            more, finish_reason = cls._complete_once(
+                model, follow_up, budget, temperature, first_token, cancelled, call=call)
+            content = merge_continuation(content, more)
+
+        truncated = finish_reason == 'length'
+        if truncated:
+            logger.warning(f"{model} output still cut off after {continuations} continuations")
+        return content, continuations, truncated
+
+    @classmethod
+    def get_continuation_budget(cls, model, messages, max_tokens):
+        """max_tokens for a continuation request, or 0 when the context window is full"""
+        try:
+            return min(max_tokens, completion_budget(model, count_message_tokens(messages, model)))
+        except ValueError as e:
+            logger.warning(f"Cannot continue {model} output: {str(e)}")
+            return 0
+
+    @classmethod
+    def _complete_once(cls, model, messages, max_tokens, temperature, first_token=None, cancelled=None,
+                       response_format=None, call=None):
+        """Run one chat completion and return (content, finish_reason).
+
+        With first_token/cancelled events the response is streamed so the
+        first token can be signalled and a losing hedge can stop early.
+        Token usage and time to first token are added to call (CallMetrics);
+        a cancelled stream has no usage block, so its tokens are estimated.
+        """
+        api_key = cls.validate_api_key()
+        client = get_openai_client(api_key)
+
+        options = {}
+        if response_format and model in cls.JSON_MODE_MODELS:
+            options['response_format'] = response_format
+
+        started_at = time.monotonic()
+        if first_token is None:
             response = client.chat.completions.create(
                 model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
+                messages=messages,
                 temperature=temperature,
-                max_tokens=cls.TOKEN_LIMITS[model] - estimated_tokens,
-                top_p=0.95
+                max_tokens=max_tokens,
+                top_p=0.95,
+                timeout=get_request_timeout(model),
+                **options
             )
+            cls._log_request_timing(model, started_at)
+            cls._log_usage(response.usage)
+            if call is not None:
+                call.add_usage(model, response.usage)
 
             # Get response content
-            response_content = response.choices[0].message.content
+            return response.choices[0].message.content, response.choices[0].finish_reason
+
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=0.95,
+            stream=True,
+            stream_options={'include_usage': True},
+            timeout=get_request_timeout(model),
+            **options
+        )
+        cls._log_request_timing(model, started_at)
+
+        chunks = []
+        usage = None
+        finish_reason = None
+        for chunk in stream:
+            if cancelled is not None and cancelled.is_set():
+                stream.close()
+                if call is not None:
+                    # Billed anyway: the whole prompt and at least what was streamed
+                    call.add_tokens(model, count_message_tokens(messages, model),
+                                    count_tokens(''.join(chunks), model))
+                raise HedgeCancelled(f"{model} request cancelled after losing hedge")
+            usage = chunk.usage or usage
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            # Continuations reuse the already-set event and are not latency samples
+            if not chunks and not first_token.is_set():
+                first_token_after = time.monotonic() - started_at
+                cls.get_hedge_policy().record_first_token(model, first_token_after)
+                if call is not None:
+                    call.record_first_token(first_token_after)
+                first_token.set()
+            chunks.append(delta)
+
+        cls._log_usage(usage)
+        if call is not None:
+            call.add_usage(model, usage)
+        return ''.join(chunks), finish_reason
 
-            # Log completion for cost tracking
-            completion_tokens = len(response_content.split())
-            logger.info(f"Completion tokens: {completion_tokens}")
-            logger.info(f"Total estimated tokens: {estimated_tokens + completion_tokens}")
+    @classmethod
+    def _log_usage(cls, usage):
+        """Log real token usage for cost tracking"""
+        if usage:
+            logger.info(f"Token usage: prompt={usage.prompt_tokens}, "
+                        f"completion={usage.completion_tokens}, total={usage.total_tokens}")
 
-            # Cache the response
-            cls.cache_response(prompt_hash, response_content)
+    @classmethod
+    def stream_itinerary(cls, system_prompt, user_prompt, temperature=0.7, cache_key=None, trip_days=None):
+        """Stream itinerary tokens as the model produces them.
+
+        Yields content fragments in order. The full response is cached once
+        the stream completes, so a cache hit yields the whole text at once.
+        """
+        model = tier = None
+        call = None
+        try:
+            model, tier, user_id = cls.get_user_context()
+            call = CallMetrics(model, tier)
+            prompt_hash = cache_key or prompt_digest(system_prompt, user_prompt, model, temperature)
 
-            return response_content
+            cached_response = cls.get_cached_response(prompt_hash)
+            if cached_response:
+                logger.info("Using cached response for stream")
+                cls.get_telemetry().observe(call, 'hit')
+                yield cached_response
+                return
+
+            logger.info(f"Streaming with model {model} for user {user_id} with subscription {tier}")
+
+            cls._rate_limit_check(model, tier)
 
+            api_key = cls.validate_api_key()
+            client = get_openai_client(api_key)
+
+            messages = cls._build_messages(system_prompt, user_prompt)
+            max_tokens = cls.get_completion_budget(model, messages, trip_days, tier)
+
+            def open_stream(request_messages, request_max_tokens):
+                def create():
+                    call.start_attempt()
+                    return client.chat.completions.create(
+                        model=model,
+                        messages=request_messages,
+                        temperature=temperature,
+                        max_tokens=request_max_tokens,
+                        top_p=0.95,
+                        stream=True,
+                        stream_options={'include_usage': True},
+                        timeout=get_request_timeout(model)
+                    )
+
+                # Opening a stream can be retried; nothing has been sent to the caller yet
+                return cls.get_retry_policy().call(create, deadline=cls.REQUEST_DEADLINE, model=model)
+
+            # Health is judged on time to first token; a long stream is not a slow API
+            breaker = cls.get_circuit_breaker()
+            probe = breaker.before_call()
+            started_at = time.monotonic()
+            first_token_after = None
+            chunks = []
+            finish_reason = None
+            continuations = 0
+            try:
+                stream = open_stream(messages, max_tokens)
+                cls._log_request_timing(model, started_at)
+
+                for chunk in stream:
+                    call.add_usage(model, chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not chunks:
+                        first_token_after = time.monotonic() - started_at
+                        logger.info(f"First token after {first_token_after:.2f}s")
+                        cls.get_hedge_policy().record_first_token(model, first_token_after)
+                        call.record_first_token(first_token_after)
+                    chunks.append(delta)
+                    yield delta
+
+                while finish_reason == 'length' and continuations < cls.MAX_CONTINUATIONS:
+                    follow_up = build_continuation_messages(messages, ''.join(chunks))
+                    budget = cls.get_continuation_budget(model, follow_up, max_tokens)
+                    if not budget:
+                        break
+                    continuations += 1
+                    logger.info(f"{model} stream stopped at the length limit, requesting continuation {continuations}")
+                    cls._rate_limit_check(model, tier)
+
+                    # Hold back the start of the continuation until any repeated text can be trimmed
+                    pending = ''
+                    finish_reason = None
+                    for chunk in open_stream(follow_up, budget):
+                        call.add_usage(model, chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if pending is not None:
+                            pending += delta
+                            if len(pending) < MAX_OVERLAP_CHARS:
+                                continue
+                            delta, pending = trim_overlap(''.join(chunks), pending), None
+                        chunks.append(delta)
+                        yield delta
+                    if pending:
+                        pending = trim_overlap(''.join(chunks), pending)
+                        chunks.append(pending)
+                        yield pending
+            except BaseException as e:
+                # A client disconnect raises GeneratorExit here, which is not a health signal either
+                if isinstance(e, Exception) and breaker.is_failure(e):
+                    breaker.on_failure(probe)
+                elif probe:
+                    breaker.release_probe()
+                raise
+            breaker.on_success(first_token_after or time.monotonic() - started_at, probe)
+
+            truncated = finish_reason == 'length'
+            if truncated:
+                logger.warning(f"{model} stream still cut off after {continuations} continuations")
+            cls.get_continuation_tracker().record(tier, trip_days, continuations, truncated)
+
+            response_content = ''.join(chunks)
+
+            cls.cache_response(prompt_hash, response_content, truncated)
+            cls.get_telemetry().observe(call, 'miss')
+
+        except (CircuitOpenError, RateLimitExceeded):
+            if call is not None:
+                cls.get_telemetry().observe(call, 'error')
+            raise
         except Exception as e:
-            logger.error(f"Error generating itinerary: {str(e)}")
-            error_message = f"""
-            Error generating itinerary. Details: {str(e)}
-            Model: {model}
-            Subscription: {current_user.subscription_tier}
-            """
-            raise Exception(error_message)
+            if call is not None:
+                cls.get_telemetry().observe(call, 'error')
+            error = classify_error(e, model)
+            logger.error(f"Error streaming itinerary with {model} for {tier}: "
+                         f"{type(error).__name__}: {str(e)}")
+            if error is e:
+                raise
+            raise error from e
 
     @classmethod
     def get_model_features(cls, subscription_tier):
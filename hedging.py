@@ -0,0 +1,171 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class HedgeCancelled(Exception):
+    """Raised inside a request that lost the race and stopped early"""
+
+class HedgePolicy:
+    """Decides when a slow request should be hedged, shared by all workers.
+
+    Recent time-to-first-token samples per model live in Redis; the hedge
+    delay is a percentile of them, so only the slowest requests hedge. Each
+    subscription tier may hedge at most a fraction of its requests per hour.
+    Without Redis, samples and budgets are kept in this process.
+    """
+    LATENCY_PREFIX = 'hedge:ttft:'
+    BUDGET_PREFIX = 'hedge:budget:'
+    BUDGET_WINDOW = 3600  # seconds
+
+    def __init__(self, redis_client, percentile=0.95, default_delays=None, tier_budgets=None,
+                 min_samples=20, sample_size=200, refresh_seconds=30):
+        self.redis = redis_client
+        self.percentile = percentile
+        self.default_delays = default_delays or {}
+        self.tier_budgets = tier_budgets or {}
+        self.min_samples = min_samples
+        self.sample_size = sample_size
+        self.refresh_seconds = refresh_seconds
+        self._delays = {}
+        self._local_samples = {}
+        self._local_counts = {}
+        self._lock = threading.Lock()
+
+    def record_first_token(self, model, seconds):
+        """Add a time-to-first-token sample for model"""
+        key = f"{self.LATENCY_PREFIX}{model}"
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.lpush(key, f"{seconds:.3f}")
+                pipe.ltrim(key, 0, self.sample_size - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Error recording latency sample: {str(e)}")
+        with self._lock:
+            samples = self._local_samples.setdefault(model, [])
+            samples.insert(0, seconds)
+            del samples[self.sample_size:]
+
+    def _load_samples(self, model):
+        if self.redis:
+            try:
+                return [float(value) for value in self.redis.lrange(f"{self.LATENCY_PREFIX}{model}", 0, -1)]
+            except Exception as e:
+                logger.warning(f"Error loading latency samples: {str(e)}")
+        with self._lock:
+            return list(self._local_samples.get(model, []))
+
+    def get_delay(self, model):
+        """Seconds to wait for a first token before hedging"""
+        delay, expires_at = self._delays.get(model, (None, 0))
+        if delay is not None and expires_at > time.monotonic():
+            return delay
+
+        samples = sorted(self._load_samples(model))
+        if len(samples) < self.min_samples:
+            delay = self.default_delays.get(model, 30)
+        else:
+            delay = samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+
+        self._delays[model] = (delay, time.monotonic() + self.refresh_seconds)
+        return delay
+
+    def get_budget(self, tier):
+        """Fraction of a tier's requests that may be hedged"""
+        return self.tier_budgets.get(tier, 0)
+
+    def _budget_key(self, tier):
+        return f"{self.BUDGET_PREFIX}{tier}:{int(time.time() // self.BUDGET_WINDOW)}"
+
+    def _increment(self, tier, field):
+        key = self._budget_key(tier)
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hincrby(key, field, 1)
+                pipe.expire(key, self.BUDGET_WINDOW * 2)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Error updating hedge budget: {str(e)}")
+        with self._lock:
+            counts = self._local_counts.setdefault(key, {'requests': 0, 'hedges': 0})
+            counts[field] += 1
+
+    def _counts(self, tier):
+        key = self._budget_key(tier)
+        if self.redis:
+            try:
+                requests, hedges = self.redis.hmget(key, 'requests', 'hedges')
+                return int(requests or 0), int(hedges or 0)
+            except Exception as e:
+                logger.warning(f"Error reading hedge budget: {str(e)}")
+        with self._lock:
+            counts = self._local_counts.get(key, {'requests': 0, 'hedges': 0})
+            return counts['requests'], counts['hedges']
+
+    def record_request(self, tier):
+        """Count a request that could be hedged"""
+        self._increment(tier, 'requests')
+
+    def has_budget(self, tier):
+        """Whether the tier may hedge one more request this window"""
+        requests, hedges = self._counts(tier)
+        return hedges < self.get_budget(tier) * requests
+
+    def record_hedge(self, tier):
+        self._increment(tier, 'hedges')
+
+def hedged_call(primary, secondary, delay, should_hedge=None, poll_interval=0.05):
+    """Run primary; if it has no first token after delay, race secondary against it.
+
+    primary and secondary are called with (first_token, cancelled) events:
+    they set first_token once output starts and should stop early (raising
+    HedgeCancelled) when cancelled is set. should_hedge() is checked right
+    before the secondary starts. Returns (result, 'primary' or 'secondary').
+    """
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        first_token = threading.Event()
+        primary_cancelled = threading.Event()
+        primary_future = executor.submit(primary, first_token, primary_cancelled)
+
+        deadline = time.monotonic() + delay
+        while not first_token.is_set() and not primary_future.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            first_token.wait(min(poll_interval, remaining))
+
+        if first_token.is_set() or primary_future.done() or (should_hedge and not should_hedge()):
+            return primary_future.result(), 'primary'
+
+        logger.info(f"No first token after {delay:.1f}s, sending hedged request")
+        secondary_cancelled = threading.Event()
+        secondary_future = executor.submit(secondary, threading.Event(), secondary_cancelled)
+
+        racers = {
+            primary_future: ('primary', primary_cancelled),
+            secondary_future: ('secondary', secondary_cancelled)
+        }
+        pending = set(racers)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Stop the loser so it does not keep spending tokens
+                    for other in pending:
+                        racers[other][1].set()
+                    return future.result(), racers[future][0]
+                error = future.exception()
+        raise error
+    finally:
+        # Do not wait for a cancelled loser to notice
+        executor.shutdown(wait=False)
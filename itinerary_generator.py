@@ -1,11 +1,23 @@
 import os
+import re
+import json
 import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
 from flask_login import current_user
 from cache_manager import CacheManager, cache_enabled
 from currency_data import format_currency, get_currency_info
 from gpt_model_handler import GPTModelHandler
+from circuit_breaker import CircuitOpenError
+from retry_policy import classify_error
+from cache_keys import request_digest
+from token_budget import count_prompt_tokens
+from request_normalization import NORMALIZATION_ENABLED, normalize_request, rerender_itinerary, budget_band
+from structured_itinerary import (SCHEMA_VERSION, STRUCTURED_OUTPUT, DAY_OUTPUT, JSON_RESPONSE_FORMAT,
+                                  parse_trip_plan, parse_day, render_markdown)
+import prompt_templates
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,6 +25,30 @@ logger = logging.getLogger(__name__)
 
 cache_manager = CacheManager()
 
+# Trips at least this long are generated as an overview plus parallel per-day calls
+PARALLEL_DAY_THRESHOLD = int(os.getenv('PARALLEL_DAY_THRESHOLD', 4))
+MAX_DAY_WORKERS = int(os.getenv('MAX_DAY_WORKERS', 4))
+
+DAY_OUTLINE_HEADING = '## Day Outline'
+DAY_OUTLINE_PATTERN = re.compile(r'^#*\s*Day Outline\s*:?\s*$', re.IGNORECASE | re.MULTILINE)
+
+# Itineraries shared between requests that normalize to the same bucket
+BUCKET_CACHE_PREFIX = 'itinerary_bucket:'
+
+# Recent buckets per destination, searched for a close match while OpenAI is down
+BUCKET_INDEX_PREFIX = 'itinerary_bucket_index:'
+BUCKET_INDEX_SIZE = 50
+
+# Day headings as the model writes them: "## Day 3", "**Day 3 - Monday**", "Day 3:".
+# Markdown headings are tried first so overview lines like "Day 1: arrival" are skipped.
+DAY_HEADING_PATTERNS = (
+    re.compile(r'^(#{1,4})\s*\**\s*Day\s+(\d+)\b', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^()\**\s*Day\s+(\d+)\b', re.IGNORECASE | re.MULTILINE)
+)
+
+# First line of every itinerary served without calling the model
+DEGRADED_NOTICE = "> **Note:** Our itinerary planner is busy right now"
+
 def is_openai_available():
     """Check if OpenAI API is available and configured."""
     return bool(os.getenv('OPENAI_API_KEY'))
@@ -22,15 +58,6 @@ def generate_itinerary(form):
     """Generate a travel itinerary using appropriate GPT model with caching."""
 
     try:
-        # Prepare request data for caching
-        request_data = prepare_cache_data(form)
-
-        # Check cache first
-        cached_response = cache_manager.get_openai_response(request_data)
-        if cached_response:
-            logger.info("Using cached OpenAI response")
-            return cached_response
-
         # Build system and user prompts
         system_prompt = build_system_prompt(form)
         user_prompt = build_detailed_prompt(form)
@@ -38,16 +65,15 @@ def generate_itinerary(form):
         # Get the appropriate model based on subscription
         logger.info(f"Using model {current_user.gpt_model_access} for user {current_user.id}")
 
-        # Generate itinerary using appropriate model
+        # Generate itinerary using appropriate model (cached by GPTModelHandler)
         itinerary = GPTModelHandler.generate_itinerary(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
-            temperature=0.7
+            temperature=0.7,
+            cache_key=get_request_cache_key(form),
+            trip_days=get_trip_days(form)
         )
 
-        # Cache the response
-        cache_manager.cache_openai_response(request_data, itinerary)
-
         return itinerary
 
     except Exception as e:
@@ -68,6 +94,153 @@ def generate_itinerary(form):
         """
         raise Exception(error_message)
 
+def get_request_cache_key(form, temperature=0.7):
+    """Stable cache key for a trip request, shared by every worker and restart."""
+    return request_digest(prepare_cache_data(form), GPTModelHandler.get_model_for_user(), temperature)
+
+def get_bucket_cache_key(form, temperature=0.7):
+    """Cache key for the bucket of requests that can share one itinerary"""
+    return request_digest(normalize_request(prepare_cache_data(form)),
+                          GPTModelHandler.get_model_for_user(), temperature)
+
+def get_budget_figures(form):
+    """Formatted budget figures from the prompt, which the model tends to repeat"""
+    total_travelers = form.num_adults.data + form.num_youth.data + form.num_children.data
+    return {
+        'total': format_currency(form.budget.data, form.currency.data),
+        'daily': format_currency(form.budget.data / get_trip_days(form), form.currency.data),
+        'per_person': format_currency(form.budget.data / total_travelers, form.currency.data)
+    }
+
+def get_bucketed_itinerary(form):
+    """Reuse an itinerary generated for an equivalent request, re-rendered for this one"""
+    if not NORMALIZATION_ENABLED:
+        return None
+
+    entry = cache_manager.get(f"{BUCKET_CACHE_PREFIX}{get_bucket_cache_key(form)}")
+    if not isinstance(entry, dict) or 'content' not in entry:
+        return None
+
+    cached_figures = entry.get('budget_figures', {})
+    replacements = {cached_figures.get(name): value for name, value in get_budget_figures(form).items()}
+
+    logger.info(f"Reusing bucketed itinerary generated for {entry['start_date']}")
+    return rerender_itinerary(entry['content'], entry['start_date'], form.start_date.data, replacements)
+
+def store_bucketed_itinerary(form, itinerary):
+    """Publish a freshly generated itinerary for its whole request bucket"""
+    if not NORMALIZATION_ENABLED or not itinerary:
+        return
+
+    bucket_key = get_bucket_cache_key(form)
+    cache_manager.set(f"{BUCKET_CACHE_PREFIX}{bucket_key}", {
+        'start_date': form.start_date.data.isoformat(),
+        'budget_figures': get_budget_figures(form),
+        'content': itinerary
+    }, timeout=GPTModelHandler.CACHE_EXPIRY)
+    index_bucketed_itinerary(form, bucket_key)
+
+def get_bucket_index_key(form):
+    return f"{BUCKET_INDEX_PREFIX}{form.destinations.data}:{form.currency.data}"
+
+def index_bucketed_itinerary(form, bucket_key):
+    """Remember a cached bucket so fallbacks can find the closest one"""
+    if not cache_manager.redis:
+        return
+    try:
+        index_key = get_bucket_index_key(form)
+        pipe = cache_manager.redis.pipeline()
+        pipe.lpush(index_key, json.dumps({
+            'key': bucket_key,
+            'days': get_trip_days(form),
+            'budget_band': budget_band(form.budget.data),
+            'travel_focus': sorted(form.travel_focus.data or []),
+            'halal_food': bool(form.halal_food.data),
+            'vegan_food': bool(form.vegan_food.data)
+        }))
+        pipe.ltrim(index_key, 0, BUCKET_INDEX_SIZE - 1)
+        pipe.expire(index_key, GPTModelHandler.CACHE_EXPIRY)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Error indexing cached itinerary: {str(e)}")
+
+def score_candidate(form, candidate):
+    """How well a cached bucket fits this request (higher is better, None if unusable)"""
+    # Never serve food guidance that ignores a dietary requirement
+    if form.halal_food.data and not candidate['halal_food']:
+        return None
+    if form.vegan_food.data and not candidate['vegan_food']:
+        return None
+
+    shared_focus = len(set(form.travel_focus.data or []) & set(candidate['travel_focus']))
+    return (shared_focus
+            - 2 * abs(candidate['days'] - get_trip_days(form))
+            - abs(candidate['budget_band'] - budget_band(form.budget.data)))
+
+def find_closest_itinerary(form):
+    """Closest cached itinerary for the same destination and currency, re-rendered"""
+    if not cache_manager.redis:
+        return None
+    try:
+        candidates = [json.loads(raw) for raw in cache_manager.redis.lrange(get_bucket_index_key(form), 0, -1)]
+    except Exception as e:
+        logger.warning(f"Error reading cached itinerary index: {str(e)}")
+        return None
+
+    scored = []
+    for candidate in candidates:
+        score = score_candidate(form, candidate)
+        if score is not None:
+            scored.append((score, candidate['key']))
+
+    for _, bucket_key in sorted(scored, key=lambda item: item[0], reverse=True):
+        entry = cache_manager.get(f"{BUCKET_CACHE_PREFIX}{bucket_key}")
+        if isinstance(entry, dict) and 'content' in entry:
+            return rerender_itinerary(entry['content'], entry['start_date'], form.start_date.data)
+    return None
+
+def build_degraded_itinerary(form):
+    """Simple day-by-day outline built without the model"""
+    destination = dict(form.destinations.choices).get(form.destinations.data, form.destinations.data)
+    figures = get_budget_figures(form)
+    places = [place.strip() for place in re.split(r'[,;\n]+', form.specific_locations.data or '') if place.strip()]
+    duration = get_trip_days(form)
+
+    lines = [
+        f"# {destination} Trip Plan",
+        "",
+        f"**Dates:** {form.start_date.data.strftime('%A, %Y-%m-%d')} to {form.end_date.data.strftime('%A, %Y-%m-%d')}",
+        f"**Budget:** {figures['total']} ({figures['daily']} per day)",
+        ""
+    ]
+    for day in range(duration):
+        day_date = form.start_date.data + timedelta(days=day)
+        lines.append(f"## Day {day + 1} - {day_date.strftime('%A, %Y-%m-%d')}")
+        day_places = places[day::duration]
+        if day_places:
+            for place in day_places:
+                lines.append(f"- Visit [{place}]({format_google_maps_link(f'{place}, {destination}')})")
+        else:
+            lines.append(f"- Explore [{destination}]({format_google_maps_link(destination)}) at your own pace")
+        lines.append("")
+    return '\n'.join(lines)
+
+def get_fallback_itinerary(form):
+    """Itinerary to serve while the circuit to OpenAI is open"""
+    itinerary = find_closest_itinerary(form)
+    if itinerary is not None:
+        logger.info("Serving closest cached itinerary while OpenAI is unavailable")
+        notice = f"{DEGRADED_NOTICE}, so this plan was adapted from a similar recent trip. Generate again in a few minutes for a plan tailored to you."
+    else:
+        logger.info("Serving outline itinerary while OpenAI is unavailable")
+        itinerary = build_degraded_itinerary(form)
+        notice = f"{DEGRADED_NOTICE}, so this is a simplified outline. Generate again in a few minutes for a detailed plan."
+    return f"{notice}\n\n{itinerary}"
+
+def is_degraded_itinerary(content):
+    """Whether content was served as a fallback instead of generated for this request"""
+    return bool(content) and content.startswith(DEGRADED_NOTICE)
+
 def prepare_cache_data(form):
     """Prepare request data for caching."""
     return {
@@ -98,75 +271,10 @@ def build_system_prompt(form):
     current_time = datetime.now()
     currency_info = get_currency_info(form.currency.data)
 
-    base_prompt = f"""You are an expert travel planner specializing in creating detailed itineraries for {form.citizenship.data.replace('_', ' ').title()} citizens, with real-time updates as of {current_time.strftime('%Y-%m-%d %H:%M')} {current_time.astimezone().tzname()}.
-
-Your expertise includes:
-1. Comprehensive Cost Analysis:
-   - All prices in {currency_info.code}
-   - Peak vs. off-peak pricing
-   - Group discounts and special rates
-   - Hidden costs and fees
-   - Local tax implications
-
-2. Cultural Intelligence:
-   - Local customs and etiquette
-   - Cultural sensitivities
-   - Dress code requirements
-   - Social norms and taboos
-   - Festival and holiday impacts
-
-3. Safety and Documentation:
-   - Visa requirements and processes
-   - Insurance recommendations
-   - Emergency contacts and procedures
-   - Local healthcare facilities
-   - Travel advisories and warnings
-
-4. Transportation Expertise:
-   - Public transport systems
-   - Private transfer options
-   - Walking and cycling routes
-   - Accessibility considerations
-   - Traffic patterns and peak times
-
-5. Time Management:
-   - Opening hours and peak times
-   - Seasonal variations
-   - Queue management strategies
-   - Optimal visit durations
-   - Buffer time recommendations"""
-
-    # Add religious considerations if halal food is required
-    if form.halal_food.data:
-        religious_prompt = """
-6. Islamic Facilities:
-   - Prayer times for each day
-   - Mosque locations and accessibility
-   - Prayer room facilities
-   - Halal restaurant certifications
-   - Wudu facilities
-   - Qibla direction in accommodations"""
-        base_prompt += religious_prompt
-
-    base_prompt += """
-
-For every location recommended:
-1. Provide Google Maps link: [Location Name](https://www.google.com/maps/search/?api=1&query=encoded_location_name)
-2. List exact opening hours and best visit times
-3. Include real-time travel durations
-4. Specify all costs in requested currency
-5. Note accessibility features
-6. List nearby amenities
-
-Format Requirements:
-1. Use 24-hour time format (e.g., 14:30)
-2. Include day of week for all dates
-3. Structure timing in 30-minute blocks
-4. Provide exact travel durations
-5. Include alternative options for weather
-6. List exact costs with tax included"""
-
-    return base_prompt
+    return prompt_templates.SYSTEM_PROMPT.render({
+        'citizenship': form.citizenship.data.replace('_', ' ').title(),
+        'timestamp': f"{current_time.strftime('%Y-%m-%d %H:%M')} {current_time.astimezone().tzname()}"
+    }, halal=bool(form.halal_food.data), currency=currency_info.code)
 
 def build_detailed_prompt(form):
     """Build the detailed user prompt with all requirements"""
@@ -231,138 +339,25 @@ Travel Group Information:
 
 def build_price_breakdown_section(form):
     """Build the comprehensive price breakdown section of the prompt"""
-    return """
-1. Comprehensive Price Breakdown Required:
-   a) Transportation Analysis:
-      - Flight costs by route with peak/off-peak variations
-      - Airport transfer options and costs
-      - Local transportation passes and costs
-      - Taxi/ride-sharing estimates
-      - Inter-city travel expenses
-
-   b) Accommodation Details:
-      - Hotel rates by area/district
-      - Peak vs. off-peak pricing
-      - Additional fees (tourism tax, service charge)
-      - Family room availability and pricing
-      - Accessible room options and costs
-
-   c) Daily Expense Breakdown:
-      - Meal costs by cuisine type (local vs. international)
-      - Activity and entrance fees with age-based pricing
-      - Shopping estimates by district
-      - Entertainment costs
-      - Prayer facility locations and any associated costs
-
-2. Cost Optimization Strategies:
-   a) Currency & Payments:
-      - Current exchange rates
-      - Recommended payment methods
-      - ATM availability and fees
-      - Credit card acceptance
-
-   b) Pricing Variations:
-      - Peak vs. off-peak season differences
-      - Group discount opportunities
-      - Age-based discounts (child/senior/student)
-      - Early booking benefits
-
-   c) Money-Saving Tips:
-      - Tourist passes and city cards
-      - Combination ticket options
-      - Free walking tours and activities
-      - Budget accommodation alternatives
-      - Local market shopping tips"""
+    return prompt_templates.PRICE_BREAKDOWN.render()
 
 def build_requirements_section(form):
     """Build the travel requirements and cultural information section"""
-    return f"""
-3. Travel Requirements:
-   a) Documentation:
-      - Detailed visa requirements for {form.citizenship.data.replace('_', ' ').title()} passport holders
-      - Processing time and fees
-      - Required supporting documents
-      - Embassy/consulate locations and contact details
-
-   b) Health & Safety:
-      - Required and recommended vaccinations
-      - Travel insurance recommendations
-      - Local healthcare facilities and costs
-      - Emergency numbers and procedures
-
-   c) Transportation:
-      - Public transport system overview
-      - Special passes and tourist cards
-      - Accessibility options
-      - Peak hours and service frequency
-
-   d) Weather & Seasonal Considerations:
-      - Monthly weather patterns
-      - Best times to visit
-      - Seasonal events and festivals
-      - Clothing recommendations
-
-   e) Cultural Guidelines:
-      - Local customs and etiquette
-      - Religious considerations
-      - Dress code requirements
-      - Tipping practices
-      - Cultural taboos to avoid
-
-4. Location-Specific Information:
-   a) Cultural Events:
-      - Local festivals during visit period
-      - Special events and exhibitions
-      - Traditional performances
-      - Cultural workshops
-   """
+    return prompt_templates.REQUIREMENTS.render({
+        'citizenship': form.citizenship.data.replace('_', ' ').title()
+    })
+
 def build_religious_accessibility_section(form):
     """Build the religious and accessibility features section if applicable"""
-    # Start with base accessibility info
-    section = """
-   b) Accessibility Information:
-      - Wheelchair access at attractions
-      - Accessible transportation options
-      - Special assistance services
-      - Accessible restroom locations
-
-   c) Family Services:
-      - Baby changing facilities
-      - Family rest areas
-      - Child-friendly attractions
-      - Kids' meal options
-      - Stroller rental services
-
-   d) Emergency Services:
-      - Hospital locations and specialties
-      - 24-hour pharmacies
-      - Police stations
-      - Embassy/consulate details
-      - Tourist police contacts
-    """
+    return prompt_templates.RELIGIOUS_ACCESSIBILITY.render(halal=bool(form.halal_food.data))
 
-    # Add religious facilities section if halal food is required
-    if form.halal_food.data:
-        religious_section = """
-   e) Religious Facilities:
-      - Nearby mosques and prayer rooms
-      - Daily prayer times:
-        * Fajr
-        * Dhuhr
-        * Asr
-        * Maghrib
-        * Isha
-      - Walking distance to prayer facilities
-      - Halal restaurants and certification details
-      - Qibla direction in accommodation
-      - Wudhu facilities availability
-      - Friday prayer recommendations
-      - Religious etiquette guidelines
-      - Local Islamic cultural considerations
-    """
-        section += religious_section
-
-    return section
+def build_day_schedule(form, day):
+    """Build the schedule structure for a single day (0-based index)"""
+    day_date = form.start_date.data + timedelta(days=day)
+    return prompt_templates.DAY_SCHEDULE.render({
+        'day_number': day + 1,
+        'day_label': day_date.strftime('%A, %Y-%m-%d')
+    }, halal=bool(form.halal_food.data), currency=form.currency.data)
 
 def build_daily_schedule_structure(form):
     """Build the daily schedule structure with exact timings"""
@@ -370,55 +365,20 @@ def build_daily_schedule_structure(form):
     schedule = "\n5. Daily Schedule Structure:\n"
 
     # Build schedule for each day
-    current_date = form.start_date.data
     for day in range(duration):
-        day_date = current_date + timedelta(days=day)
-        schedule += f"""
-Day {day + 1} - {day_date.strftime('%A, %Y-%m-%d')}:
-
-a) Early Morning (06:00-09:00):
-   * [Time Slot Details]
-   * Exact timing for each activity
-   * Google Maps links
-   * Transportation options
-   * Weather considerations
-   {'* Prayer facilities for Fajr' if form.halal_food.data else ''}
-
-b) Morning Activities (09:00-12:00):
-   * [Time Slot Details]
-   * Location-specific information
-   * Access requirements
-   * Cost breakdown
-   {'* Prayer facilities for Dhuhr' if form.halal_food.data else ''}
-
-c) Afternoon Activities (12:00-17:00):
-   * [Time Slot Details]
-   * Rest periods
-   * Meal recommendations
-   * Indoor/outdoor alternatives
-   {'* Prayer facilities for Dhuhr and Asr' if form.halal_food.data else ''}
-
-d) Evening Activities (17:00-22:00):
-   * [Time Slot Details]
-   * Dinner options
-   * Entertainment choices
-   * Night activity suggestions
-   {'* Prayer facilities for Maghrib and Isha' if form.halal_food.data else ''}
-
-Required for each location:
-1. [Location Name](https://www.google.com/maps/search/?api=1&query=encoded_location_name)
-2. Opening hours and optimal visit time
-3. Exact costs in {form.currency.data}
-4. Travel duration from previous location
-5. Public transport options
-6. Accessibility information
-7. Weather contingency plans
-"""
+        schedule += build_day_schedule(form, day)
 
     return schedule
 
-def assemble_final_prompt(form):
-    """Assemble all prompt sections into final prompt"""
+def get_trip_days(form):
+    """Number of itinerary days, counting both start and end date"""
+    return (form.end_date.data - form.start_date.data).days + 1
+
+def assemble_final_prompt(form, report_tokens=False):
+    """Assemble all prompt sections into final prompt
+
+    With report_tokens=True returns (prompt, token_count) for the user's model.
+    """
     # Build base prompt
     prompt = build_detailed_prompt(form)
 
@@ -435,47 +395,214 @@ def assemble_final_prompt(form):
     prompt += build_daily_schedule_structure(form)
 
     # Add final instructions
+    prompt += prompt_templates.FINAL_INSTRUCTIONS.render(currency=form.currency.data)
+
+    if report_tokens:
+        token_count = count_prompt_tokens(prompt, GPTModelHandler.get_model_for_user())
+        logger.info(f"Assembled prompt uses {token_count} tokens")
+        return prompt, token_count
+
+    return prompt
+
+def build_overview_prompt(form):
+    """Build the prompt for the shared trip overview used in parallel generation"""
+    duration = get_trip_days(form)
+
+    prompt = build_detailed_prompt(form)
+    prompt += build_price_breakdown_section(form)
+    prompt += build_requirements_section(form)
+    prompt += build_religious_accessibility_section(form)
     prompt += f"""
 
-Additional Requirements:
-1. Timing:
-   - Provide exact timings for all activities
-   - Include travel duration between locations
-   - Factor in prayer times where applicable
-   - Consider peak hours and crowds
-   - Include buffer time for unexpected delays
-
-2. Location Details:
-   - Google Maps links for all locations
-   - Exact addresses
-   - Best entry/exit points
-   - Nearest public transport
-   - Parking information if relevant
-
-3. Cost Information:
-   - All prices in {form.currency.data}
-   - Include all taxes and fees
-   - List both budget and premium options
-   - Group discount opportunities
-   - Hidden costs to consider
-
-4. Weather Considerations:
-   - Indoor alternatives for outdoor activities
-   - Season-specific recommendations
-   - Weather-dependent timing adjustments
-   - Appropriate clothing suggestions
-
-Please ensure all recommendations consider:
-- Group composition and age ranges
-- Selected travel focus areas
-- Dietary requirements
-- Accessibility needs
-- Budget constraints
-- Cultural sensitivities
+Write the trip overview only: costs, requirements, cultural guidance and practical
+information that apply to the whole trip. Do not write the detailed day-by-day
+schedule; each day is planned separately.
+
+Finish with a section titled "{DAY_OUTLINE_HEADING}" containing exactly one line per day,
+from Day 1 to Day {duration}, in the form "Day N: <area or theme> - <main highlights>",
+so that each day's planner knows the route and avoids repeating places.
 """
+    return prompt
+
+def build_day_prompt(form, day, outline):
+    """Build the prompt for one day of a parallel generation (0-based index)"""
+    duration = get_trip_days(form)
+
+    prompt = build_detailed_prompt(form)
+    if outline:
+        prompt += f"""
+Trip outline agreed for all {duration} days:
+{outline}
+"""
+    prompt += f"""
+Write the detailed schedule for Day {day + 1} of {duration} only, following this structure:
+{build_day_schedule(form, day)}
+Start with the heading "Day {day + 1}" and do not plan places assigned to other days.
+"""
+    return prompt
+
+def split_day_outline(overview):
+    """Split a generated overview into (overview body, day outline text)"""
+    match = DAY_OUTLINE_PATTERN.search(overview)
+    if not match:
+        logger.warning("Overview has no day outline, generating days without it")
+        return overview, ''
+    return overview[:match.start()].rstrip(), overview[match.end():].strip()
+
+def stitch_itinerary(overview, days):
+    """Join the overview and the per-day schedules in trip order"""
+    return '\n\n'.join([overview.strip()] + [day.strip() for day in days])
+
+def generate_itinerary_parallel(form):
+    """Generate a long trip as a shared overview plus concurrently generated days"""
+    duration = get_trip_days(form)
+    system_prompt = build_system_prompt(form)
+    request_data = prepare_cache_data(form)
+    # Resolved once here: day threads have no request context and no current_user
+    user_context = GPTModelHandler.get_user_context()
+    model = user_context[0]
+
+    def part_cache_key(part):
+        return request_digest(dict(request_data, part=part), model, 0.7)
+
+    overview = GPTModelHandler.generate_itinerary(
+        system_prompt=system_prompt,
+        user_prompt=build_overview_prompt(form),
+        temperature=0.7,
+        cache_key=part_cache_key('overview'),
+        user_context=user_context
+    )
+    overview_body, outline = split_day_outline(overview)
+
+    def generate_day(day):
+        return GPTModelHandler.generate_itinerary(
+            system_prompt=system_prompt,
+            user_prompt=build_day_prompt(form, day, outline),
+            temperature=0.7,
+            cache_key=part_cache_key(f'day-{day + 1}'),
+            trip_days=1,
+            user_context=user_context
+        )
+
+    logger.info(f"Generating {duration} days in parallel with up to {MAX_DAY_WORKERS} workers")
+    with ThreadPoolExecutor(max_workers=min(MAX_DAY_WORKERS, duration)) as executor:
+        futures = [executor.submit(generate_day, day) for day in range(duration)]
+        days = [future.result() for future in futures]
+
+    return stitch_itinerary(overview_body, days)
+
+def find_day_headings(content, pattern, days=None):
+    """Matches for Day 1, Day 2, ... in order, skipping out-of-sequence mentions"""
+    headings = []
+    for match in pattern.finditer(content):
+        if int(match.group(2)) == len(headings) + 1:
+            headings.append(match)
+            if days and len(headings) == days:
+                break
+    return headings
+
+def split_day_sections(content, days=None):
+    """Split an itinerary into (preamble, [Day 1 text, Day 2 text, ...], epilogue).
 
+    The epilogue is whatever follows the last day under a heading at the
+    day headings' level or above (e.g. "## Cost Summary").
+    """
+    headings = []
+    for pattern in DAY_HEADING_PATTERNS:
+        headings = find_day_headings(content, pattern, days)
+        if headings and (not days or len(headings) == days):
+            break
+    if not headings:
+        raise ValueError("Itinerary has no day sections")
+
+    starts = [match.start() for match in headings]
+    sections = [content[start:end] for start, end in zip(starts, starts[1:] + [len(content)])]
+
+    epilogue = ''
+    level = len(headings[-1].group(1))
+    if level:
+        next_heading = re.compile(rf'^#{{1,{level}}}\s+(?!\**\s*Day\s+\d)', re.IGNORECASE | re.MULTILINE)
+        match = next_heading.search(sections[-1], 1)
+        if match:
+            sections[-1], epilogue = sections[-1][:match.start()], sections[-1][match.start():]
+
+    return content[:starts[0]], sections, epilogue
+
+def build_day_revision_prompt(form, day, sections, change_request, output_format):
+    """Prompt to rewrite one day (0-based) with its neighbouring days as context"""
+    prompt = build_detailed_prompt(form)
+    if day > 0:
+        prompt += f"\nDay {day} as planned (keep unchanged):\n{sections[day - 1].strip()}\n"
+    prompt += f"\nCurrent plan for Day {day + 1}:\n{sections[day].strip()}\n"
+    if day + 1 < len(sections):
+        prompt += f"\nDay {day + 2} as planned (keep unchanged):\n{sections[day + 1].strip()}\n"
+    prompt += f"""
+The traveller asked for this change to Day {day + 1}:
+"{change_request.strip()}"
+
+Rewrite Day {day + 1} only, with the change applied. Keep whatever the traveller did not ask
+to change, stay consistent with the neighbouring days and do not repeat their places.
+{output_format}"""
     return prompt
 
+def get_day_revision_cache_key(form, day_number, current, change_request):
+    """Cache key for one revision of one day"""
+    data = dict(prepare_cache_data(form), part=f'revise-day-{day_number}',
+                current=current, change_request=change_request)
+    return request_digest(data, GPTModelHandler.get_model_for_user(), 0.7)
+
+def regenerate_day(form, content, day_number, change_request):
+    """Rewrite one day of a markdown itinerary and splice it back; returns the new content"""
+    preamble, sections, epilogue = split_day_sections(content, get_trip_days(form))
+    if not 1 <= day_number <= len(sections):
+        raise ValueError(f"Itinerary has no Day {day_number}")
+
+    day = day_number - 1
+    output_format = (f"Follow this structure:\n{build_day_schedule(form, day)}\n"
+                     f"Start with the heading \"Day {day_number}\".\n")
+    logger.info(f"Regenerating day {day_number} of {len(sections)}")
+    revised = GPTModelHandler.generate_itinerary(
+        system_prompt=build_system_prompt(form),
+        user_prompt=build_day_revision_prompt(form, day, sections, change_request, output_format),
+        temperature=0.7,
+        cache_key=get_day_revision_cache_key(form, day_number, sections[day], change_request),
+        trip_days=1
+    )
+
+    # Keep the heading level and spacing of the original section
+    level = re.match(r'#*', sections[day]).group(0)
+    revised = revised.strip()
+    if level:
+        revised = f"{level} {revised.lstrip('#').lstrip()}"
+    sections[day] = revised + (sections[day][len(sections[day].rstrip()):] or '\n\n')
+    return preamble + ''.join(sections) + epilogue
+
+def regenerate_structured_day(form, plan, day_number, change_request):
+    """Rewrite one day of a TripPlan in place; returns the plan"""
+    if not 1 <= day_number <= len(plan.days):
+        raise ValueError(f"Itinerary has no Day {day_number}")
+
+    _, sections, _ = split_day_sections(render_markdown(plan), len(plan.days))
+    day_date = plan.days[day_number - 1].date
+    output_format = DAY_OUTPUT.render({
+        'day_number': day_number,
+        'day_date': day_date.isoformat()
+    }, halal=bool(form.halal_food.data), currency=plan.currency)
+
+    logger.info(f"Regenerating structured day {day_number} of {len(plan.days)}")
+    response = GPTModelHandler.generate_itinerary(
+        system_prompt=build_system_prompt(form),
+        user_prompt=build_day_revision_prompt(form, day_number - 1, sections, change_request, output_format),
+        temperature=0.7,
+        cache_key=get_day_revision_cache_key(form, day_number, sections[day_number - 1], change_request),
+        trip_days=1,
+        response_format=JSON_RESPONSE_FORMAT
+    )
+    day = parse_day(response, day_number)
+    day.date = day_date
+    plan.replace_day(day)
+    return plan
+
 def get_prayer_times(date, location):
     """Helper function to get prayer times for a specific date and location"""
     # TODO: Implement prayer times API integration
@@ -494,39 +621,43 @@ def calculate_travel_duration(origin, destination, mode='driving'):
 def generate_itinerary(form):
     """Generate a complete travel itinerary using the appropriate GPT model with caching."""
     try:
-        # Prepare request data for caching
-        request_data = prepare_cache_data(form)
+        # Get the appropriate model based on subscription
+        logger.info(f"Using model {current_user.gpt_model_access} for user {current_user.id}")
 
-        # Try to get cached response
-        cached_response = cache_manager.get_openai_response(request_data)
-        if cached_response:
-            logger.info("Using cached OpenAI response")
-            return cached_response
+        itinerary = get_bucketed_itinerary(form)
+        if itinerary is not None:
+            return post_process_itinerary(itinerary, form)
 
-        # Build system prompt
-        system_prompt = build_system_prompt(form)
+        if get_trip_days(form) >= PARALLEL_DAY_THRESHOLD:
+            # Long trips: overview first, then every day concurrently
+            itinerary = generate_itinerary_parallel(form)
+        else:
+            # Build system prompt
+            system_prompt = build_system_prompt(form)
 
-        # Assemble final detailed prompt
-        user_prompt = assemble_final_prompt(form)
+            # Assemble final detailed prompt
+            user_prompt = assemble_final_prompt(form)
 
-        # Get the appropriate model based on subscription
-        logger.info(f"Using model {current_user.gpt_model_access} for user {current_user.id}")
+            # Generate itinerary; GPTModelHandler caches it under the request digest
+            itinerary = GPTModelHandler.generate_itinerary(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                temperature=0.7,
+                cache_key=get_request_cache_key(form),
+                trip_days=get_trip_days(form)
+            )
 
-        # Generate itinerary
-        itinerary = GPTModelHandler.generate_itinerary(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            temperature=0.7
-        )
-
-        # Cache the response
-        cache_manager.cache_openai_response(request_data, itinerary)
+        store_bucketed_itinerary(form, itinerary)
 
         # Post-process the itinerary
         processed_itinerary = post_process_itinerary(itinerary, form)
 
         return processed_itinerary
 
+    except CircuitOpenError as e:
+        logger.warning(f"OpenAI circuit open, serving fallback itinerary: {str(e)}")
+        return get_fallback_itinerary(form)
+
     except Exception as e:
         logger.error(f"Error generating itinerary: {str(e)}")
         error_message = f"""
@@ -543,7 +674,76 @@ def generate_itinerary(form):
 
         Please try again in a few moments. If the problem persists, contact support.
         """
-        raise Exception(error_message)
+        # Keep the error type (e.g. retryable or not) while adding user-facing detail
+        error = classify_error(e)
+        raise type(error)(error_message, error.model, error.retry_after) from e
+
+def stream_itinerary(form):
+    """Stream a travel itinerary fragment by fragment as the model writes it."""
+    itinerary = get_bucketed_itinerary(form)
+    if itinerary is not None:
+        yield itinerary
+        return
+
+    system_prompt = build_system_prompt(form)
+    user_prompt = assemble_final_prompt(form)
+
+    logger.info(f"Streaming itinerary with model {current_user.gpt_model_access} for user {current_user.id}")
+
+    fragments = []
+    try:
+        for fragment in GPTModelHandler.stream_itinerary(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.7,
+            cache_key=get_request_cache_key(form),
+            trip_days=get_trip_days(form)
+        ):
+            fragments.append(fragment)
+            yield fragment
+    except CircuitOpenError as e:
+        logger.warning(f"OpenAI circuit open, serving fallback itinerary: {str(e)}")
+        yield get_fallback_itinerary(form)
+        return
+
+    store_bucketed_itinerary(form, ''.join(fragments))
+
+def get_structured_cache_key(form, temperature=0.7):
+    """Cache key for the JSON version of a trip request"""
+    data = dict(prepare_cache_data(form), output='structured', schema_version=SCHEMA_VERSION)
+    return request_digest(data, GPTModelHandler.get_model_for_user(), temperature)
+
+def build_structured_prompt(form):
+    """Trip details followed by the JSON schema the model must answer with"""
+    return build_detailed_prompt(form) + STRUCTURED_OUTPUT.render({
+        'start_date': form.start_date.data.isoformat()
+    }, halal=bool(form.halal_food.data), currency=form.currency.data)
+
+def generate_structured_itinerary(form):
+    """Generate an itinerary as a TripPlan and render it.
+
+    Returns (content, plan). If the model does not return usable JSON the
+    markdown itinerary is generated instead and plan is None.
+    """
+    logger.info(f"Generating structured itinerary with model {current_user.gpt_model_access} for user {current_user.id}")
+    try:
+        response = GPTModelHandler.generate_itinerary(
+            system_prompt=build_system_prompt(form),
+            user_prompt=build_structured_prompt(form),
+            temperature=0.7,
+            cache_key=get_structured_cache_key(form),
+            trip_days=get_trip_days(form),
+            response_format=JSON_RESPONSE_FORMAT
+        )
+        plan = parse_trip_plan(response, form.currency.data)
+    except CircuitOpenError as e:
+        logger.warning(f"OpenAI circuit open, serving fallback itinerary: {str(e)}")
+        return get_fallback_itinerary(form), None
+    except ValueError as e:
+        logger.warning(f"Structured itinerary unusable, generating markdown instead: {str(e)}")
+        return generate_itinerary(form), None
+
+    return render_markdown(plan), plan
 
 def post_process_itinerary(itinerary, form):
     """Post-process the generated itinerary for final formatting and verification"""
@@ -0,0 +1,311 @@
+import os
+import json
+import uuid
+import time
+import socket
+import sqlite3
+import logging
+from datetime import datetime, date, timedelta
+from cache_manager import CacheManager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+# A worker silent for this long (or a running SQLite job not updated for it) is presumed dead
+WORKER_TIMEOUT = int(os.getenv('ITINERARY_WORKER_TIMEOUT', 300))
+# Claims after which a job that keeps killing its worker is failed instead of run again
+MAX_JOB_ATTEMPTS = int(os.getenv('ITINERARY_JOB_MAX_ATTEMPTS', 3))
+
+class RedisJobBackend:
+    """Job storage backed by a Redis list (queue) and one hash per job.
+
+    A claimed job is moved atomically to its worker's processing list and
+    removed from it once acknowledged, so jobs of a worker that dies are
+    not lost: the next worker to start puts them back on the queue.
+    """
+    QUEUE_KEY = 'itinerary_jobs:queue'
+    JOB_PREFIX = 'itinerary_job:'
+    JOB_EXPIRY = 86400  # Keep job status for 24 hours
+    PROCESSING_PREFIX = 'itinerary_jobs:processing:'
+    WORKERS_KEY = 'itinerary_jobs:workers'
+    HEARTBEAT_PREFIX = 'itinerary_jobs:worker:'
+
+    def __init__(self, redis_client, worker_id=None):
+        self.redis = redis_client
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_key = f"{self.PROCESSING_PREFIX}{self.worker_id}"
+
+    def enqueue(self, job_id, job):
+        pipeline = self.redis.pipeline()
+        pipeline.hset(f"{self.JOB_PREFIX}{job_id}", mapping=job)
+        pipeline.expire(f"{self.JOB_PREFIX}{job_id}", self.JOB_EXPIRY)
+        pipeline.lpush(self.QUEUE_KEY, job_id)
+        pipeline.execute()
+
+    def heartbeat(self):
+        """Register this worker and mark it alive for WORKER_TIMEOUT seconds"""
+        pipeline = self.redis.pipeline()
+        pipeline.sadd(self.WORKERS_KEY, self.worker_id)
+        pipeline.set(f"{self.HEARTBEAT_PREFIX}{self.worker_id}", datetime.utcnow().isoformat(),
+                     ex=WORKER_TIMEOUT)
+        pipeline.execute()
+
+    def dequeue(self, timeout):
+        self.heartbeat()
+        job_id = self.redis.blmove(self.QUEUE_KEY, self.processing_key, timeout, 'RIGHT', 'LEFT')
+        if not job_id:
+            return None
+        job = self.get(job_id)
+        if not job:
+            logger.warning(f"Dropping expired job {job_id}")
+            self.ack(job_id)
+            return None
+        job['attempts'] = str(self.redis.hincrby(f"{self.JOB_PREFIX}{job_id}", 'attempts', 1))
+        self.update(job_id, status=STATUS_RUNNING)
+        return job
+
+    def keep_alive(self, job_id):
+        """Mark this worker and its running job alive"""
+        self.heartbeat()
+        self.update(job_id)
+
+    def ack(self, job_id):
+        """Remove a finished job from this worker's processing list"""
+        self.redis.lrem(self.processing_key, 1, job_id)
+
+    def requeue_stale(self):
+        """Queue again the jobs held by dead workers (and by this worker's previous run)"""
+        requeued = 0
+        for worker_id in self.redis.smembers(self.WORKERS_KEY):
+            if worker_id != self.worker_id and self.redis.exists(f"{self.HEARTBEAT_PREFIX}{worker_id}"):
+                continue
+            processing_key = f"{self.PROCESSING_PREFIX}{worker_id}"
+            # Newest first onto the consuming end, so the oldest job is claimed first
+            while True:
+                job_id = self.redis.lmove(processing_key, self.QUEUE_KEY, 'LEFT', 'RIGHT')
+                if not job_id:
+                    break
+                self.update(job_id, status=STATUS_QUEUED)
+                requeued += 1
+            if worker_id != self.worker_id:
+                self.redis.srem(self.WORKERS_KEY, worker_id)
+        return requeued
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = datetime.utcnow().isoformat()
+        self.redis.hset(f"{self.JOB_PREFIX}{job_id}", mapping={k: str(v) for k, v in fields.items()})
+
+    def get(self, job_id):
+        job = self.redis.hgetall(f"{self.JOB_PREFIX}{job_id}")
+        if not job:
+            return None
+        job['id'] = job_id
+        return job
+
+class SQLiteJobBackend:
+    """Local job storage for development machines without Redis"""
+    POLL_INTERVAL = 0.5  # seconds
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS itinerary_job (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    itinerary_id TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            try:
+                conn.execute('ALTER TABLE itinerary_job ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, job_id, job):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO itinerary_job (id, user_id, payload, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, job['user_id'], job['payload'], job['status'], job['created_at'], job['updated_at'])
+            )
+
+    def dequeue(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            conn = self._connect()
+            try:
+                # BEGIN IMMEDIATE takes the write lock so two workers never claim the same job
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    'SELECT id FROM itinerary_job WHERE status = ? ORDER BY created_at LIMIT 1',
+                    (STATUS_QUEUED,)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        'UPDATE itinerary_job SET status = ?, updated_at = ?, attempts = attempts + 1 WHERE id = ?',
+                        (STATUS_RUNNING, datetime.utcnow().isoformat(), row['id'])
+                    )
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+
+            if row:
+                return self.get(row['id'])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def keep_alive(self, job_id):
+        """Touch a running job so requeue_stale does not take it for abandoned"""
+        self.update(job_id)
+
+    def ack(self, job_id):
+        """Nothing to do: a job's status row is its only queue entry"""
+
+    def requeue_stale(self):
+        """Queue again the running jobs not updated for WORKER_TIMEOUT seconds"""
+        cutoff = (datetime.utcnow() - timedelta(seconds=WORKER_TIMEOUT)).isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE itinerary_job SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?',
+                (STATUS_QUEUED, datetime.utcnow().isoformat(), STATUS_RUNNING, cutoff)
+            )
+        return cursor.rowcount
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = datetime.utcnow().isoformat()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f'UPDATE itinerary_job SET {columns} WHERE id = ?',
+                [str(value) for value in fields.values()] + [job_id]
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM itinerary_job WHERE id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+        return {key: row[key] for key in row.keys() if row[key] is not None}
+
+class ItineraryJobQueue:
+    """Queue of itinerary generation jobs processed by itinerary_worker.py"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def enqueue(self, user_id, request_data):
+        """Queue a generation request and return its job id"""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        self.backend.enqueue(job_id, {
+            'user_id': str(user_id),
+            'payload': json.dumps(request_data),
+            'status': STATUS_QUEUED,
+            'created_at': now,
+            'updated_at': now
+        })
+        logger.info(f"Queued itinerary job {job_id} for user {user_id}")
+        return job_id
+
+    def dequeue(self, timeout=5):
+        """Claim the next queued job, waiting up to timeout seconds"""
+        job = self.backend.dequeue(timeout)
+        if job:
+            job['payload'] = json.loads(job['payload'])
+        return job
+
+    def keep_alive(self, job_id):
+        """Refresh a running job's heartbeat; call at least every WORKER_TIMEOUT seconds"""
+        self.backend.keep_alive(job_id)
+
+    def mark_completed(self, job_id, itinerary_id):
+        self.backend.update(job_id, status=STATUS_COMPLETED, itinerary_id=itinerary_id)
+        self.backend.ack(job_id)
+
+    def mark_failed(self, job_id, error):
+        self.backend.update(job_id, status=STATUS_FAILED, error=error)
+        self.backend.ack(job_id)
+
+    def requeue_stale(self):
+        """Queue again jobs claimed by workers that stopped; call when a worker starts"""
+        requeued = self.backend.requeue_stale()
+        if requeued:
+            logger.warning(f"Requeued {requeued} itinerary jobs left by stopped workers")
+        return requeued
+
+    def get_status(self, job_id):
+        """Get job status without the request payload"""
+        job = self.backend.get(job_id)
+        if not job:
+            return None
+        job.pop('payload', None)
+        return job
+
+_job_queue = None
+
+def get_job_queue():
+    """Get the process-wide job queue, preferring Redis over the SQLite stand-in"""
+    global _job_queue
+    if _job_queue is None:
+        redis_client = CacheManager().redis
+        if redis_client:
+            _job_queue = ItineraryJobQueue(RedisJobBackend(redis_client))
+            logger.info("Using Redis backend for itinerary jobs")
+        else:
+            path = os.getenv('ITINERARY_JOBS_SQLITE_PATH', 'instance/itinerary_jobs.db')
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            _job_queue = ItineraryJobQueue(SQLiteJobBackend(path))
+            logger.info(f"Using SQLite backend for itinerary jobs at {path}")
+    return _job_queue
+
+def form_data_from_request(request_data):
+    """Convert prepare_cache_data() output back into ItineraryForm field data"""
+    data = dict(request_data)
+    data['destinations'] = data.pop('destination')
+    data['start_date'] = date.fromisoformat(data['start_date'])
+    data['end_date'] = date.fromisoformat(data['end_date'])
+    return data
+
+def request_data_from_itinerary(itinerary):
+    """prepare_cache_data()-style dict for a stored Itinerary row"""
+    return {
+        'citizenship': itinerary.citizenship or 'malaysia',
+        'destination': itinerary.destination,
+        'specific_locations': itinerary.specific_locations or '',
+        'travel_focus': itinerary.travel_focus or [],
+        'budget': float(itinerary.budget),
+        'currency': itinerary.currency or 'MYR',
+        'include_flights': bool(itinerary.include_flights),
+        'include_accommodation': bool(itinerary.include_accommodation),
+        'num_adults': itinerary.num_adults,
+        'num_youth': itinerary.num_youth,
+        'num_children': itinerary.num_children,
+        'num_infants': itinerary.num_infants,
+        'start_date': itinerary.start_date.isoformat(),
+        'end_date': itinerary.end_date.isoformat(),
+        'halal_food': bool(itinerary.halal_food),
+        'vegan_food': bool(itinerary.vegan_food),
+        # Not stored on Itinerary
+        'wheelchair_accessible': False,
+        'need_guide': bool(itinerary.need_guide),
+        'accommodation_location': itinerary.accommodation_location or '',
+        'accommodation_name': itinerary.accommodation_name or ''
+    }
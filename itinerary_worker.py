@@ -0,0 +1,117 @@
+import os
+import sys
+import logging
+import argparse
+import threading
+import multiprocessing
+from flask_login import login_user
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def keep_alive(queue, job_id, stop, interval):
+    """Refresh a running job's heartbeat until stop is set"""
+    while not stop.wait(interval):
+        try:
+            queue.keep_alive(job_id)
+        except Exception as e:
+            logger.error(f"Error refreshing itinerary job {job_id}: {str(e)}")
+
+def process_job(app, queue, job):
+    """Generate the itinerary for one job and store the Itinerary row"""
+    from models import User
+    from forms import ItineraryForm
+    from itinerary_jobs import form_data_from_request, WORKER_TIMEOUT, MAX_JOB_ATTEMPTS
+    from views import create_itinerary_record, generate_itinerary_content, release_itinerary_credit
+
+    job_id = job['id']
+    # Without a heartbeat a job running past WORKER_TIMEOUT would be requeued and generated twice
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=keep_alive, args=(queue, job_id, stop, max(1, WORKER_TIMEOUT // 3)),
+                                 daemon=True)
+    heartbeat.start()
+    itinerary = None
+    with app.test_request_context():
+        try:
+            # A job claimed this often has crashed its workers before; stop retrying it
+            if int(job.get('attempts', 1)) > MAX_JOB_ATTEMPTS:
+                raise ValueError(f"Giving up after {MAX_JOB_ATTEMPTS} attempts")
+
+            user = User.query.get(int(job['user_id']))
+            if not user:
+                raise ValueError(f"User {job['user_id']} no longer exists")
+            login_user(user)
+
+            form = ItineraryForm(formdata=None, data=form_data_from_request(job['payload']), meta={'csrf': False})
+            content, plan = generate_itinerary_content(form)
+            itinerary = create_itinerary_record(form, content, plan, credit_reserved=True)
+
+            queue.mark_completed(job_id, itinerary.id)
+            logger.info(f"Completed itinerary job {job_id} as itinerary {itinerary.id}")
+
+        except Exception as e:
+            logger.error(f"Itinerary job {job_id} failed: {str(e)}", exc_info=True)
+            from extensions import db
+            db.session.rollback()
+            try:
+                # Give back the credit reserved when the job was queued, unless the itinerary was stored
+                if itinerary is None:
+                    release_itinerary_credit(int(job['user_id']))
+                    db.session.commit()
+            except Exception as e:
+                logger.error(f"Error releasing itinerary credit for job {job_id}: {str(e)}")
+                db.session.rollback()
+            queue.mark_failed(job_id, 'Error generating itinerary. Please try again.')
+        finally:
+            stop.set()
+            heartbeat.join()
+
+def run_worker():
+    """Worker loop: claim queued jobs and process them until interrupted"""
+    from app import create_app
+    from itinerary_jobs import get_job_queue
+
+    app = create_app()
+    queue = get_job_queue()
+    try:
+        queue.requeue_stale()
+    except Exception as e:
+        logger.error(f"Error requeuing stale itinerary jobs: {str(e)}")
+    logger.info(f"Itinerary worker {os.getpid()} started")
+
+    while True:
+        try:
+            job = queue.dequeue(timeout=5)
+        except Exception as e:
+            logger.error(f"Error claiming itinerary job: {str(e)}")
+            continue
+        if job:
+            process_job(app, queue, job)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the itinerary generation worker pool')
+    parser.add_argument('--processes', type=int,
+                        default=int(os.getenv('ITINERARY_WORKER_PROCESSES', 2)),
+                        help='Number of worker processes')
+    args = parser.parse_args()
+
+    workers = [
+        multiprocessing.Process(target=run_worker, name=f'itinerary-worker-{i}')
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Started {len(workers)} itinerary workers")
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping itinerary workers")
+        for worker in workers:
+            worker.terminate()
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
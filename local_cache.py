@@ -0,0 +1,224 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# In-process cache in front of Redis for keys that are read far more often than written
+L1_CACHE_ENABLED = os.getenv('L1_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Key prefix -> (seconds to keep, max entries); keys outside these stay Redis-only
+L1_NAMESPACES = {
+    'currency:': (300, 16),
+    'rate:': (300, 512),
+    'destination_rules:': (3600, 256),
+    'supported_currencies': (3600, 1),
+    'exchange_rates': (300, 1)
+}
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+CLEAR_ALL = '*'
+LISTENER_RETRY_DELAY = 5  # seconds before resubscribing after a Redis error
+
+MISSING = object()
+
+_buses = weakref.WeakSet()
+
+class LocalCache:
+    """Bounded, per-namespace TTL LRU kept in this process.
+
+    Values are returned as stored, without copying, so callers must treat
+    them as read-only. Only keys under a configured namespace are kept.
+    generation changes on every invalidation; a value read from Redis is
+    only kept if no invalidation happened while it was being fetched.
+    """
+
+    def __init__(self, namespaces=None):
+        self.namespaces = dict(L1_NAMESPACES if namespaces is None else namespaces)
+        # Longest prefix first so 'rate:' never shadows a more specific namespace
+        self._prefixes = sorted(self.namespaces, key=len, reverse=True)
+        # LRU order per namespace; _items maps each key to (expires_at, value, namespace)
+        self._entries = {prefix: OrderedDict() for prefix in self.namespaces}
+        self._items = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+
+    def namespace(self, key):
+        for prefix in self._prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return None
+
+    def get(self, key):
+        """The cached value, or MISSING"""
+        # Hits take no lock: the dict lookup is atomic, and an entry evicted
+        # meanwhile only means its LRU position is not refreshed. Hit and
+        # miss counts are approximate for the same reason.
+        entry = self._items.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            try:
+                self._entries[entry[2]].move_to_end(key)
+            except KeyError:
+                pass
+            self.hits += 1
+            return entry[1]
+        with self._lock:
+            if entry is not None and self._items.get(key) is entry:
+                self._remove(key)
+            if entry is not None or self.namespace(key) is not None:
+                self.misses += 1
+            return MISSING
+
+    def _remove(self, key):
+        entry = self._items.pop(key, None)
+        if entry is not None:
+            del self._entries[entry[2]][key]
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Keep value for the namespace TTL, or ttl seconds if shorter (e.g. the Redis TTL)"""
+        prefix = self.namespace(key)
+        if prefix is None:
+            return
+        namespace_ttl, max_entries = self.namespaces[prefix]
+        ttl = namespace_ttl if ttl is None else min(ttl, namespace_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            entries = self._entries[prefix]
+            entries[key] = None
+            entries.move_to_end(key)
+            self._items[key] = (time.monotonic() + ttl, value, prefix)
+            while len(entries) > max_entries:
+                del self._items[entries.popitem(last=False)[0]]
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key, every key starting with a prefix ending in '*', or everything for '*'"""
+        with self._lock:
+            self.generation += 1
+            if key == CLEAR_ALL:
+                for entries in self._entries.values():
+                    entries.clear()
+                self._items.clear()
+            elif key.endswith('*'):
+                prefix = key[:-1]
+                for cached_key in [cached_key for cached_key in self._items if cached_key.startswith(prefix)]:
+                    self._remove(cached_key)
+            else:
+                self._remove(key)
+
+    def clear(self):
+        self.invalidate(CLEAR_ALL)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': {prefix: len(entries) for prefix, entries in self._entries.items()}
+            }
+
+class InvalidationBus:
+    """Keeps every worker's LocalCache coherent over Redis pub/sub.
+
+    Writers publish the keys they change; a daemon thread in each process
+    (the writer's included) drops them from its LocalCache. Messages missed
+    while disconnected cannot be replayed, so the whole LocalCache is
+    cleared on every (re)subscribe and should only be used while listening
+    is True. The thread holds one connection from the pool.
+    """
+
+    def __init__(self, local_cache, channel=INVALIDATION_CHANNEL):
+        self.local = local_cache
+        self.channel = channel
+        self._redis = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.listening = False
+        _buses.add(self)
+
+    def publish(self, key):
+        """Invalidate key here and tell the other workers"""
+        self.local.invalidate(key)
+        if self._redis is None:
+            return
+        try:
+            self._redis.publish(self.channel, key)
+        except Exception as e:
+            logger.warning(f"Error publishing cache invalidation for {key}: {str(e)}")
+
+    def active(self, redis_client):
+        """Whether the LocalCache may be used; (re)starts the listener when needed"""
+        if self.listening and self._redis is redis_client:
+            return True
+        if self._pid != os.getpid() or self._redis is not redis_client:
+            self.start(redis_client)
+        return self.listening
+
+    def start(self, redis_client):
+        """Start listening in this process (again after a fork or reconnect)"""
+        with self._lock:
+            if (redis_client is self._redis and self._pid == os.getpid()
+                    and self._thread is not None and self._thread.is_alive()):
+                return
+            self._redis = redis_client
+            self._pid = os.getpid()
+            self.listening = False
+            self.local.clear()
+            if redis_client is None:
+                return
+            self._thread = threading.Thread(target=self._listen, args=(redis_client,),
+                                            name='cache-invalidation', daemon=True)
+            self._thread.start()
+
+    def _listen(self, redis_client):
+        while self._redis is redis_client and self._pid == os.getpid():
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.local.clear()
+                self.listening = True
+                while self._redis is redis_client:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self._handle(message['data'])
+            except Exception as e:
+                self.listening = False
+                logger.warning(f"Cache invalidation listener error, resubscribing: {str(e)}")
+                self.local.clear()
+                time.sleep(LISTENER_RETRY_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _handle(self, data):
+        # Our own messages come back too, dropping values other threads read mid-write
+        self.local.invalidate(data.decode() if isinstance(data, bytes) else data)
+
+def _reset_after_fork():
+    # The listener thread does not survive a fork; start a new one on next use
+    for bus in list(_buses):
+        bus.listening = False
+        bus._lock = threading.Lock()
+        bus.local._lock = threading.Lock()
+        bus.local.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
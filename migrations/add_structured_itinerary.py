@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app, db
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Structured (JSON) itineraries, one per itinerary
+            with db.engine.connect() as conn:
+                conn.execute(text('''
+                    CREATE TABLE IF NOT EXISTS structured_itinerary (
+                        id SERIAL PRIMARY KEY,
+                        itinerary_id INTEGER NOT NULL UNIQUE REFERENCES itinerary(id) ON DELETE CASCADE,
+                        schema_version INTEGER NOT NULL DEFAULT 1,
+                        currency VARCHAR(3) NOT NULL,
+                        data JSON NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                '''))
+                conn.commit()
+            logger.info("Successfully created structured_itinerary table")
+        except Exception as e:
+            logger.error(f"Error creating structured_itinerary table: {str(e)}")
+            db.session.rollback()
+            raise e
+
+if __name__ == '__main__':
+    upgrade()
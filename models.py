@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 from flask_login import UserMixin
 from extensions import db
 from cache_manager import CacheManager, cache_enabled
+from compression import CompressedText
+from structured_itinerary import TripPlan
 from currency_data import get_default_currency, CURRENCY_DATA, format_currency
 from decimal import Decimal
 
@@ -247,7 +249,7 @@ class Itinerary(db.Model):
     vegan_food = db.Column(db.Boolean, default=False)
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
-    content = db.Column(db.Text)
+    content = db.Column(CompressedText)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     citizenship = db.Column(db.String(100), default='malaysia')
 
@@ -255,6 +257,23 @@ class Itinerary(db.Model):
         """Format budget with proper currency"""
         return format_currency(Decimal(str(self.budget)), self.currency)
 
+class StructuredItinerary(db.Model):
+    """The JSON form of an itinerary generated in structured mode"""
+    id = db.Column(db.Integer, primary_key=True)
+    itinerary_id = db.Column(db.Integer, db.ForeignKey('itinerary.id', ondelete='CASCADE'),
+                             nullable=False, unique=True)
+    schema_version = db.Column(db.Integer, nullable=False, default=1)
+    currency = db.Column(db.String(3), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    itinerary = db.relationship('Itinerary', backref=db.backref('structured', uselist=False,
+                                                                cascade='all, delete-orphan'))
+
+    @property
+    def plan(self):
+        return TripPlan.from_dict(self.data, self.currency)
+
 class AccessViolation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
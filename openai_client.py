@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+import httpx
+from openai import OpenAI
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by every request in a worker process
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60))
+CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+
+# Alternative API endpoint, e.g. fake_openai_server.py for offline load tests
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+# Read timeout per model; long itineraries on gpt-4 take well over a minute
+MODEL_TIMEOUTS = {
+    'gpt-3.5-turbo': 90,
+    'gpt-4': 180
+}
+DEFAULT_TIMEOUT = 120
+
+class ConnectionStats:
+    """How much connection setup (TCP + TLS) the pool is saving us"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.setup_seconds = 0.0
+
+    def record(self, timing):
+        with self._lock:
+            self.requests += 1
+            if timing.new_connection:
+                self.new_connections += 1
+                self.setup_seconds += timing.setup_seconds
+
+    def snapshot(self):
+        with self._lock:
+            reused = self.requests - self.new_connections
+            average_setup = self.setup_seconds / self.new_connections if self.new_connections else 0.0
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': reused,
+                'average_setup_ms': round(average_setup * 1000, 1),
+                'estimated_saved_seconds': round(reused * average_setup, 3)
+            }
+
+class ConnectionTiming:
+    """Collects httpcore trace events for one request"""
+    SETUP_EVENTS = ('connection.connect_tcp', 'connection.start_tls')
+
+    def __init__(self):
+        self.new_connection = False
+        self.setup_seconds = 0.0
+        self._started = {}
+
+    def trace(self, event_name, info):
+        for event in self.SETUP_EVENTS:
+            if event_name == f"{event}.started":
+                self._started[event] = time.perf_counter()
+            elif event_name == f"{event}.complete" and event in self._started:
+                self.new_connection = True
+                self.setup_seconds += time.perf_counter() - self._started.pop(event)
+
+class TimedTransport(httpx.HTTPTransport):
+    """HTTP transport that records whether each request paid for a new connection"""
+    def handle_request(self, request):
+        timing = ConnectionTiming()
+        request.extensions['trace'] = timing.trace
+        try:
+            return super().handle_request(request)
+        finally:
+            _last_timing.value = timing
+            connection_stats.record(timing)
+
+connection_stats = ConnectionStats()
+_last_timing = threading.local()
+_clients = {}
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+def _build_client(api_key, base_url=None):
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+    http_client = httpx.Client(
+        transport=TimedTransport(limits=limits),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        follow_redirects=True
+    )
+    logger.info(f"Created OpenAI client pool for process {os.getpid()}"
+                + (f" against {base_url}" if base_url else ""))
+    # Retries are handled by retry_policy, not stacked on top of the SDK's own
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+def get_openai_client(api_key, base_url=None):
+    """Get this process's pooled OpenAI client, creating it on first use"""
+    base_url = base_url or OPENAI_BASE_URL
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Forked without the at-fork hook (e.g. a foreign process model)
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _build_client(api_key, base_url)
+            _clients[(api_key, base_url)] = client
+        return client
+
+def get_request_timeout(model):
+    """Per-request timeout for a model"""
+    return httpx.Timeout(MODEL_TIMEOUTS.get(model, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+
+def get_connection_stats():
+    """Connection reuse counters for this process"""
+    return connection_stats.snapshot()
+
+def last_connection_timing():
+    """Connection timing of the latest request made on this thread, if any"""
+    return getattr(_last_timing, 'value', None)
+
+def close_clients():
+    """Close every pooled client in this process"""
+    with _clients_lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Error closing OpenAI client: {str(e)}")
+        _clients.clear()
+
+def _reset_after_fork():
+    # Sockets inherited from the parent (e.g. a preloading gunicorn master)
+    # belong to the parent's pool, so drop them without closing
+    global _clients_pid, _clients_lock, connection_stats
+    _clients.clear()
+    _clients_pid = os.getpid()
+    _clients_lock = threading.Lock()
+    connection_stats = ConnectionStats()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
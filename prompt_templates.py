@@ -0,0 +1,358 @@
+import logging
+from string import Template
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class PromptTemplate:
+    """A prompt section compiled once and rendered per combination of flags.
+
+    build(**flags) returns the section text for one combination of flags
+    (halal, currency, ...) with $placeholders left for per-request fields.
+    Each variant is compiled the first time it is needed and reused, so a
+    request only pays for substituting its dynamic fields.
+    """
+    def __init__(self, name, build, maxsize=64):
+        self.name = name
+        self.build = build
+        self.variant = lru_cache(maxsize=maxsize)(self._compile)
+
+    def _compile(self, **flags):
+        logger.debug(f"Compiling prompt template {self.name} for {flags}")
+        return Template(self.build(**flags))
+
+    def render(self, fields=None, **flags):
+        """Render the cached variant for flags, filling in fields"""
+        template = self.variant(**flags)
+        if not fields:
+            return template.template
+        return template.substitute(fields)
+
+    def cache_clear(self):
+        self.variant.cache_clear()
+
+def escape(value):
+    """Escape text spliced into a template source so it is not read as a placeholder"""
+    return str(value).replace('$', '$$')
+
+SYSTEM_PROMPT_HEAD = """You are an expert travel planner specializing in creating detailed itineraries for $citizenship citizens, with real-time updates as of $timestamp.
+
+Your expertise includes:
+1. Comprehensive Cost Analysis:
+   - All prices in {currency}
+   - Peak vs. off-peak pricing
+   - Group discounts and special rates
+   - Hidden costs and fees
+   - Local tax implications
+
+2. Cultural Intelligence:
+   - Local customs and etiquette
+   - Cultural sensitivities
+   - Dress code requirements
+   - Social norms and taboos
+   - Festival and holiday impacts
+
+3. Safety and Documentation:
+   - Visa requirements and processes
+   - Insurance recommendations
+   - Emergency contacts and procedures
+   - Local healthcare facilities
+   - Travel advisories and warnings
+
+4. Transportation Expertise:
+   - Public transport systems
+   - Private transfer options
+   - Walking and cycling routes
+   - Accessibility considerations
+   - Traffic patterns and peak times
+
+5. Time Management:
+   - Opening hours and peak times
+   - Seasonal variations
+   - Queue management strategies
+   - Optimal visit durations
+   - Buffer time recommendations"""
+
+SYSTEM_PROMPT_ISLAMIC_FACILITIES = """
+6. Islamic Facilities:
+   - Prayer times for each day
+   - Mosque locations and accessibility
+   - Prayer room facilities
+   - Halal restaurant certifications
+   - Wudu facilities
+   - Qibla direction in accommodations"""
+
+SYSTEM_PROMPT_TAIL = """
+
+For every location recommended:
+1. Provide Google Maps link: [Location Name](https://www.google.com/maps/search/?api=1&query=encoded_location_name)
+2. List exact opening hours and best visit times
+3. Include real-time travel durations
+4. Specify all costs in requested currency
+5. Note accessibility features
+6. List nearby amenities
+
+Format Requirements:
+1. Use 24-hour time format (e.g., 14:30)
+2. Include day of week for all dates
+3. Structure timing in 30-minute blocks
+4. Provide exact travel durations
+5. Include alternative options for weather
+6. List exact costs with tax included"""
+
+PRICE_BREAKDOWN_SECTION = """
+1. Comprehensive Price Breakdown Required:
+   a) Transportation Analysis:
+      - Flight costs by route with peak/off-peak variations
+      - Airport transfer options and costs
+      - Local transportation passes and costs
+      - Taxi/ride-sharing estimates
+      - Inter-city travel expenses
+
+   b) Accommodation Details:
+      - Hotel rates by area/district
+      - Peak vs. off-peak pricing
+      - Additional fees (tourism tax, service charge)
+      - Family room availability and pricing
+      - Accessible room options and costs
+
+   c) Daily Expense Breakdown:
+      - Meal costs by cuisine type (local vs. international)
+      - Activity and entrance fees with age-based pricing
+      - Shopping estimates by district
+      - Entertainment costs
+      - Prayer facility locations and any associated costs
+
+2. Cost Optimization Strategies:
+   a) Currency & Payments:
+      - Current exchange rates
+      - Recommended payment methods
+      - ATM availability and fees
+      - Credit card acceptance
+
+   b) Pricing Variations:
+      - Peak vs. off-peak season differences
+      - Group discount opportunities
+      - Age-based discounts (child/senior/student)
+      - Early booking benefits
+
+   c) Money-Saving Tips:
+      - Tourist passes and city cards
+      - Combination ticket options
+      - Free walking tours and activities
+      - Budget accommodation alternatives
+      - Local market shopping tips"""
+
+REQUIREMENTS_SECTION = """
+3. Travel Requirements:
+   a) Documentation:
+      - Detailed visa requirements for $citizenship passport holders
+      - Processing time and fees
+      - Required supporting documents
+      - Embassy/consulate locations and contact details
+
+   b) Health & Safety:
+      - Required and recommended vaccinations
+      - Travel insurance recommendations
+      - Local healthcare facilities and costs
+      - Emergency numbers and procedures
+
+   c) Transportation:
+      - Public transport system overview
+      - Special passes and tourist cards
+      - Accessibility options
+      - Peak hours and service frequency
+
+   d) Weather & Seasonal Considerations:
+      - Monthly weather patterns
+      - Best times to visit
+      - Seasonal events and festivals
+      - Clothing recommendations
+
+   e) Cultural Guidelines:
+      - Local customs and etiquette
+      - Religious considerations
+      - Dress code requirements
+      - Tipping practices
+      - Cultural taboos to avoid
+
+4. Location-Specific Information:
+   a) Cultural Events:
+      - Local festivals during visit period
+      - Special events and exhibitions
+      - Traditional performances
+      - Cultural workshops
+   """
+
+ACCESSIBILITY_SECTION = """
+   b) Accessibility Information:
+      - Wheelchair access at attractions
+      - Accessible transportation options
+      - Special assistance services
+      - Accessible restroom locations
+
+   c) Family Services:
+      - Baby changing facilities
+      - Family rest areas
+      - Child-friendly attractions
+      - Kids' meal options
+      - Stroller rental services
+
+   d) Emergency Services:
+      - Hospital locations and specialties
+      - 24-hour pharmacies
+      - Police stations
+      - Embassy/consulate details
+      - Tourist police contacts
+    """
+
+RELIGIOUS_FACILITIES_SECTION = """
+   e) Religious Facilities:
+      - Nearby mosques and prayer rooms
+      - Daily prayer times:
+        * Fajr
+        * Dhuhr
+        * Asr
+        * Maghrib
+        * Isha
+      - Walking distance to prayer facilities
+      - Halal restaurants and certification details
+      - Qibla direction in accommodation
+      - Wudhu facilities availability
+      - Friday prayer recommendations
+      - Religious etiquette guidelines
+      - Local Islamic cultural considerations
+    """
+
+DAY_SCHEDULE_SECTION = """
+Day $day_number - $day_label:
+
+a) Early Morning (06:00-09:00):
+   * [Time Slot Details]
+   * Exact timing for each activity
+   * Google Maps links
+   * Transportation options
+   * Weather considerations
+   {fajr}
+
+b) Morning Activities (09:00-12:00):
+   * [Time Slot Details]
+   * Location-specific information
+   * Access requirements
+   * Cost breakdown
+   {dhuhr}
+
+c) Afternoon Activities (12:00-17:00):
+   * [Time Slot Details]
+   * Rest periods
+   * Meal recommendations
+   * Indoor/outdoor alternatives
+   {asr}
+
+d) Evening Activities (17:00-22:00):
+   * [Time Slot Details]
+   * Dinner options
+   * Entertainment choices
+   * Night activity suggestions
+   {isha}
+
+Required for each location:
+1. [Location Name](https://www.google.com/maps/search/?api=1&query=encoded_location_name)
+2. Opening hours and optimal visit time
+3. Exact costs in {currency}
+4. Travel duration from previous location
+5. Public transport options
+6. Accessibility information
+7. Weather contingency plans
+"""
+
+FINAL_INSTRUCTIONS_SECTION = """
+
+Additional Requirements:
+1. Timing:
+   - Provide exact timings for all activities
+   - Include travel duration between locations
+   - Factor in prayer times where applicable
+   - Consider peak hours and crowds
+   - Include buffer time for unexpected delays
+
+2. Location Details:
+   - Google Maps links for all locations
+   - Exact addresses
+   - Best entry/exit points
+   - Nearest public transport
+   - Parking information if relevant
+
+3. Cost Information:
+   - All prices in {currency}
+   - Include all taxes and fees
+   - List both budget and premium options
+   - Group discount opportunities
+   - Hidden costs to consider
+
+4. Weather Considerations:
+   - Indoor alternatives for outdoor activities
+   - Season-specific recommendations
+   - Weather-dependent timing adjustments
+   - Appropriate clothing suggestions
+
+Please ensure all recommendations consider:
+- Group composition and age ranges
+- Selected travel focus areas
+- Dietary requirements
+- Accessibility needs
+- Budget constraints
+- Cultural sensitivities
+"""
+
+def _build_system_prompt(halal=False, currency=''):
+    prompt = SYSTEM_PROMPT_HEAD.replace('{currency}', escape(currency))
+    if halal:
+        prompt += SYSTEM_PROMPT_ISLAMIC_FACILITIES
+    return prompt + SYSTEM_PROMPT_TAIL
+
+def _build_religious_accessibility(halal=False):
+    section = ACCESSIBILITY_SECTION
+    if halal:
+        section += RELIGIOUS_FACILITIES_SECTION
+    return section
+
+def _build_day_schedule(halal=False, currency=''):
+    prayers = {
+        'fajr': '* Prayer facilities for Fajr',
+        'dhuhr': '* Prayer facilities for Dhuhr',
+        'asr': '* Prayer facilities for Dhuhr and Asr',
+        'isha': '* Prayer facilities for Maghrib and Isha'
+    }
+    section = DAY_SCHEDULE_SECTION.replace('{currency}', escape(currency))
+    for slot, line in prayers.items():
+        section = section.replace('{' + slot + '}', line if halal else '')
+    return section
+
+def _build_final_instructions(currency=''):
+    return FINAL_INSTRUCTIONS_SECTION.replace('{currency}', escape(currency))
+
+SYSTEM_PROMPT = PromptTemplate('system_prompt', _build_system_prompt)
+PRICE_BREAKDOWN = PromptTemplate('price_breakdown', lambda: PRICE_BREAKDOWN_SECTION)
+REQUIREMENTS = PromptTemplate('requirements', lambda: REQUIREMENTS_SECTION)
+RELIGIOUS_ACCESSIBILITY = PromptTemplate('religious_accessibility', _build_religious_accessibility)
+DAY_SCHEDULE = PromptTemplate('day_schedule', _build_day_schedule)
+FINAL_INSTRUCTIONS = PromptTemplate('final_instructions', _build_final_instructions)
+
+TEMPLATES = (SYSTEM_PROMPT, PRICE_BREAKDOWN, REQUIREMENTS, RELIGIOUS_ACCESSIBILITY,
+             DAY_SCHEDULE, FINAL_INSTRUCTIONS)
+
+def precompile():
+    """Compile the variants that do not depend on currency"""
+    PRICE_BREAKDOWN.variant()
+    REQUIREMENTS.variant()
+    for halal in (False, True):
+        RELIGIOUS_ACCESSIBILITY.variant(halal=halal)
+
+def cache_clear():
+    """Drop every compiled variant (used by the benchmark and tests)"""
+    for template in TEMPLATES:
+        template.cache_clear()
+
+precompile()
@@ -0,0 +1,127 @@
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Atomically refill every bucket in KEYS and take one token from each, but only
+# if all of them have a token. Returns the wait in milliseconds (0 = granted).
+# ARGV: now_ms, then capacity and refill-per-ms for each key in order.
+TOKEN_BUCKET_SCRIPT = """
+local now_ms = tonumber(ARGV[1])
+local tokens = {}
+local wait_ms = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local refill_per_ms = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_ms')
+    local current = tonumber(state[1])
+    local updated_ms = tonumber(state[2])
+    if current == nil then
+        current = capacity
+        updated_ms = now_ms
+    end
+    current = math.min(capacity, current + math.max(0, now_ms - updated_ms) * refill_per_ms)
+    if current < 1 then
+        wait_ms = math.max(wait_ms, math.ceil((1 - current) / refill_per_ms))
+    end
+    tokens[i] = current
+end
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local refill_per_ms = tonumber(ARGV[i * 2 + 1])
+    local remaining = tokens[i]
+    if wait_ms == 0 then
+        remaining = remaining - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(remaining), 'updated_ms', tostring(now_ms))
+    redis.call('PEXPIRE', key, math.ceil(capacity / refill_per_ms) * 2)
+end
+
+return wait_ms
+"""
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller would have to wait longer than it is willing to"""
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded. Please try again in {retry_after:.0f} seconds.")
+        self.retry_after = retry_after
+
+class TokenBucketRateLimiter:
+    """Token buckets shared by all workers through Redis.
+
+    Every call takes a token from the model-wide bucket and from the bucket
+    for the caller's subscription tier, so one tier cannot starve the others
+    and the total stays under the upstream limit. acquire() returns how long
+    to wait before retrying (0 means granted). Without Redis the buckets fall
+    back to this process.
+    """
+    KEY_PREFIX = 'rate_limit:openai:'
+
+    def __init__(self, redis_client, model_limits, tier_limits=None, default_limit=50):
+        """model_limits maps model to requests/minute; tier_limits maps (model, tier)"""
+        self.redis = redis_client
+        self.model_limits = model_limits
+        self.tier_limits = tier_limits or {}
+        self.default_limit = default_limit
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT) if redis_client else None
+        self._local_buckets = {}
+        self._lock = threading.Lock()
+
+    def get_buckets(self, model, tier):
+        """(key, requests per minute) for each bucket a call must draw from"""
+        model_limit = self.model_limits.get(model, self.default_limit)
+        buckets = [(f"{self.KEY_PREFIX}{model}", model_limit)]
+        if tier:
+            tier_limit = self.tier_limits.get((model, tier), model_limit)
+            buckets.append((f"{self.KEY_PREFIX}{model}:{tier}", tier_limit))
+        return buckets
+
+    def acquire(self, model, tier=None):
+        """Try to take a token; return seconds to wait (0.0 when granted)"""
+        buckets = self.get_buckets(model, tier)
+
+        if self._script:
+            try:
+                args = [int(time.time() * 1000)]
+                for _, limit in buckets:
+                    args.extend([limit, limit / 60000.0])
+                wait_ms = self._script(keys=[key for key, _ in buckets], args=args)
+                return int(wait_ms) / 1000.0
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable, using local buckets: {str(e)}")
+
+        return self._acquire_local(buckets)
+
+    def _acquire_local(self, buckets):
+        now_ms = time.monotonic() * 1000
+        with self._lock:
+            refilled = []
+            wait_ms = 0.0
+            for key, limit in buckets:
+                refill_per_ms = limit / 60000.0
+                tokens, updated_ms = self._local_buckets.get(key, (limit, now_ms))
+                tokens = min(limit, tokens + (now_ms - updated_ms) * refill_per_ms)
+                if tokens < 1:
+                    wait_ms = max(wait_ms, (1 - tokens) / refill_per_ms)
+                refilled.append((key, tokens))
+
+            for key, tokens in refilled:
+                self._local_buckets[key] = (tokens if wait_ms else tokens - 1, now_ms)
+            return wait_ms / 1000.0
+
+    def wait(self, model, tier=None, max_wait=30):
+        """Block until a token is granted, queueing for at most max_wait seconds"""
+        waited = 0.0
+        while True:
+            delay = self.acquire(model, tier)
+            if not delay:
+                return waited
+            if waited + delay > max_wait:
+                raise RateLimitExceeded(delay)
+            logger.info(f"Rate limited for {model}/{tier}, waiting {delay:.2f}s")
+            time.sleep(delay)
+            waited += delay
@@ -1,43 +1,210 @@
 import os
+import time
 import redis
 import logging
+import threading
+from urllib.parse import urlparse
 
+# Configure logging
 logger = logging.getLogger(__name__)
 
-def get_redis_client():
-    """Get Redis client with fallback options"""
+# Logical clients, each with its own pool so a burst of cache traffic cannot
+# starve sessions or rate limiting of connections
+ROLE_SESSION = 'session'
+ROLE_CACHE = 'cache'
+ROLE_RATE_LIMIT = 'rate_limit'
+ROLES = {
+    ROLE_SESSION: {'decode_responses': False},  # Flask-Session stores pickled bytes
+    ROLE_CACHE: {'decode_responses': True},
+    ROLE_RATE_LIMIT: {'decode_responses': True}
+}
+
+# Connections per role and process; REDIS_<ROLE>_POOL_SIZE overrides one role
+POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', 10))
+POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 5))  # seconds to wait for a free connection
+HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))  # idle seconds before a ping
+SOCKET_TIMEOUT = 5
+RETRY_INTERVAL = 30  # seconds before an unreachable server is tried again
+SCAN_BATCH_SIZE = int(os.getenv('REDIS_SCAN_BATCH_SIZE', 500))  # keys per SCAN/UNLINK round trip
+
+DEFAULT_REDIS_URL = 'redis://localhost:6380'
+
+def parse_redis_url(url):
+    """Parse Redis URL, handling both standard Redis URLs and Upstash HTTPS URLs."""
     try:
-        # Try Upstash Redis first
-        redis_url = os.getenv('UPSTASH_REDIS_URL')
-        if redis_url:
-            client = redis.from_url(
-                redis_url,
-                decode_responses=False,
-                socket_timeout=5,
-                retry_on_timeout=True,
-                socket_connect_timeout=5,
-                socket_keepalive=True
-            )
-            # Test connection
-            client.ping()
-            logger.info("Successfully connected to Upstash Redis")
-            return client
+        if not url:
+            logger.warning("No Redis URL provided, using default localhost")
+            return DEFAULT_REDIS_URL
+
+        if url.startswith('https://'):
+            # Parse Upstash URL format
+            parsed = urlparse(url)
+
+            # Extract auth from netloc or username/password from path
+            if '@' in parsed.netloc:
+                auth = parsed.netloc.split('@')[0]
+                host = parsed.netloc.split('@')[1]
+            else:
+                auth = parsed.username + ':' + parsed.password if parsed.username and parsed.password else None
+                host = parsed.hostname
+
+            if not auth or not host:
+                logger.error("Invalid Upstash URL format")
+                return DEFAULT_REDIS_URL
+
+            # Construct Redis URL
+            return f"rediss://{auth}@{host}"
 
-        # Try local Redis as fallback
-        client = redis.Redis(
-            host='localhost',
-            port=6380,
-            decode_responses=False,
-            socket_timeout=5,
-            retry_on_timeout=True
-        )
+        elif url.startswith('redis://') or url.startswith('rediss://'):
+            return url
+
+        else:
+            logger.warning(f"Unrecognized Redis URL format: {url}")
+            return DEFAULT_REDIS_URL
+
+    except Exception as e:
+        logger.error(f"Error parsing Redis URL: {str(e)}")
+        return DEFAULT_REDIS_URL
+
+def get_pool_size(role):
+    return int(os.getenv(f"REDIS_{role.upper()}_POOL_SIZE", POOL_SIZE))
+
+def _connection_options(url, role):
+    options = {
+        'max_connections': get_pool_size(role),
+        'timeout': POOL_TIMEOUT,
+        'health_check_interval': HEALTH_CHECK_INTERVAL,
+        'socket_timeout': SOCKET_TIMEOUT,
+        'socket_connect_timeout': SOCKET_TIMEOUT,
+        'socket_keepalive': True,
+        'retry_on_timeout': True,
+        **ROLES[role]
+    }
+    # Upstash hands out the password separately from the URL
+    token = os.getenv('UPSTASH_REDIS_TOKEN')
+    if token and not urlparse(url).password:
+        options.update({'username': 'default', 'password': token})
+    if url.startswith('rediss://'):
+        options['ssl_cert_reqs'] = None
+    return options
+
+_clients = {}
+_unavailable_until = {}
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+def _build_client(role):
+    url = parse_redis_url(os.getenv('UPSTASH_REDIS_URL', DEFAULT_REDIS_URL))
+    pool = redis.BlockingConnectionPool.from_url(url, **_connection_options(url, role))
+    client = redis.Redis(connection_pool=pool)
+    try:
         client.ping()
-        logger.info("Successfully connected to local Redis")
+    except Exception:
+        pool.disconnect()
+        raise
+    logger.info(f"Created Redis {role} pool of {pool.max_connections} for process {os.getpid()}")
+    return client
+
+def get_redis(role=ROLE_CACHE):
+    """Get this process's pooled Redis client for role, or None when Redis is unreachable.
+
+    The client is created and pinged once; after that connections come from
+    the pool and are health-checked when idle, so no request pays for
+    connection setup. An unreachable server is retried every RETRY_INTERVAL.
+    """
+    global _clients_pid
+    client = _clients.get(role)
+    if client is not None and _clients_pid == os.getpid():
         return client
 
-    except redis.ConnectionError as e:
-        logger.warning(f"Redis connection failed: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error connecting to Redis: {str(e)}")
-        return None
\ No newline at end of file
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Forked without the at-fork hook (e.g. a foreign process model)
+            _clients.clear()
+            _unavailable_until.clear()
+            _clients_pid = os.getpid()
+
+        client = _clients.get(role)
+        if client is not None:
+            return client
+        if time.monotonic() < _unavailable_until.get(role, 0):
+            return None
+
+        try:
+            client = _build_client(role)
+        except Exception as e:
+            logger.warning(f"Redis unavailable for {role}, retrying in {RETRY_INTERVAL}s: {str(e)}")
+            _unavailable_until[role] = time.monotonic() + RETRY_INTERVAL
+            return None
+
+        _clients[role] = client
+        _unavailable_until.pop(role, None)
+        return client
+
+def warm_up():
+    """Create every role's pool now, so the first requests do not"""
+    return {role: get_redis(role) is not None for role in ROLES}
+
+def reset_redis(role=None):
+    """Close and forget one role's pool (or all), forcing a reconnect on next use"""
+    with _clients_lock:
+        for name in ([role] if role else list(ROLES)):
+            client = _clients.pop(name, None)
+            _unavailable_until.pop(name, None)
+            if client is not None:
+                try:
+                    client.connection_pool.disconnect()
+                except Exception as e:
+                    logger.warning(f"Error closing Redis {name} pool: {str(e)}")
+
+def get_redis_health():
+    """Ping each role's pool: {role: {'connected', 'latency_ms', 'max_connections'}}"""
+    health = {}
+    for role in ROLES:
+        client = _clients.get(role)
+        status = {'connected': False, 'latency_ms': None, 'max_connections': get_pool_size(role)}
+        if client is not None:
+            started_at = time.perf_counter()
+            try:
+                client.ping()
+                status['connected'] = True
+                status['latency_ms'] = round((time.perf_counter() - started_at) * 1000, 1)
+            except Exception as e:
+                logger.warning(f"Redis {role} health check failed: {str(e)}")
+        health[role] = status
+    return health
+
+def delete_matching(client, pattern, batch_size=None):
+    """Delete every key matching pattern; returns how many were deleted.
+
+    Walks the keyspace with SCAN and UNLINKs each batch, so the server is
+    never blocked the way KEYS is. Keys created while the scan runs may
+    survive it.
+    """
+    batch_size = batch_size or SCAN_BATCH_SIZE
+    deleted = 0
+    batch = []
+    for key in client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted += client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += client.unlink(*batch)
+    return deleted
+
+def get_redis_client():
+    """Get the pooled Redis client for session data (bytes, not decoded)"""
+    return get_redis(ROLE_SESSION)
+
+def _reset_after_fork():
+    # Sockets inherited from the parent (e.g. a preloading gunicorn master)
+    # belong to the parent's pools, so drop them without closing
+    global _clients_pid, _clients_lock
+    _clients.clear()
+    _unavailable_until.clear()
+    _clients_pid = os.getpid()
+    _clients_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -2,45 +2,13 @@ import os
 import redis
 import logging
 from urllib.parse import urlparse
+from redis_config import delete_matching, get_redis_client
 
 logger = logging.getLogger(__name__)
 
 def get_redis_connection():
-    """Get Redis connection using Upstash credentials."""
-    try:
-        # Get credentials from environment variables
-        redis_host = os.getenv('PGHOST', 'verified-kid-26523.upstash.io')  # Your Upstash host
-        redis_password = os.getenv('UPSTASH_REDIS_TOKEN')  # Your Upstash password
-
-        if not redis_host or not redis_password:
-            logger.warning("Redis credentials not found in environment variables")
-            return None
-
-        # Create Redis connection
-        redis_client = redis.Redis(
-            host=redis_host,
-            port=6379,
-            password=redis_password,
-            ssl=True,
-            socket_timeout=5,
-            retry_on_timeout=True,
-            socket_connect_timeout=5,
-            socket_keepalive=True,
-            charset="utf-8",
-            decode_responses=False,  # Important: Set to False for session data
-            health_check_interval=30,
-            max_connections=10,
-            encoding='utf-8'
-        )
-
-        # Test connection
-        redis_client.ping()
-        logger.info("Successfully connected to Redis")
-        return redis_client
-
-    except Exception as e:
-        logger.error(f"Failed to connect to Redis: {str(e)}")
-        return None
+    """Get the pooled Redis client for session data."""
+    return get_redis_client()
 
 def parse_redis_url():
     """Parse Redis URL, handling both standard Redis URLs and Upstash HTTPS URLs."""
@@ -128,14 +96,10 @@ def clear_redis_session():
         redis_client = get_redis_connection()
         if redis_client:
             # Clear session data
-            session_keys = redis_client.keys('session:*')
-            if session_keys:
-                redis_client.delete(*session_keys)
+            delete_matching(redis_client, 'session:*')
 
             # Clear any other temporary keys
-            temp_keys = redis_client.keys('temp:*')
-            if temp_keys:
-                redis_client.delete(*temp_keys)
+            delete_matching(redis_client, 'temp:*')
 
             logger.info("Successfully cleared Redis session data")
             return True
@@ -0,0 +1,102 @@
+import os
+import re
+import math
+import logging
+from datetime import date, timedelta
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Share cached itineraries between requests that only differ in details the
+# itinerary does not depend on (exact budget, exact dates, spelling of places)
+NORMALIZATION_ENABLED = os.getenv('CACHE_NORMALIZATION_ENABLED', 'true').lower() == 'true'
+
+# Budgets within the same geometric band (e.g. 4,000-5,000 at 1.25) share a key
+BUDGET_BAND_RATIO = float(os.getenv('CACHE_BUDGET_BAND_RATIO', 1.25))
+
+SEASONS = {
+    12: 'winter', 1: 'winter', 2: 'winter',
+    3: 'spring', 4: 'spring', 5: 'spring',
+    6: 'summer', 7: 'summer', 8: 'summer',
+    9: 'autumn', 10: 'autumn', 11: 'autumn'
+}
+
+LOCATION_SEPARATORS = re.compile(r'[,;\n]+')
+ISO_DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+
+def budget_band(budget, ratio=None):
+    """Index of the geometric band a budget falls in"""
+    ratio = ratio or BUDGET_BAND_RATIO
+    budget = float(budget or 0)
+    if budget <= 1:
+        return 0
+    return int(math.floor(math.log(budget) / math.log(ratio)))
+
+def date_pattern(start_date, end_date):
+    """Describe a trip by starting weekday, length and season instead of exact dates"""
+    start_date = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+    end_date = date.fromisoformat(end_date) if isinstance(end_date, str) else end_date
+    return {
+        'start_weekday': start_date.strftime('%A'),
+        'days': (end_date - start_date).days + 1,
+        'season': SEASONS[start_date.month]
+    }
+
+def canonical_text(value):
+    """Case- and whitespace-insensitive form of free text"""
+    if not value:
+        return ''
+    return ' '.join(str(value).split()).casefold()
+
+def canonical_locations(value):
+    """Sorted, de-duplicated, case-folded list of requested places"""
+    if not value:
+        return []
+    places = {canonical_text(place) for place in LOCATION_SEPARATORS.split(str(value))}
+    return sorted(place for place in places if place)
+
+def normalize_request(data):
+    """Map prepare_cache_data() output to the fields a cached itinerary is shared on.
+
+    The currency stays exact: prices in the generated text are not converted
+    when a cached itinerary is reused.
+    """
+    normalized = dict(data)
+    normalized.pop('start_date', None)
+    normalized.pop('end_date', None)
+    normalized.update(date_pattern(data['start_date'], data['end_date']))
+    normalized['budget'] = budget_band(data.get('budget'))
+    normalized['specific_locations'] = canonical_locations(data.get('specific_locations'))
+    normalized['accommodation_location'] = canonical_text(data.get('accommodation_location'))
+    normalized['accommodation_name'] = canonical_text(data.get('accommodation_name'))
+    return normalized
+
+def shift_dates(text, days):
+    """Move every ISO date in text by the given number of days"""
+    if not days:
+        return text
+
+    def shift(match):
+        try:
+            original = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return match.group(0)
+        return (original + timedelta(days=days)).isoformat()
+
+    return ISO_DATE_PATTERN.sub(shift, text)
+
+def rerender_itinerary(text, cached_start_date, start_date, replacements=None):
+    """Adapt an itinerary generated for another request in the same bucket.
+
+    Trips in a bucket start on the same weekday, so shifting dates keeps the
+    day names correct. replacements maps text from the original request
+    (e.g. formatted budget figures) to this request's values.
+    """
+    cached_start_date = date.fromisoformat(cached_start_date) if isinstance(cached_start_date, str) else cached_start_date
+    start_date = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+
+    text = shift_dates(text, (start_date - cached_start_date).days)
+    for old, new in (replacements or {}).items():
+        if old and old != new:
+            text = text.replace(old, new)
+    return text
@@ -0,0 +1,176 @@
+import time
+import random
+import logging
+import threading
+import openai
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class ItineraryGenerationError(Exception):
+    """An itinerary could not be generated; retryable errors may succeed later"""
+    retryable = False
+
+    def __init__(self, message, model=None, retry_after=None):
+        super().__init__(message)
+        self.model = model
+        self.retry_after = retry_after
+
+class TransientUpstreamError(ItineraryGenerationError):
+    """OpenAI failed in a way that is worth retrying (5xx, connection reset)"""
+    retryable = True
+
+class UpstreamTimeoutError(TransientUpstreamError):
+    """OpenAI did not answer in time"""
+
+class UpstreamRateLimitError(TransientUpstreamError):
+    """OpenAI asked us to slow down (429)"""
+
+class UpstreamQuotaError(ItineraryGenerationError):
+    """The account is out of credit; retrying cannot help"""
+
+class UpstreamAuthError(ItineraryGenerationError):
+    """The API key is missing, invalid or lacks access to the model"""
+
+class InvalidRequestError(ItineraryGenerationError):
+    """The request itself is wrong (e.g. context length exceeded)"""
+
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+def parse_retry_after(response):
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers"""
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def classify_error(error, model=None):
+    """Map an exception from the OpenAI client onto an ItineraryGenerationError"""
+    if isinstance(error, ItineraryGenerationError):
+        return error
+
+    message = str(error)
+    if isinstance(error, openai.APITimeoutError):
+        return UpstreamTimeoutError(message, model)
+    if isinstance(error, openai.APIConnectionError):
+        return TransientUpstreamError(message, model)
+    if isinstance(error, openai.APIStatusError):
+        retry_after = parse_retry_after(error.response)
+        if isinstance(error, openai.RateLimitError):
+            if getattr(error, 'code', None) == 'insufficient_quota':
+                return UpstreamQuotaError(message, model)
+            return UpstreamRateLimitError(message, model, retry_after)
+        if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            return UpstreamAuthError(message, model)
+        if error.status_code >= 500 or error.status_code in RETRYABLE_STATUS_CODES:
+            return TransientUpstreamError(message, model, retry_after)
+        return InvalidRequestError(message, model)
+    if isinstance(error, ValueError):
+        return InvalidRequestError(message, model)
+    return ItineraryGenerationError(message, model)
+
+class RetryPolicy:
+    """Retries with jittered exponential backoff under a deadline and a shared budget.
+
+    Only retryable errors are retried. Retry-After from the server is
+    honoured. Across all workers, retries may not exceed min_retries plus
+    budget_ratio of the requests seen in the last window, so an outage does
+    not turn into a retry storm. Without Redis the budget is per process.
+    """
+    BUDGET_PREFIX = 'retry_budget:'
+
+    def __init__(self, redis_client, name='openai', max_attempts=3, base_delay=1.0, max_delay=20.0,
+                 budget_ratio=0.1, min_retries=10, budget_window=60):
+        self.redis = redis_client
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_retries = min_retries
+        self.budget_window = budget_window
+        self._local_counts = {}
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter delay before retry number attempt (1-based)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _budget_key(self):
+        return f"{self.BUDGET_PREFIX}{self.name}:{int(time.time() // self.budget_window)}"
+
+    def _increment(self, field, amount=1):
+        """Add amount to field; returns (requests, retries) of the window just after, atomically"""
+        key = self._budget_key()
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hincrby(key, field, amount)
+                pipe.hmget(key, 'requests', 'retries')
+                pipe.expire(key, self.budget_window * 2)
+                requests, retries = pipe.execute()[1]
+                return int(requests or 0), int(retries or 0)
+            except Exception as e:
+                logger.warning(f"Retry budget unavailable, using local budget: {str(e)}")
+        with self._lock:
+            counts = self._local_counts.setdefault(key, {'requests': 0, 'retries': 0})
+            counts[field] += amount
+            return counts['requests'], counts['retries']
+
+    def acquire_retry(self):
+        """Take one retry from the shared budget; False when it is spent.
+
+        The retry is counted first and given back if it went over the
+        budget, so concurrent retries cannot all pass the check.
+        """
+        requests, retries = self._increment('retries')
+        if retries > self.min_retries + self.budget_ratio * requests:
+            self._increment('retries', -1)
+            return False
+        return True
+
+    def call(self, func, deadline=None, model=None, passthrough=()):
+        """Run func, retrying retryable failures until success, the deadline or the budget.
+
+        Errors are raised as ItineraryGenerationError subclasses, except
+        passthrough types which the caller handles itself.
+        """
+        self._increment('requests')
+        deadline_at = time.monotonic() + deadline if deadline else None
+        attempt = 1
+
+        while True:
+            try:
+                return func()
+            except passthrough:
+                raise
+            except Exception as e:
+                error = classify_error(e, model)
+                if error is not e:
+                    error.__cause__ = e
+
+                if not error.retryable or attempt >= self.max_attempts:
+                    raise error
+
+                delay = self.backoff(attempt, error.retry_after)
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    logger.warning(f"Not retrying {type(error).__name__}: {delay:.1f}s wait would pass the deadline")
+                    raise error
+                if not self.acquire_retry():
+                    logger.warning(f"Retry budget for {self.name} exhausted, failing {type(error).__name__}")
+                    raise error
+
+                logger.warning(f"Attempt {attempt} failed with {type(error).__name__}: {str(error)}. "
+                               f"Retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
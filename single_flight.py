@@ -0,0 +1,100 @@
+import time
+import uuid
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SingleFlight:
+    """Coalesce identical in-flight work across all workers using a Redis lock.
+
+    The first caller for a key takes the lock and runs compute(); it is
+    expected to publish its result somewhere load() can read it (the response
+    cache). Later callers poll load() until the result appears, the leader
+    gives up, or wait_timeout passes, in which case they compute themselves.
+    """
+    LOCK_PREFIX = 'single_flight:'
+
+    def __init__(self, redis_client, lock_timeout=120, wait_timeout=90, poll_interval=0.5):
+        self.redis = redis_client
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    def _acquire(self, lock_key, token):
+        return bool(self.redis.set(lock_key, token, nx=True, ex=self.lock_timeout))
+
+    def _release(self, lock_key, token):
+        try:
+            self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.warning(f"Error releasing single-flight lock {lock_key}: {str(e)}")
+
+    def _lead(self, lock_key, token, compute):
+        try:
+            return compute()
+        finally:
+            self._release(lock_key, token)
+
+    def do_if_idle(self, key, compute):
+        """Run compute() unless another worker already is; returns (ran, result)"""
+        if not self.redis:
+            return True, compute()
+
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._acquire(lock_key, token)
+        except Exception as e:
+            logger.warning(f"Single-flight lock unavailable, skipping {key}: {str(e)}")
+            return False, None
+
+        if not acquired:
+            return False, None
+        return True, self._lead(lock_key, token, compute)
+
+    def do(self, key, compute, load):
+        """Run compute() once per key across workers; others wait for load()"""
+        if not self.redis:
+            return compute()
+
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = self._acquire(lock_key, token)
+        except Exception as e:
+            logger.warning(f"Single-flight lock unavailable, computing directly: {str(e)}")
+            return compute()
+
+        if acquired:
+            return self._lead(lock_key, token, compute)
+
+        logger.info(f"Waiting on in-flight request for {key}")
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+
+            result = load()
+            if result is not None:
+                logger.info(f"Coalesced onto in-flight result for {key}")
+                return result
+
+            # Leader finished without publishing (e.g. it failed): take over
+            try:
+                if not self.redis.exists(lock_key) and self._acquire(lock_key, token):
+                    return self._lead(lock_key, token, compute)
+            except Exception as e:
+                logger.warning(f"Single-flight lock check failed: {str(e)}")
+                break
+
+        logger.warning(f"Timed out waiting for in-flight request {key}, computing directly")
+        return compute()
@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import logging
+import urllib.parse
+from dataclasses import dataclass, field, asdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+from currency_data import format_currency, get_currency_info
+from prompt_templates import PromptTemplate, escape
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Ask the model for JSON instead of markdown and keep it next to the Itinerary row
+STRUCTURED_ENABLED = os.getenv('STRUCTURED_ITINERARIES_ENABLED', 'false').lower() == 'true'
+
+# Bump when the schema changes; stored plans keep the version they were written with
+SCHEMA_VERSION = 1
+
+TIME_SLOTS = {
+    'early_morning': 'Early Morning (06:00-09:00)',
+    'morning': 'Morning Activities (09:00-12:00)',
+    'afternoon': 'Afternoon Activities (12:00-17:00)',
+    'evening': 'Evening Activities (17:00-22:00)'
+}
+
+COST_CATEGORIES = ('flights', 'accommodation', 'food', 'transport', 'activities', 'other')
+
+ITINERARY_SCHEMA = {
+    'type': 'object',
+    'required': ['title', 'overview', 'days', 'cost_summary'],
+    'properties': {
+        'title': {'type': 'string'},
+        'overview': {'type': 'string'},
+        'days': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['day_number', 'date', 'title', 'activities'],
+                'properties': {
+                    'day_number': {'type': 'integer'},
+                    'date': {'type': 'string', 'format': 'date'},
+                    'title': {'type': 'string'},
+                    'activities': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'required': ['time', 'slot', 'title', 'cost'],
+                            'properties': {
+                                'time': {'type': 'string', 'pattern': '^[0-2][0-9]:[0-5][0-9]$'},
+                                'slot': {'enum': list(TIME_SLOTS)},
+                                'title': {'type': 'string'},
+                                'location': {
+                                    'type': ['object', 'null'],
+                                    'required': ['name'],
+                                    'properties': {
+                                        'name': {'type': 'string'},
+                                        'address': {'type': 'string'}
+                                    }
+                                },
+                                'cost': {'type': 'number', 'description': 'Total for the group, 0 if free'},
+                                'category': {'enum': list(COST_CATEGORIES)},
+                                'transport': {'type': 'string', 'description': 'How to get here and how long it takes'},
+                                'notes': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        'cost_summary': {
+            'type': 'object',
+            'properties': {category: {'type': 'number'} for category in COST_CATEGORIES}
+        },
+        'tips': {'type': 'array', 'items': {'type': 'string'}}
+    }
+}
+
+STRUCTURED_OUTPUT_SECTION = """
+Output Format:
+Respond with a single JSON object and nothing else, matching this JSON schema:
+{schema}
+
+Rules:
+- One entry in "days" per trip day, in order, with ISO dates starting $start_date
+- Every activity has a 24-hour "time" and the "slot" it falls in
+- "cost" is the total for the whole group in {currency} as a plain number, 0 when free
+- "cost_summary" totals each category in {currency} for the whole trip
+- Use real, specific place names in "location.name"; do not include links
+- Put visa, documentation, safety and cultural notes in "tips"
+"""
+
+STRUCTURED_HALAL_RULE = "- Mention halal food and nearby prayer facilities in each day's \"notes\"\n"
+
+def _build_structured_output(halal=False, currency=''):
+    section = STRUCTURED_OUTPUT_SECTION.replace('{currency}', escape(currency))
+    section = section.replace('{schema}', escape(json.dumps(ITINERARY_SCHEMA, separators=(',', ':'))))
+    if halal:
+        section += STRUCTURED_HALAL_RULE
+    return section
+
+STRUCTURED_OUTPUT = PromptTemplate('structured_output', _build_structured_output)
+
+DAY_OUTPUT_SECTION = """
+Output Format:
+Respond with a single JSON object for this one day and nothing else, matching this JSON schema:
+{schema}
+
+Rules:
+- "day_number" is $day_number and "date" is $day_date
+- Every activity has a 24-hour "time" and the "slot" it falls in
+- "cost" is the total for the whole group in {currency} as a plain number, 0 when free
+- Use real, specific place names in "location.name"; do not include links
+"""
+
+def _build_day_output(halal=False, currency=''):
+    day_schema = ITINERARY_SCHEMA['properties']['days']['items']
+    section = DAY_OUTPUT_SECTION.replace('{currency}', escape(currency))
+    section = section.replace('{schema}', escape(json.dumps(day_schema, separators=(',', ':'))))
+    if halal:
+        section += STRUCTURED_HALAL_RULE
+    return section
+
+DAY_OUTPUT = PromptTemplate('structured_day_output', _build_day_output)
+
+# JSON mode for models that support it; others rely on the prompt alone
+JSON_RESPONSE_FORMAT = {'type': 'json_object'}
+
+JSON_OBJECT_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value if value is not None else 0))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {value!r}")
+
+@dataclass
+class Location:
+    name: str
+    address: str = ''
+
+    @property
+    def map_link(self):
+        query = f"{self.name}, {self.address}" if self.address else self.name
+        return f"https://www.google.com/maps/search/?api=1&query={urllib.parse.quote(query)}"
+
+@dataclass
+class Activity:
+    time: str
+    slot: str
+    title: str
+    cost: Decimal
+    location: Optional[Location] = None
+    category: str = 'activities'
+    transport: str = ''
+    notes: str = ''
+
+@dataclass
+class Day:
+    day_number: int
+    date: date
+    title: str
+    activities: List[Activity] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data, number):
+        """Validate one day of model output (number is its 1-based position); raises ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError(f"Day {number} must be a JSON object")
+        items = data.get('activities') or []
+        if not isinstance(items, list):
+            raise ValueError(f"Activities of day {number} must be a JSON array")
+        activities = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError(f"Activity {item!r} on day {number} must be a JSON object")
+            if item.get('slot') not in TIME_SLOTS:
+                raise ValueError(f"Unknown time slot {item.get('slot')!r} on day {number}")
+            location = item.get('location')
+            activities.append(Activity(
+                time=str(item.get('time', '')),
+                slot=item['slot'],
+                title=str(item.get('title', '')),
+                cost=to_decimal(item.get('cost')),
+                location=Location(str(location['name']), str(location.get('address') or ''))
+                if isinstance(location, dict) and location.get('name') else None,
+                category=item.get('category') if item.get('category') in COST_CATEGORIES else 'activities',
+                transport=str(item.get('transport') or ''),
+                notes=str(item.get('notes') or '')
+            ))
+        try:
+            day_date = date.fromisoformat(str(data['date']))
+        except (KeyError, ValueError):
+            raise ValueError(f"Day {number} has no valid date")
+        try:
+            day_number = int(data.get('day_number', number))
+        except (TypeError, ValueError):
+            raise ValueError(f"Day {number} has no valid day_number")
+        return cls(day_number, day_date, str(data.get('title', '')), activities)
+
+    def slot_activities(self, slot):
+        return sorted((activity for activity in self.activities if activity.slot == slot),
+                      key=lambda activity: activity.time)
+
+@dataclass
+class TripPlan:
+    """A generated itinerary as typed data; all amounts are in currency"""
+    title: str
+    overview: str
+    currency: str
+    days: List[Day]
+    cost_summary: Dict[str, Decimal]
+    tips: List[str] = field(default_factory=list)
+
+    @property
+    def total_cost(self):
+        return sum(self.cost_summary.values(), Decimal('0'))
+
+    @classmethod
+    def from_dict(cls, data, currency=None):
+        """Validate model output (or a stored plan) and build a TripPlan; raises ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError("Itinerary must be a JSON object")
+        missing = [key for key in ITINERARY_SCHEMA['required'] if key not in data]
+        if missing:
+            raise ValueError(f"Itinerary is missing {', '.join(missing)}")
+
+        if not isinstance(data['days'], list):
+            raise ValueError("Itinerary days must be a JSON array")
+        days = [Day.from_dict(day, number) for number, day in enumerate(data['days'], start=1)]
+        if not days:
+            raise ValueError("Itinerary has no days")
+        if not isinstance(data.get('cost_summary') or {}, dict):
+            raise ValueError("Itinerary cost_summary must be a JSON object")
+
+        return cls(
+            title=str(data['title']),
+            overview=str(data['overview']),
+            currency=currency or data.get('currency') or 'MYR',
+            days=days,
+            cost_summary={category: to_decimal(amount)
+                          for category, amount in (data.get('cost_summary') or {}).items()
+                          if category in COST_CATEGORIES},
+            tips=[str(tip) for tip in data.get('tips') or []]
+        )
+
+    def day_costs(self, day):
+        """Activity costs of one day by category"""
+        costs = {}
+        for activity in day.activities:
+            costs[activity.category] = costs.get(activity.category, Decimal('0')) + activity.cost
+        return costs
+
+    def replace_day(self, day):
+        """Swap in a regenerated day, moving the cost summary by the difference in its costs"""
+        index = day.day_number - 1
+        old_costs, new_costs = self.day_costs(self.days[index]), self.day_costs(day)
+        for category in set(old_costs) | set(new_costs):
+            change = new_costs.get(category, Decimal('0')) - old_costs.get(category, Decimal('0'))
+            if change:
+                self.cost_summary[category] = max(Decimal('0'), self.cost_summary.get(category, Decimal('0')) + change)
+        self.days[index] = day
+
+    def to_dict(self):
+        """JSON-serializable form, as stored in StructuredItinerary.data"""
+        data = asdict(self)
+        for day in data['days']:
+            day['date'] = day['date'].isoformat()
+            for activity in day['activities']:
+                activity['cost'] = str(activity['cost'])
+        data['cost_summary'] = {category: str(amount) for category, amount in data['cost_summary'].items()}
+        return data
+
+def parse_trip_plan(text, currency):
+    """Parse a model response into a TripPlan, tolerating text around the JSON"""
+    match = JSON_OBJECT_PATTERN.search(text or '')
+    if not match:
+        raise ValueError("Response contains no JSON object")
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+    return TripPlan.from_dict(data, currency)
+
+def parse_day(text, day_number):
+    """Parse a regenerated day from a model response"""
+    match = JSON_OBJECT_PATTERN.search(text or '')
+    if not match:
+        raise ValueError("Response contains no JSON object")
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+    day = Day.from_dict(data, day_number)
+    day.day_number = day_number
+    return day
+
+def convert_trip_plan(plan, to_currency, rate):
+    """Copy of plan with every amount multiplied by rate (from plan.currency to to_currency)"""
+    rate = to_decimal(rate)
+    places = get_currency_info(to_currency).decimal_places if get_currency_info(to_currency) else 2
+    quantum = Decimal(1).scaleb(-places)
+
+    def convert(amount):
+        return (amount * rate).quantize(quantum)
+
+    data = plan.to_dict()
+    converted = TripPlan.from_dict(data, to_currency)
+    for day in converted.days:
+        for activity in day.activities:
+            activity.cost = convert(activity.cost)
+    converted.cost_summary = {category: convert(amount) for category, amount in converted.cost_summary.items()}
+    return converted
+
+def render_markdown(plan):
+    """Render a TripPlan in the same markdown layout as free-form itineraries"""
+    lines = [f"# {plan.title}", '', '## Trip Overview', plan.overview]
+
+    for day in plan.days:
+        lines += ['', f"## Day {day.day_number}: {day.title} ({day.date.strftime('%A, %Y-%m-%d')})"]
+        for slot, label in TIME_SLOTS.items():
+            activities = day.slot_activities(slot)
+            if not activities:
+                continue
+            lines.append(f"### {label}")
+            for activity in activities:
+                place = f" at [{activity.location.name}]({activity.location.map_link})" if activity.location else ''
+                cost = format_currency(activity.cost, plan.currency) if activity.cost else 'Free'
+                line = f"* {activity.time} {activity.title}{place} - {cost}"
+                if activity.transport:
+                    line += f", {activity.transport}"
+                lines.append(line)
+                if activity.notes:
+                    lines.append(f"  * {activity.notes}")
+
+    if plan.cost_summary:
+        lines += ['', '## Cost Summary']
+        for category, amount in plan.cost_summary.items():
+            lines.append(f"* {category.title()}: {format_currency(amount, plan.currency)}")
+        lines.append(f"* **Total: {format_currency(plan.total_cost, plan.currency)}**")
+
+    if plan.tips:
+        lines += ['', '## Travel Tips']
+        lines += [f"* {tip}" for tip in plan.tips]
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,263 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# USD per 1K tokens as (prompt, completion); unknown models are costed as gpt-4
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-4': (0.03, 0.06)
+}
+
+# Upper bounds of each histogram's buckets; one more bucket catches the rest
+HISTOGRAM_BUCKETS = {
+    'latency_seconds': (1, 2, 5, 10, 20, 30, 60, 90, 120),
+    'first_token_seconds': (0.5, 1, 2, 3, 5, 8, 13, 20, 30),
+    'prompt_tokens': (250, 500, 1000, 2000, 4000, 8000),
+    'completion_tokens': (250, 500, 1000, 2000, 3000, 4000, 6000),
+    'cost_usd': (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1),
+    'retries': (0, 1, 2, 3)
+}
+
+OUTCOMES = ('hit', 'miss', 'error')
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Cost in USD of one completion"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES['gpt-4'])
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+def bucket_index(name, value):
+    for index, bound in enumerate(HISTOGRAM_BUCKETS[name]):
+        if value <= bound:
+            return index
+    return len(HISTOGRAM_BUCKETS[name])
+
+def estimate_percentile(name, buckets, quantile):
+    """Percentile from bucket counts, interpolating inside the bucket it falls in"""
+    total = sum(buckets)
+    if not total:
+        return None
+    bounds = HISTOGRAM_BUCKETS[name]
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            if index >= len(bounds):
+                return bounds[-1]
+            lower = bounds[index - 1] if index else 0
+            return round(lower + (bounds[index] - lower) * (rank - seen) / count, 3)
+        seen += count
+    return bounds[-1]
+
+class CallMetrics:
+    """What one itinerary generation cost: latency, tokens, retries, cache use.
+
+    Filled in as the request runs; usage may be added from several threads
+    when a request is hedged, and every completion (including the losing
+    hedge and continuations) is paid for. A hedge cancelled mid-stream never
+    gets its usage block, so its tokens are estimated (add_tokens). A losing
+    hedge may only stop after the call was observed; its usage is then added
+    to the recorded totals on its own.
+    """
+
+    def __init__(self, model, tier):
+        self.model = model
+        self.tier = tier
+        self.started_at = time.monotonic()
+        self.attempts = 0
+        self.first_token_seconds = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self._telemetry = None
+        self._lock = threading.Lock()
+
+    @property
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    @property
+    def latency_seconds(self):
+        return time.monotonic() - self.started_at
+
+    def start_attempt(self):
+        with self._lock:
+            self.attempts += 1
+
+    def record_first_token(self, seconds):
+        """Time to first token of the first response to produce one"""
+        with self._lock:
+            if self.first_token_seconds is None:
+                self.first_token_seconds = seconds
+
+    def add_usage(self, model, usage):
+        """Add the usage block of an API response"""
+        if not usage:
+            return
+        self.add_tokens(model, usage.prompt_tokens, usage.completion_tokens)
+
+    def add_tokens(self, model, prompt_tokens, completion_tokens):
+        """Add token counts of a completion, e.g. estimated for one that was cancelled"""
+        cost_usd = estimate_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            telemetry = self._telemetry
+            if telemetry is None:
+                self.prompt_tokens += prompt_tokens
+                self.completion_tokens += completion_tokens
+                self.cost_usd += cost_usd
+                return
+        telemetry.add_late_usage(self, prompt_tokens, completion_tokens, cost_usd)
+
+    def finish(self, telemetry):
+        """Freeze the figures for telemetry; usage added later goes to telemetry directly"""
+        with self._lock:
+            self._telemetry = telemetry
+            return {
+                'latency_seconds': self.latency_seconds,
+                'first_token_seconds': self.first_token_seconds,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'cost_usd': self.cost_usd,
+                'retries': self.retries
+            }
+
+class Telemetry:
+    """Daily histograms of generation latency, token use and cost per model and tier.
+
+    Each day is one Redis hash with fields model|tier|metric|bucket (plus
+    sum and count), kept for RETENTION_DAYS, so all workers add to the same
+    figures. Without Redis they are kept in this process.
+    """
+    KEY_PREFIX = 'telemetry:'
+    RETENTION_DAYS = 8
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _key(self, day):
+        return f"{self.KEY_PREFIX}{day.isoformat()}"
+
+    def observe(self, call, outcome):
+        """Record a finished call; outcome is 'hit' (served from cache), 'miss' or 'error'"""
+        prefix = f"{call.model}|{call.tier or 'anonymous'}"
+        counts = {f"{prefix}|calls|{outcome}": 1}
+        sums = {}
+
+        values = call.finish(self)
+        # Cache hits cost nothing and would only dilute the API latency figures
+        if outcome != 'hit':
+            for name, value in values.items():
+                if value is None:
+                    continue
+                counts[f"{prefix}|{name}|{bucket_index(name, value)}"] = 1
+                counts[f"{prefix}|{name}|count"] = 1
+                sums[f"{prefix}|{name}|sum"] = value
+
+        self._add(counts, sums)
+
+    def add_late_usage(self, call, prompt_tokens, completion_tokens, cost_usd):
+        """Add usage that arrived after call was observed (a losing hedge) to its sums.
+
+        The call's histogram buckets are not moved, but token and cost
+        totals stay exact.
+        """
+        prefix = f"{call.model}|{call.tier or 'anonymous'}"
+        self._add({}, {
+            f"{prefix}|prompt_tokens|sum": prompt_tokens,
+            f"{prefix}|completion_tokens|sum": completion_tokens,
+            f"{prefix}|cost_usd|sum": cost_usd
+        })
+
+    def _add(self, counts, sums):
+        key = self._key(datetime.utcnow().date())
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                for field, value in counts.items():
+                    pipe.hincrby(key, field, value)
+                for field, value in sums.items():
+                    pipe.hincrbyfloat(key, field, value)
+                pipe.expire(key, self.RETENTION_DAYS * 86400)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Error recording telemetry: {str(e)}")
+        with self._lock:
+            fields = self._local.setdefault(key, {})
+            for field, value in list(counts.items()) + list(sums.items()):
+                fields[field] = fields.get(field, 0) + value
+
+    def _load(self, days):
+        today = datetime.utcnow().date()
+        keys = [self._key(today - timedelta(days=offset)) for offset in range(days)]
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                for key in keys:
+                    pipe.hgetall(key)
+                return pipe.execute()
+            except Exception as e:
+                logger.warning(f"Error reading telemetry: {str(e)}")
+        with self._lock:
+            return [dict(self._local.get(key, {})) for key in keys]
+
+    def snapshot(self, days=1):
+        """Totals and per model/tier histograms over the last days (today included)"""
+        raw = {}
+        for fields in self._load(days):
+            for field, value in fields.items():
+                field = field.decode() if isinstance(field, bytes) else field
+                raw[field] = raw.get(field, 0) + float(value)
+
+        groups = {}
+        for field, value in raw.items():
+            model, tier, name, part = field.split('|')
+            group = groups.setdefault((model, tier), {
+                'model': model,
+                'tier': tier,
+                'calls': dict.fromkeys(OUTCOMES, 0),
+                'metrics': {}
+            })
+            if name == 'calls':
+                group['calls'][part] = int(value)
+                continue
+            metric = group['metrics'].setdefault(name, {
+                'count': 0, 'sum': 0.0, 'buckets': [0] * (len(HISTOGRAM_BUCKETS[name]) + 1)})
+            if part in ('count', 'sum'):
+                metric[part] = int(value) if part == 'count' else value
+            else:
+                metric['buckets'][int(part)] = int(value)
+
+        totals = {'calls': 0, 'api_calls': 0, 'cache_hits': 0, 'errors': 0,
+                  'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0}
+        for group in groups.values():
+            calls = group['calls']
+            served = calls['hit'] + calls['miss']
+            group['cache_hit_ratio'] = round(calls['hit'] / served, 4) if served else 0.0
+            for name, metric in group['metrics'].items():
+                metric['sum'] = round(metric['sum'], 6)
+                metric['mean'] = round(metric['sum'] / metric['count'], 3) if metric['count'] else None
+                metric['p50'] = estimate_percentile(name, metric['buckets'], 0.5)
+                metric['p95'] = estimate_percentile(name, metric['buckets'], 0.95)
+                metric['bounds'] = list(HISTOGRAM_BUCKETS[name])
+
+            totals['calls'] += sum(calls.values())
+            totals['api_calls'] += calls['miss'] + calls['error']
+            totals['cache_hits'] += calls['hit']
+            totals['errors'] += calls['error']
+            for name in ('prompt_tokens', 'completion_tokens', 'cost_usd'):
+                totals[name] += group['metrics'].get(name, {}).get('sum', 0)
+        totals['cost_usd'] = round(totals['cost_usd'], 4)
+        totals['prompt_tokens'] = int(totals['prompt_tokens'])
+        totals['completion_tokens'] = int(totals['completion_tokens'])
+
+        return {
+            'days': days,
+            'totals': totals,
+            'groups': sorted(groups.values(), key=lambda group: (group['model'], group['tier']))
+        }
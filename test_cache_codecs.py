@@ -0,0 +1,51 @@
+import unittest
+from cache_codecs import CODECS, MAGIC, decode_value, encode_value
+from compression import compress_text, decompress_text
+
+VALUE = {'id': 7, 'email': 'a@example.com', 'rates': {'USD': '4.72'}, 'tags': ['beach', None], 'admin': False}
+
+class TestCacheCodecs(unittest.TestCase):
+    def test_round_trip(self):
+        """Test that every available codec returns the value it was given"""
+        for name in CODECS:
+            with self.subTest(codec=name):
+                stored = encode_value(VALUE, codec=name)
+                self.assertIsInstance(stored, str)
+                self.assertTrue(stored.startswith(MAGIC))
+                self.assertEqual(decode_value(stored), VALUE)
+
+    def test_text_is_not_parsed(self):
+        """Test that strings come back as strings even when they look like JSON"""
+        for text in ('0.85', '{"a": 1}', 'null', ''):
+            self.assertEqual(decode_value(encode_value(text)), text)
+
+    def test_ints_stay_bare(self):
+        """Test that ints are stored so Redis INCR keeps working on them"""
+        self.assertEqual(encode_value(3), '3')
+        self.assertEqual(decode_value('3'), 3)
+        self.assertIs(decode_value(encode_value(True)), True)
+
+    def test_legacy_values(self):
+        """Test that values written before codecs existed still decode"""
+        self.assertEqual(decode_value('{"USD": "4.72"}'), {'USD': '4.72'})
+        self.assertEqual(decode_value('# Day 1'), '# Day 1')
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            decode_value(f"{MAGIC}x9:abc")
+
+    def test_marshal_values_not_decoded(self):
+        """Test that values of the retired marshal codec are refused rather than unmarshalled"""
+        self.assertLessEqual(set(CODECS), {'json', 'msgpack'})
+        with self.assertRaises(ValueError):
+            decode_value(f"{MAGIC}b1:2QE=")
+
+    def test_compressed(self):
+        """Test that large encoded values survive compression"""
+        value = {'content': '# Day 1\n' * 500}
+        stored = compress_text(encode_value(value), threshold=0)
+        self.assertLess(len(stored), len(value['content']))
+        self.assertEqual(decode_value(decompress_text(stored)), value)
+
+if __name__ == '__main__':
+    unittest.main()
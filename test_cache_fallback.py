@@ -0,0 +1,110 @@
+import time
+import unittest
+from unittest import mock
+import currency_routes
+from cache_manager import CacheManager
+from test_single_flight import FakeLockRedis
+
+class DictCacheManager(CacheManager):
+    """CacheManager whose get/set use a dict; locks use FakeLockRedis"""
+    def __new__(cls):
+        return object.__new__(cls)
+
+    def __init__(self):
+        self.redis = FakeLockRedis()
+        self.values = {}
+        self.timeouts = {}
+        self.tags = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None, tags=None):
+        self.values[key] = value
+        self.timeouts[key] = timeout
+        self.tags[key] = tags
+
+class TestGetWithFallback(unittest.TestCase):
+    def setUp(self):
+        self.cache_manager = DictCacheManager()
+        self.fallback = mock.Mock(return_value={'USD': '4.72'})
+
+    def store(self, value, fresh_for, computed_in=0.5):
+        self.cache_manager.values['rates'] = {
+            'value': value, 'computed_in': computed_in, 'fresh_until': time.time() + fresh_for
+        }
+
+    def test_miss_computes_and_keeps_stale_window(self):
+        result = self.cache_manager.get_with_fallback('rates', self.fallback, timeout=60, stale_ttl=30)
+        self.assertEqual(result, {'USD': '4.72'})
+        self.assertEqual(self.cache_manager.values['rates']['value'], {'USD': '4.72'})
+        self.assertEqual(self.cache_manager.timeouts['rates'], 90)
+        self.assertEqual(self.cache_manager.redis.store, {})
+
+    def test_fresh_value_served(self):
+        self.store({'USD': 'cached'}, fresh_for=3600)
+        result = self.cache_manager.get_with_fallback('rates', self.fallback, beta=0)
+        self.assertEqual(result, {'USD': 'cached'})
+        self.fallback.assert_not_called()
+
+    def test_stale_value_refreshed_by_one_worker(self):
+        """Test that a stale value is recomputed by the lock holder only"""
+        self.store({'USD': 'stale'}, fresh_for=-1)
+        self.cache_manager.redis.set('single_flight:rates', 'other-worker')
+        self.assertEqual(self.cache_manager.get_with_fallback('rates', self.fallback), {'USD': 'stale'})
+        self.fallback.assert_not_called()
+
+        del self.cache_manager.redis.store['single_flight:rates']
+        self.assertEqual(self.cache_manager.get_with_fallback('rates', self.fallback), {'USD': '4.72'})
+        self.fallback.assert_called_once()
+
+    def test_failed_refresh_serves_stale(self):
+        self.store({'USD': 'stale'}, fresh_for=-1)
+        self.fallback.side_effect = RuntimeError('rate API down')
+        self.assertEqual(self.cache_manager.get_with_fallback('rates', self.fallback), {'USD': 'stale'})
+
+    def test_early_refresh(self):
+        """Test that XFetch refreshes slow values before they expire"""
+        self.store({'USD': 'cached'}, fresh_for=1, computed_in=2.0)
+        with mock.patch('cache_manager.random.random', return_value=0.9):
+            result = self.cache_manager.get_with_fallback('rates', self.fallback)
+        self.assertEqual(result, {'USD': '4.72'})
+
+        self.store({'USD': 'cached'}, fresh_for=1, computed_in=2.0)
+        with mock.patch('cache_manager.random.random', return_value=0.1):
+            result = self.cache_manager.get_with_fallback('rates', self.fallback)
+        self.assertEqual(result, {'USD': 'cached'})
+
+class TestExchangeRates(unittest.TestCase):
+    def setUp(self):
+        """No shared rate table, so lookups fall back to the fetched rates"""
+        self.cache_manager = DictCacheManager()
+        self.cache_manager.get_currency_rates = mock.Mock(return_value=None)
+        self.cache_manager.set_currency_rates = mock.Mock(return_value=True)
+        patch = mock.patch.object(currency_routes, 'cache_manager', self.cache_manager)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_fetched_rates_cached_with_envelope(self):
+        """Test that rates are fetched once and then served through get_with_fallback"""
+        with mock.patch.object(currency_routes, 'fetch_fresh_rates', return_value={'USD': 0.24}) as fetch:
+            self.assertEqual(currency_routes.get_rates(), {'USD': 0.24})
+            self.assertEqual(currency_routes.get_conversion_rate('MYR', 'USD'), currency_routes.Decimal('0.24'))
+
+        fetch.assert_called_once()
+        self.assertEqual(self.cache_manager.values['exchange_rates']['value'], {'USD': 0.24})
+        self.assertEqual(self.cache_manager.tags['exchange_rates'], [currency_routes.CURRENCY_TAG])
+        self.cache_manager.set_currency_rates.assert_called_once_with({'USD': 0.24}, timeout=3600)
+
+    def test_stale_rates_served_while_refreshing(self):
+        """Test that expired rates are served while another worker refreshes them"""
+        self.cache_manager.values['exchange_rates'] = {
+            'value': {'USD': 0.23}, 'computed_in': 0.5, 'fresh_until': time.time() - 1}
+        self.cache_manager.redis.store['single_flight:exchange_rates'] = 'other-worker'
+
+        with mock.patch.object(currency_routes, 'fetch_fresh_rates') as fetch:
+            self.assertEqual(currency_routes.get_rates(), {'USD': 0.23})
+        fetch.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
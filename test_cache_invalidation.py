@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+import redis
+from cache_manager import CacheManager
+from redis_config import delete_matching
+
+def make_cache_manager(redis_client):
+    cache_manager = object.__new__(CacheManager)
+    cache_manager.redis = redis_client
+    cache_manager.l1_bus = None
+    cache_manager._tag_script = mock.Mock()
+    return cache_manager
+
+class TestDeleteMatching(unittest.TestCase):
+    def test_scans_in_batches(self):
+        """Test that matching keys are unlinked in bounded batches without KEYS"""
+        redis_client = mock.Mock()
+        redis_client.scan_iter.return_value = iter([f"currency:{i}" for i in range(5)])
+        redis_client.unlink.side_effect = lambda *keys: len(keys)
+
+        self.assertEqual(delete_matching(redis_client, 'currency:*', batch_size=2), 5)
+        redis_client.scan_iter.assert_called_once_with(match='currency:*', count=2)
+        self.assertEqual([len(call.args) for call in redis_client.unlink.call_args_list], [2, 2, 1])
+        redis_client.keys.assert_not_called()
+
+class TestTagInvalidation(unittest.TestCase):
+    def test_set_with_tags(self):
+        """Test that tagged keys are added to their tag sets in the same round trip"""
+        redis_client = mock.Mock()
+        cache_manager = make_cache_manager(redis_client)
+        cache_manager.set('itinerary:japan:1', {'days': 3}, timeout=60, tags=['japan'])
+
+        pipe = redis_client.pipeline.return_value
+        pipe.set.assert_called_once()
+        cache_manager._tag_script.assert_called_once_with(
+            keys=['tag:japan'], args=[60, 'itinerary:japan:1'], client=pipe)
+        pipe.execute.assert_called_once()
+
+    def test_invalidate_tag(self):
+        """Test that a tag's keys are drained from a renamed set in batches"""
+        redis_client = mock.Mock()
+        redis_client.sscan_iter.return_value = iter(['a', 'b', 'c'])
+        redis_client.unlink.side_effect = lambda *keys: len(keys)
+        cache_manager = make_cache_manager(redis_client)
+
+        self.assertEqual(cache_manager.invalidate_tag('japan', batch_size=2), 3)
+        source, draining_key = redis_client.rename.call_args.args
+        self.assertEqual(source, 'tag:japan')
+        redis_client.sscan_iter.assert_called_once_with(draining_key, count=2)
+        self.assertEqual([call.args for call in redis_client.unlink.call_args_list],
+                         [('a', 'b'), ('c',), (draining_key,)])
+
+    def test_invalidate_unknown_tag(self):
+        redis_client = mock.Mock()
+        redis_client.rename.side_effect = redis.ResponseError('no such key')
+        self.assertEqual(make_cache_manager(redis_client).invalidate_tag('nothing'), 0)
+        redis_client.unlink.assert_not_called()
+
+class TestCurrencyTag(unittest.TestCase):
+    def test_currency_writes_tagged(self):
+        """Test that shared and per-pair rates join the currency tag"""
+        redis_client = mock.Mock()
+        cache_manager = make_cache_manager(redis_client)
+        cache_manager.set_currency_rates({'USD': 0.24}, timeout=3600)
+        cache_manager.set_currency_rate('MYR', 'USD', '0.24')
+
+        pipe = redis_client.pipeline.return_value
+        self.assertEqual([call.kwargs['keys'] for call in cache_manager._tag_script.call_args_list],
+                         [['tag:currency'], ['tag:currency']])
+        self.assertEqual([call.kwargs['args'][1:] for call in cache_manager._tag_script.call_args_list],
+                         [['currency:rates'], ['rate:MYR:USD']])
+        self.assertEqual(pipe.execute.call_count, 2)
+
+    def test_clear_currency_cache_uses_tag(self):
+        """Test that clearing currency entries drains the tag set instead of scanning the keyspace"""
+        redis_client = mock.Mock()
+        redis_client.sscan_iter.return_value = iter(['currency:rates', 'rate:MYR:USD', 'exchange_rates'])
+        redis_client.unlink.side_effect = lambda *keys: len(keys)
+        cache_manager = make_cache_manager(redis_client)
+
+        self.assertTrue(cache_manager.clear_currency_cache())
+        self.assertEqual(redis_client.rename.call_args.args[0], 'tag:currency')
+        redis_client.scan_iter.assert_not_called()
+        redis_client.keys.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+import subprocess
+from decimal import Decimal
+from datetime import date
+from cache_keys import canonical_json, request_digest, prompt_digest
+
+class TestCacheKeys(unittest.TestCase):
+    def setUp(self):
+        """Set up a representative prepare_cache_data() payload"""
+        self.request_data = {
+            'citizenship': 'malaysia',
+            'destination': 'japan',
+            'travel_focus': ['food_hunting', 'cultural'],
+            'budget': 5000.0,
+            'currency': 'MYR',
+            'num_adults': 2,
+            'start_date': '2025-03-01',
+            'end_date': '2025-03-03',
+            'halal_food': True
+        }
+
+    def test_key_order_and_whitespace_do_not_matter(self):
+        """Test that equivalent requests produce the same digest"""
+        reordered = dict(reversed(list(self.request_data.items())))
+        reordered['travel_focus'] = ['cultural', 'food_hunting']
+        reordered['destination'] = ' japan '
+        reordered['budget'] = 5000
+        self.assertEqual(
+            request_digest(self.request_data, 'gpt-4', 0.7),
+            request_digest(reordered, 'gpt-4', 0.7)
+        )
+
+    def test_model_and_temperature_change_key(self):
+        """Test that model and temperature are part of the key"""
+        base = request_digest(self.request_data, 'gpt-4', 0.7)
+        self.assertNotEqual(base, request_digest(self.request_data, 'gpt-3.5-turbo', 0.7))
+        self.assertNotEqual(base, request_digest(self.request_data, 'gpt-4', 0.2))
+
+    def test_request_fields_change_key(self):
+        """Test that a different trip produces a different key"""
+        other = dict(self.request_data, num_adults=3)
+        self.assertNotEqual(
+            request_digest(self.request_data, 'gpt-4', 0.7),
+            request_digest(other, 'gpt-4', 0.7)
+        )
+
+    def test_canonical_json_handles_dates_and_decimals(self):
+        """Test normalization of non-JSON types"""
+        self.assertEqual(
+            canonical_json({'b': Decimal('10.50'), 'a': date(2025, 3, 1)}),
+            '{"a":"2025-03-01","b":"10.5"}'
+        )
+
+    def test_digest_is_stable_across_processes(self):
+        """Test that the digest does not depend on PYTHONHASHSEED"""
+        code = "from cache_keys import prompt_digest; print(prompt_digest('sys', 'user', 'gpt-4', 0.7))"
+        digests = set()
+        for seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            output = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                             cwd=os.path.dirname(os.path.abspath(__file__)))
+            digests.add(output.decode().strip())
+        self.assertEqual(digests, {prompt_digest('sys', 'user', 'gpt-4', 0.7)})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import json
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+from flask import Flask
+from flask_login import LoginManager
+from cache_warmer import (DEFAULT_DAYS, move_to_future, next_start_date, preset_budget, shape_request_data,
+                          shapes_from_config, top_shapes, warm_shape, warm_user)
+from gpt_model_handler import GPTModelHandler
+from itinerary_generator import PARALLEL_DAY_THRESHOLD, cache_manager
+from test_parallel_generation import fake_completion
+
+TODAY = date(2024, 11, 1)  # a Friday
+
+def request(destination='japan', budget=5000, start='2024-12-07', end='2024-12-11', **overrides):
+    data = shape_request_data({'destination': destination, 'budget': budget}, TODAY)
+    data.update(start_date=start, end_date=end, **overrides)
+    return data
+
+class TestShapeDates(unittest.TestCase):
+    def test_next_start_date(self):
+        """Test that config shapes start on the requested weekday after the lead time"""
+        start = next_start_date(TODAY, 'Saturday', 30)
+        self.assertEqual(start, date(2024, 12, 7))
+        self.assertEqual(next_start_date(TODAY, 'Sunday', 1), date(2024, 11, 3))
+
+    def test_past_trip_moves_to_future(self):
+        """Test that past trips keep their weekday, length and season"""
+        moved = move_to_future(request(start='2023-12-09', end='2023-12-13'), TODAY)
+        start = date.fromisoformat(moved['start_date'])
+        self.assertGreater(start, TODAY)
+        self.assertEqual(start.weekday(), date(2023, 12, 9).weekday())
+        self.assertEqual(start.month, 12)
+        self.assertEqual((date.fromisoformat(moved['end_date']) - start).days, 4)
+
+    def test_shape_defaults(self):
+        """Test that config shapes get default fields and a date range of the given length"""
+        data = shape_request_data({'destination': 'italy', 'budget': 9000, 'days': 3,
+                                   'start_weekday': 'monday', 'count': 7}, TODAY)
+        self.assertEqual(data['num_adults'], 2)
+        self.assertEqual(data['start_date'], '2024-12-02')
+        self.assertEqual(data['end_date'], '2024-12-04')
+        self.assertNotIn('count', data)
+
+        with self.assertRaises(ValueError):
+            shape_request_data({'destination': 'italy'}, TODAY)
+
+class TestTopShapes(unittest.TestCase):
+    def test_equivalent_requests_are_one_shape(self):
+        """Test that requests sharing a cache bucket are counted together"""
+        requests = [
+            request(budget=5100, specific_locations='Kyoto'),
+            request(destination='italy'),
+            request(budget=5000, specific_locations='kyoto '),
+            request(start='2024-12-14', end='2024-12-18', specific_locations='Kyoto')
+        ]
+        shapes = top_shapes(requests, 2)
+        self.assertEqual(len(shapes), 2)
+        self.assertEqual(shapes[0][1], 3)
+        self.assertEqual(shapes[0][0]['budget'], 5100)
+
+    def test_config_file(self):
+        """Test loading shapes from a JSON config"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config_file:
+            json.dump([{'destination': 'japan', 'budget': 8000, 'count': 4},
+                       {'destination': 'france', 'budget': 9000}], config_file)
+        try:
+            shapes = shapes_from_config(config_file.name, 1, TODAY)
+        finally:
+            os.unlink(config_file.name)
+        self.assertEqual(len(shapes), 1)
+        self.assertEqual(shapes[0][0]['destination'], 'japan')
+        self.assertEqual(shapes[0][1], 4)
+
+    def test_preset_budget(self):
+        """Test that preset budgets scale the destination minimum"""
+        # Japan: 200 + 200 + 400 per day per person
+        self.assertEqual(preset_budget('japan', 5, 2), 12000)
+        self.assertEqual(preset_budget('japan', 5, 2, include_flights=False), 6000)
+
+@mock.patch('gpt_model_handler.get_redis', return_value=None)
+class TestWarmShape(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SECRET_KEY'] = 'test'
+        login_manager = LoginManager(self.app)
+        # The warmer's user is not in the database, like in production
+        login_manager.user_loader(lambda user_id: None)
+
+    def test_long_shape_is_generated_in_parallel(self, _):
+        """Test warming a default-length shape, which goes through the per-day threads"""
+        self.assertGreaterEqual(DEFAULT_DAYS, PARALLEL_DAY_THRESHOLD)
+        data = shape_request_data({'destination': 'japan', 'budget': 12000}, TODAY)
+        client = mock.Mock()
+        client.chat.completions.create.side_effect = fake_completion
+
+        with mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client), \
+                mock.patch.object(cache_manager, 'get', return_value=None), \
+                mock.patch.object(cache_manager, 'set') as cache_set, \
+                mock.patch.object(cache_manager, 'expire'):
+            status = warm_shape(self.app, warm_user('solo_backpacker'), data)
+
+        self.assertEqual(status, 'generated')
+        # One overview and one call per day, all on the tier's model
+        self.assertEqual(client.chat.completions.create.call_count, DEFAULT_DAYS + 1)
+        models = {call.kwargs['model'] for call in client.chat.completions.create.call_args_list}
+        self.assertEqual(models, {'gpt-3.5-turbo'})
+        self.assertIn(f"## Day {DEFAULT_DAYS}", cache_set.call_args.args[1]['content'])
+
+if __name__ == '__main__':
+    unittest.main()
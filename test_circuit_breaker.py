@@ -0,0 +1,120 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from unittest.mock import Mock
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from gpt_model_handler import GPTModelHandler
+
+def stream_chunk(content, finish_reason=None):
+    return SimpleNamespace(usage=None, choices=[
+        SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)])
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        """Use in-process state; the Redis path stores the same keys"""
+        self.breaker = CircuitBreaker(None, 'openai', failure_ratio=0.5, min_calls=4,
+                                      window=60, slow_call_seconds=10, open_seconds=30)
+
+    def fail(self):
+        with self.assertRaises(RuntimeError):
+            self.breaker.call(Mock(side_effect=RuntimeError('upstream 500')))
+
+    def test_opens_after_failure_ratio(self):
+        """Test that the circuit opens once enough calls in the window fail"""
+        self.breaker.call(Mock(return_value='ok'))
+        self.breaker.call(Mock(return_value='ok'))
+        self.fail()
+        self.assertEqual(self.breaker.get_state(), 'closed')
+        self.fail()
+        self.assertEqual(self.breaker.get_state(), 'open')
+
+        func = Mock()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+
+    def test_slow_calls_count_as_failures(self):
+        """Test that latency alone can open the circuit"""
+        for _ in range(4):
+            self.breaker.on_success(elapsed=20)
+        self.assertEqual(self.breaker.get_state(), 'open')
+
+    def test_invalid_requests_do_not_count(self):
+        """Test that caller errors say nothing about upstream health"""
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                self.breaker.call(Mock(side_effect=ValueError('prompt too long')))
+        self.assertEqual(self.breaker.get_state(), 'closed')
+
+    def test_half_open_probe_closes_circuit(self):
+        """Test that one probe is let through and success restores service"""
+        self.breaker.trip()
+        self.breaker._delete(self.breaker.open_key)
+        self.assertEqual(self.breaker.get_state(), 'half_open')
+
+        self.assertTrue(self.breaker.before_call())
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.on_success(1.0, probe=True)
+        self.assertEqual(self.breaker.get_state(), 'closed')
+        self.assertEqual(self.breaker.call(Mock(return_value='ok')), 'ok')
+
+    def test_failed_probe_reopens_circuit(self):
+        """Test that a failing probe keeps the circuit open"""
+        self.breaker.trip()
+        self.breaker._delete(self.breaker.open_key)
+        self.fail()
+        self.assertEqual(self.breaker.get_state(), 'open')
+
+    def test_redis_errors_fall_back_to_local_state(self):
+        """Test that a broken Redis connection never blocks calls"""
+        redis_client = Mock()
+        redis_client.ttl.side_effect = ConnectionError('down')
+        redis_client.set.side_effect = ConnectionError('down')
+        redis_client.pipeline.side_effect = ConnectionError('down')
+        breaker = CircuitBreaker(redis_client, 'openai')
+        self.assertEqual(breaker.call(Mock(return_value='ok')), 'ok')
+
+@mock.patch('gpt_model_handler.get_redis', return_value=None)
+class TestStreamingProbe(unittest.TestCase):
+    def setUp(self):
+        """A half-open breaker in front of a stream that would run to completion"""
+        GPTModelHandler._circuit_breaker = None
+        self.breaker = GPTModelHandler.get_circuit_breaker()
+        self.breaker.trip()
+        self.breaker._delete(self.breaker.open_key)
+        client = Mock()
+        client.chat.completions.create.return_value = iter(
+            [stream_chunk('## Day 1'), stream_chunk('\n* Temples', 'stop')])
+        self.patches = [
+            mock.patch.object(GPTModelHandler, 'get_user_context',
+                              return_value=('gpt-3.5-turbo', 'solo_backpacker', 7)),
+            mock.patch.object(GPTModelHandler, '_rate_limit_check'),
+            mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'),
+            mock.patch('gpt_model_handler.get_openai_client', return_value=client),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def test_disconnect_releases_probe(self, _):
+        """Test that a client leaving mid-stream does not hold the probe slot"""
+        stream = GPTModelHandler.stream_itinerary('system', 'user')
+        self.assertEqual(next(stream), '## Day 1')
+        stream.close()
+
+        self.assertEqual(self.breaker.get_state(), 'half_open')
+        self.assertTrue(self.breaker.before_call())
+
+    def test_completed_probe_closes_circuit(self, _):
+        """Test that a streamed probe that finishes closes the circuit"""
+        self.assertEqual(''.join(GPTModelHandler.stream_itinerary('system', 'user')), '## Day 1\n* Temples')
+        self.assertEqual(self.breaker.get_state(), 'closed')
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        GPTModelHandler._circuit_breaker = None
+
+if __name__ == '__main__':
+    unittest.main()
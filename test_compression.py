@@ -0,0 +1,71 @@
+import json
+import unittest
+from sqlalchemy import Column, Integer, create_engine, select, text
+from sqlalchemy.orm import Session, declarative_base
+from compression import CompressedText, compress_text, decompress_text, is_compressed
+
+ITINERARY = "\n".join(
+    f"## Day {day}\n* 09:00 Visit [Senso-ji](https://maps.google.com/?q=Senso-ji) - ¥{day * 1000}\n"
+    f"* 12:30 Lunch at a halal ramen shop near station {day}"
+    for day in range(1, 40)
+)
+
+Base = declarative_base()
+
+class Note(Base):
+    __tablename__ = 'note'
+    id = Column(Integer, primary_key=True)
+    content = Column(CompressedText)
+
+class TestCompressText(unittest.TestCase):
+    def test_round_trip(self):
+        """Test that large text is compressed and restored exactly"""
+        stored = compress_text(ITINERARY)
+        self.assertTrue(is_compressed(stored))
+        self.assertLess(len(stored), len(ITINERARY.encode('utf-8')))
+        self.assertEqual(decompress_text(stored), ITINERARY)
+
+    def test_small_values_unchanged(self):
+        """Test that values below the threshold are stored as-is"""
+        value = json.dumps({'rate': '4.21'})
+        self.assertEqual(compress_text(value), value)
+        self.assertEqual(compress_text(None), None)
+
+    def test_old_entries_readable(self):
+        """Test that uncompressed values written before compression pass through"""
+        self.assertEqual(decompress_text(ITINERARY), ITINERARY)
+        self.assertEqual(decompress_text(b'{"content": "x"}'), '{"content": "x"}')
+        self.assertIsNone(decompress_text(None))
+
+    def test_compressed_value_not_compressed_twice(self):
+        stored = compress_text(ITINERARY)
+        self.assertEqual(compress_text(stored), stored)
+
+class TestCompressedText(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+
+    def test_column_round_trip(self):
+        """Test that the column compresses on write and decompresses on read"""
+        with Session(self.engine) as session:
+            session.add(Note(id=1, content=ITINERARY))
+            session.commit()
+
+        with self.engine.connect() as connection:
+            raw = connection.execute(text('SELECT content FROM note WHERE id = 1')).scalar()
+        self.assertTrue(is_compressed(raw))
+
+        with Session(self.engine) as session:
+            self.assertEqual(session.get(Note, 1).content, ITINERARY)
+
+    def test_legacy_rows_readable(self):
+        """Test that rows stored as plain text before the change still load"""
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO note (id, content) VALUES (2, :content)"),
+                               {'content': ITINERARY})
+        with Session(self.engine) as session:
+            self.assertEqual(session.scalars(select(Note.content).where(Note.id == 2)).one(), ITINERARY)
+
+if __name__ == '__main__':
+    unittest.main()
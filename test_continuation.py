@@ -0,0 +1,126 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from continuation import (ContinuationTracker, build_continuation_messages, merge_continuation,
+                          output_tail, trim_overlap)
+from gpt_model_handler import GPTModelHandler
+
+class TestMerge(unittest.TestCase):
+    def test_overlap_removed(self):
+        """Test that text the continuation repeats is dropped once"""
+        previous = "## Day 2\n* 09:00 Visit Meiji Shrine"
+        self.assertEqual(merge_continuation(previous, "Visit Meiji Shrine and Yoyogi Park"),
+                         "## Day 2\n* 09:00 Visit Meiji Shrine and Yoyogi Park")
+
+    def test_short_overlap_kept(self):
+        """Test that a coincidental match of a few characters is not trimmed"""
+        self.assertEqual(trim_overlap("Lunch at ", "at noon"), "at noon")
+        self.assertEqual(merge_continuation("Day 1", " ends"), "Day 1 ends")
+
+    def test_tail_starts_on_line(self):
+        text = "x" * 50 + "\n" + "y" * 100
+        self.assertEqual(output_tail(text, 120), "y" * 100)
+        self.assertEqual(output_tail("short"), "short")
+
+    def test_messages(self):
+        messages = [{"role": "user", "content": "Plan a trip"}]
+        follow_up = build_continuation_messages(messages, "## Day 1")
+        self.assertEqual(follow_up[:1], messages)
+        self.assertEqual(follow_up[1], {"role": "assistant", "content": "## Day 1"})
+        self.assertEqual(follow_up[2]["role"], "user")
+        self.assertEqual(len(messages), 1)
+
+class TestContinuationTracker(unittest.TestCase):
+    def test_stats_by_tier_and_days(self):
+        """Test that continuations are counted per tier and trip length"""
+        tracker = ContinuationTracker(None)
+        tracker.record('solo_backpacker', 7, 1, False)
+        tracker.record('solo_backpacker', 7, 2, True)
+        tracker.record('gold_wanderer', 3, 0, False)
+
+        stats = tracker.get_stats()
+        self.assertEqual(stats['solo_backpacker'][7], {'requests': 2, 'continuations': 3, 'truncated': 1,
+                                                       'continuations_per_request': 1.5})
+        self.assertEqual(stats['gold_wanderer'][3]['continuations'], 0)
+
+@mock.patch('gpt_model_handler.GPTModelHandler.get_continuation_budget', return_value=500)
+class TestCompleteLoop(unittest.TestCase):
+    messages = [{"role": "user", "content": "Plan a trip"}]
+
+    def test_continues_until_stop(self, _):
+        """Test that a cut-off answer is continued and the chunks merged"""
+        with mock.patch.object(GPTModelHandler, '_complete_once', side_effect=[
+                ("## Day 1\n* 09:00 Senso-ji", 'length'),
+                ("* 09:00 Senso-ji\n## Day 2", 'stop')]) as complete_once:
+            content, continuations, truncated = GPTModelHandler._complete('gpt-4', self.messages, 1000, 0.7)
+
+        self.assertEqual(content, "## Day 1\n* 09:00 Senso-ji\n## Day 2")
+        self.assertEqual((continuations, truncated), (1, False))
+        follow_up = complete_once.call_args_list[1]
+        self.assertEqual(follow_up.args[2], 500)
+
+    def test_json_mode_not_continued(self, _):
+        """Test that a cut-off JSON response is returned as truncated instead of getting text appended"""
+        with mock.patch.object(GPTModelHandler, '_complete_once', return_value=('{"days": [', 'length')) as complete_once:
+            content, continuations, truncated = GPTModelHandler._complete(
+                'gpt-4', self.messages, 1000, 0.7, response_format={'type': 'json_object'})
+
+        complete_once.assert_called_once()
+        self.assertEqual((content, continuations, truncated), ('{"days": [', 0, True))
+
+    def test_gives_up_after_limit(self, _):
+        """Test that at most MAX_CONTINUATIONS follow-ups are sent"""
+        with mock.patch.object(GPTModelHandler, 'MAX_CONTINUATIONS', 2), \
+                mock.patch.object(GPTModelHandler, '_complete_once', return_value=("more text", 'length')) as complete_once:
+            _, continuations, truncated = GPTModelHandler._complete('gpt-4', self.messages, 1000, 0.7)
+
+        self.assertEqual(complete_once.call_count, 3)
+        self.assertEqual((continuations, truncated), (2, True))
+
+@mock.patch('gpt_model_handler.get_redis', return_value=None)
+class TestTruncatedCaching(unittest.TestCase):
+    def generate(self, truncated):
+        with mock.patch.object(GPTModelHandler, '_request_completion', return_value=("## Day 1", truncated)), \
+                mock.patch.object(GPTModelHandler, 'cache_response') as cache_response:
+            content = GPTModelHandler.generate_itinerary(
+                'system', 'user', cache_key='trip', user_context=('gpt-4', 'gold_wanderer', 1))
+        self.assertEqual(content, "## Day 1")
+        return cache_response
+
+    def test_truncated_response_cached_briefly(self, _):
+        """Test that output still cut off after the last continuation is not kept for the full TTL"""
+        self.generate(True).assert_called_once_with('trip', "## Day 1", True)
+        self.generate(False).assert_called_once_with('trip', "## Day 1", False)
+
+        redis_client = mock.Mock()
+        with mock.patch.object(GPTModelHandler, 'get_redis', return_value=redis_client):
+            GPTModelHandler.cache_response('trip', "## Day 1", truncated=True)
+            GPTModelHandler.cache_response('trip', "## Day 1")
+        self.assertEqual([call.args[1] for call in redis_client.setex.call_args_list],
+                         [GPTModelHandler.TRUNCATED_CACHE_EXPIRY, GPTModelHandler.CACHE_EXPIRY])
+
+def stream_chunk(content, finish_reason=None):
+    return SimpleNamespace(usage=None, choices=[
+        SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)])
+
+@mock.patch('gpt_model_handler.get_redis', return_value=None)
+class TestStreamContinuation(unittest.TestCase):
+    def test_continuation_takes_rate_limit_token(self, _):
+        """Test that every streamed continuation request waits for the rate limiter"""
+        client = mock.Mock()
+        client.chat.completions.create.side_effect = [
+            iter([stream_chunk("## Day 1\n* 09:00 Senso-ji", 'length')]),
+            iter([stream_chunk("\n## Day 2", 'stop')])]
+        with mock.patch.object(GPTModelHandler, 'get_user_context', return_value=('gpt-4', 'gold_wanderer', 1)), \
+                mock.patch.object(GPTModelHandler, '_rate_limit_check') as rate_limit_check, \
+                mock.patch.object(GPTModelHandler, 'get_continuation_budget', return_value=500), \
+                mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client):
+            content = ''.join(GPTModelHandler.stream_itinerary('system', 'user'))
+
+        self.assertEqual(content, "## Day 1\n* 09:00 Senso-ji\n## Day 2")
+        self.assertEqual(client.chat.completions.create.call_count, 2)
+        self.assertEqual(rate_limit_check.call_args_list, [mock.call('gpt-4', 'gold_wanderer')] * 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import unittest
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+from decimal import Decimal
+
+from itinerary_generator import split_day_sections, regenerate_day, regenerate_structured_day
+from structured_itinerary import TripPlan
+from test_structured_itinerary import RESPONSE
+from test_cache_invalidation import make_cache_manager
+
+ITINERARY = """# 3-Day Itinerary for Japan
+
+## Trip Overview
+Day 1: arrival and Asakusa. Day 2: Shibuya.
+
+## Day 1
+### Morning Activities (09:00-12:00)
+* 09:00 Senso-ji
+
+## Day 2
+### Morning Activities (09:00-12:00)
+* 09:00 Meiji Shrine
+
+## Day 3
+### Evening Activities (17:00-22:00)
+* 19:00 Dinner in Shinjuku
+
+## Cost Summary
+Total within budget.
+"""
+
+def field(data, choices=None):
+    return SimpleNamespace(data=data, choices=choices)
+
+def make_form(days=3):
+    return SimpleNamespace(
+        citizenship=field('malaysia'),
+        destinations=field('japan', [('japan', 'Japan')]),
+        start_date=field(date(2025, 3, 1)),
+        end_date=field(date(2025, 3, days)),
+        num_adults=field(2), num_youth=field(0), num_children=field(0), num_infants=field(0),
+        budget=field(8000.0), currency=field('MYR'),
+        include_flights=field(True), include_accommodation=field(True),
+        travel_focus=field(['cultural'], [('cultural', 'Cultural')]),
+        accommodation_location=field(''), accommodation_name=field(''),
+        need_guide=field(False), halal_food=field(False), vegan_food=field(False),
+        wheelchair_accessible=field(False), specific_locations=field('')
+    )
+
+class TestSplitDaySections(unittest.TestCase):
+    def test_split(self):
+        """Test that day headings split the text, skipping overview mentions"""
+        preamble, sections, epilogue = split_day_sections(ITINERARY, 3)
+        self.assertIn('Day 1: arrival', preamble)
+        self.assertEqual(len(sections), 3)
+        self.assertTrue(sections[1].startswith('## Day 2'))
+        self.assertNotIn('Cost Summary', sections[2])
+        self.assertTrue(epilogue.startswith('## Cost Summary'))
+        self.assertEqual(preamble + ''.join(sections) + epilogue, ITINERARY)
+
+    def test_plain_day_lines(self):
+        """Test itineraries whose days are not markdown headings"""
+        preamble, sections, epilogue = split_day_sections("Intro\nDay 1 - Sat\nA\nDay 2 - Sun\nB\n", 2)
+        self.assertEqual(sections, ['Day 1 - Sat\nA\n', 'Day 2 - Sun\nB\n'])
+        self.assertEqual(epilogue, '')
+
+    def test_no_days(self):
+        with self.assertRaises(ValueError):
+            split_day_sections('A plan with no days')
+
+@mock.patch('itinerary_generator.GPTModelHandler.get_model_for_user', return_value='gpt-4')
+class TestRegenerateDay(unittest.TestCase):
+    def test_only_one_day_is_sent_and_replaced(self, _):
+        """Test that one day is re-prompted with its neighbours and spliced back"""
+        with mock.patch('itinerary_generator.GPTModelHandler.generate_itinerary',
+                        return_value='### Day 2\n* 10:00 Tsukiji food tour') as generate:
+            content = regenerate_day(make_form(), ITINERARY, 2, 'More food please')
+
+        prompt = generate.call_args.kwargs['user_prompt']
+        self.assertIn('Meiji Shrine', prompt)
+        self.assertIn('Senso-ji', prompt)
+        self.assertIn('More food please', prompt)
+        self.assertNotIn('Total within budget', prompt)
+        self.assertEqual(generate.call_args.kwargs['trip_days'], 1)
+
+        self.assertIn('## Day 2\n* 10:00 Tsukiji food tour\n\n## Day 3', content)
+        self.assertNotIn('Meiji Shrine', content)
+        self.assertIn('* 09:00 Senso-ji', content)
+        self.assertTrue(content.endswith('## Cost Summary\nTotal within budget.\n'))
+
+    def test_missing_day(self, _):
+        with self.assertRaises(ValueError):
+            regenerate_day(make_form(), ITINERARY, 4, 'Add a day')
+
+    def test_structured_day(self, _):
+        """Test that a structured day is replaced and the cost summary adjusted"""
+        plan = TripPlan.from_dict(RESPONSE, 'MYR')
+        day = {'day_number': 1, 'date': '2030-01-01', 'title': 'Food', 'activities': [
+            {'time': '12:00', 'slot': 'afternoon', 'title': 'Sushi', 'cost': 200, 'category': 'food'}]}
+        with mock.patch('itinerary_generator.GPTModelHandler.generate_itinerary',
+                        return_value=json.dumps(day)) as generate:
+            regenerate_structured_day(make_form(days=2), plan, 1, 'Sushi instead')
+
+        self.assertEqual(generate.call_args.kwargs['response_format'], {'type': 'json_object'})
+        self.assertEqual(plan.days[0].title, 'Food')
+        self.assertEqual(plan.days[0].date, date(2025, 3, 1))
+        self.assertEqual(plan.cost_summary['food'], Decimal('200'))
+        self.assertEqual(plan.days[1].title, 'Shibuya')
+
+class TestRevisionCooldown(unittest.TestCase):
+    def test_cooldown_is_set_atomically(self):
+        """Test that only the request whose SET NX succeeds gets past the cooldown"""
+        redis_client = mock.Mock()
+        redis_client.set.side_effect = [True, None]
+        cache_manager = make_cache_manager(redis_client)
+
+        self.assertIs(cache_manager.add('rate_limit:user:1', 1, timeout=10), True)
+        self.assertIs(cache_manager.add('rate_limit:user:1', 1, timeout=10), False)
+        self.assertEqual(redis_client.set.call_args.kwargs, {'ex': 10, 'nx': True})
+        redis_client.exists.assert_not_called()
+        self.assertIsNone(make_cache_manager(None).add('rate_limit:user:1', 1))
+
+if __name__ == '__main__':
+    unittest.main()
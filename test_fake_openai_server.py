@@ -0,0 +1,76 @@
+import json
+import unittest
+from fake_openai_server import create_app, sample_latency
+
+class TestFakeOpenAIServer(unittest.TestCase):
+    def setUp(self):
+        """Instant responses so tests do not sleep"""
+        self.app = create_app({'latency': 'fixed:0', 'token_rate': 0}, seed=1)
+        self.client = self.app.test_client()
+        self.messages = [
+            {'role': 'system', 'content': 'You are an expert travel planner.'},
+            {'role': 'user', 'content': 'Create a detailed international travel itinerary for Malaysia '
+                                        'travelers visiting Japan with the following specifications:\n'
+                                        '   - Duration: 3 days'}
+        ]
+
+    def test_completion_matches_api_shape(self):
+        """Test a non-streaming completion"""
+        response = self.client.post('/v1/chat/completions', json={'model': 'gpt-4', 'messages': self.messages})
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        content = body['choices'][0]['message']['content']
+        self.assertIn('Japan', content)
+        self.assertIn('## Day 3', content)
+        self.assertNotIn('## Day 4', content)
+        self.assertEqual(body['choices'][0]['finish_reason'], 'stop')
+        self.assertEqual(body['usage']['total_tokens'],
+                         body['usage']['prompt_tokens'] + body['usage']['completion_tokens'])
+
+    def test_max_tokens_truncates_with_length_finish(self):
+        """Test that max_tokens is honoured like the real API"""
+        response = self.client.post('/v1/chat/completions',
+                                    json={'model': 'gpt-4', 'messages': self.messages, 'max_tokens': 10})
+        body = response.get_json()
+        self.assertEqual(body['choices'][0]['finish_reason'], 'length')
+        self.assertEqual(body['usage']['completion_tokens'], 10)
+
+    def test_streaming_chunks(self):
+        """Test server-sent chunks, the usage chunk and the terminator"""
+        response = self.client.post('/v1/chat/completions', json={
+            'model': 'gpt-4', 'messages': self.messages, 'stream': True,
+            'stream_options': {'include_usage': True}
+        })
+        events = [line[len('data: '):] for line in response.get_data(as_text=True).split('\n\n') if line]
+        self.assertEqual(events[-1], '[DONE]')
+
+        chunks = [json.loads(event) for event in events[:-1]]
+        content = ''.join(chunk['choices'][0]['delta'].get('content', '') for chunk in chunks if chunk['choices'])
+        self.assertIn('## Day 1', content)
+        self.assertEqual(chunks[-1]['choices'], [])
+        self.assertGreater(chunks[-1]['usage']['completion_tokens'], 0)
+
+    def test_error_injection(self):
+        """Test injected errors and runtime reconfiguration"""
+        response = self.client.post('/fake/config', json={'error_rate': 1.0, 'error_status': 429})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/v1/chat/completions', json={'model': 'gpt-4', 'messages': self.messages})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.get_json()['error']['type'], 'rate_limit_exceeded')
+
+        self.assertEqual(self.client.post('/fake/config', json={'bogus': 1}).status_code, 400)
+
+    def test_latency_distributions(self):
+        """Test the latency spec parser"""
+        import random
+        rng = random.Random(0)
+        self.assertEqual(sample_latency('fixed:1.5', rng), 1.5)
+        self.assertTrue(1 <= sample_latency('uniform:1,2', rng) <= 2)
+        self.assertGreater(sample_latency('lognormal:2,0.5', rng), 0)
+        with self.assertRaises(ValueError):
+            sample_latency('pareto:1', rng)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import unittest
+from hedging import HedgePolicy, HedgeCancelled, hedged_call
+
+def fake_request(result, first_token_after, finish_after):
+    """A request that emits its first token and finishes after the given delays"""
+    def run(first_token, cancelled):
+        started = time.monotonic()
+        while time.monotonic() - started < finish_after:
+            if cancelled.is_set():
+                raise HedgeCancelled(result)
+            if time.monotonic() - started >= first_token_after:
+                first_token.set()
+            time.sleep(0.005)
+        first_token.set()
+        return result
+    return run
+
+class TestHedgedCall(unittest.TestCase):
+    def test_fast_primary_is_not_hedged(self):
+        """Test that a primary producing tokens before the delay runs alone"""
+        result = hedged_call(fake_request('primary', 0.01, 0.1),
+                             fake_request('secondary', 0, 0),
+                             delay=0.05)
+        self.assertEqual(result, ('primary', 'primary'))
+
+    def test_slow_primary_loses_to_hedge(self):
+        """Test that a stalled primary is raced and the faster answer wins"""
+        started = time.monotonic()
+        result = hedged_call(fake_request('primary', 1.0, 1.0),
+                             fake_request('secondary', 0.01, 0.05),
+                             delay=0.05)
+        self.assertEqual(result, ('secondary', 'secondary'))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_hedge_not_sent_without_budget(self):
+        """Test that should_hedge can veto the secondary request"""
+        result = hedged_call(fake_request('primary', 0.2, 0.2),
+                             fake_request('secondary', 0, 0),
+                             delay=0.02,
+                             should_hedge=lambda: False)
+        self.assertEqual(result, ('primary', 'primary'))
+
+    def test_failed_racer_falls_back_to_other(self):
+        """Test that an error in one request does not fail the call"""
+        def broken(first_token, cancelled):
+            raise RuntimeError('upstream 500')
+
+        result = hedged_call(fake_request('primary', 0.2, 0.2), broken, delay=0.02)
+        self.assertEqual(result, ('primary', 'primary'))
+
+class TestHedgePolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = HedgePolicy(None, percentile=0.9, default_delays={'gpt-4': 20},
+                                  tier_budgets={'gold_wanderer': 0.1}, min_samples=10,
+                                  refresh_seconds=0)
+
+    def test_delay_uses_percentile_of_samples(self):
+        """Test the default delay and the percentile once samples exist"""
+        self.assertEqual(self.policy.get_delay('gpt-4'), 20)
+        for seconds in range(1, 21):
+            self.policy.record_first_token('gpt-4', seconds)
+        self.assertEqual(self.policy.get_delay('gpt-4'), 19)
+
+    def test_tier_budget(self):
+        """Test that a tier hedges at most its share of requests"""
+        self.assertFalse(self.policy.has_budget('solo_backpacker'))
+        for _ in range(10):
+            self.policy.record_request('gold_wanderer')
+        self.assertTrue(self.policy.has_budget('gold_wanderer'))
+        self.policy.record_hedge('gold_wanderer')
+        self.assertFalse(self.policy.has_budget('gold_wanderer'))
+
+if __name__ == '__main__':
+    unittest.main()
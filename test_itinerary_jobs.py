@@ -0,0 +1,216 @@
+import os
+import shutil
+import sqlite3
+import threading
+import tempfile
+import unittest
+from unittest import mock
+from itinerary_jobs import (
+    ItineraryJobQueue,
+    RedisJobBackend,
+    SQLiteJobBackend,
+    form_data_from_request,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    STATUS_COMPLETED,
+    STATUS_FAILED
+)
+from itinerary_worker import keep_alive, process_job
+from flask import Flask
+from flask_login import LoginManager
+from extensions import db
+from models import User
+from views import reserve_itinerary_credit
+
+class TestItineraryJobQueue(unittest.TestCase):
+    def setUp(self):
+        """Create a queue backed by a throwaway SQLite database"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = ItineraryJobQueue(SQLiteJobBackend(os.path.join(self.tmpdir, 'jobs.db')))
+        self.request_data = {
+            'destination': 'japan',
+            'budget': 5000.0,
+            'start_date': '2025-03-01',
+            'end_date': '2025-03-03'
+        }
+
+    def test_enqueue_reports_queued_status(self):
+        """Test that a new job is visible as queued without its payload"""
+        job_id = self.queue.enqueue(1, self.request_data)
+        status = self.queue.get_status(job_id)
+        self.assertEqual(status['status'], STATUS_QUEUED)
+        self.assertEqual(status['user_id'], '1')
+        self.assertNotIn('payload', status)
+
+    def test_dequeue_claims_oldest_job_once(self):
+        """Test that jobs are claimed in order and only once"""
+        first = self.queue.enqueue(1, self.request_data)
+        second = self.queue.enqueue(2, self.request_data)
+
+        job = self.queue.dequeue(timeout=0)
+        self.assertEqual(job['id'], first)
+        self.assertEqual(job['payload'], self.request_data)
+        self.assertEqual(self.queue.get_status(first)['status'], STATUS_RUNNING)
+
+        self.assertEqual(self.queue.dequeue(timeout=0)['id'], second)
+        self.assertIsNone(self.queue.dequeue(timeout=0))
+
+    def test_mark_completed_and_failed(self):
+        """Test terminal job states"""
+        done = self.queue.enqueue(1, self.request_data)
+        failed = self.queue.enqueue(1, self.request_data)
+
+        self.queue.mark_completed(done, 42)
+        self.queue.mark_failed(failed, 'boom')
+
+        self.assertEqual(self.queue.get_status(done)['status'], STATUS_COMPLETED)
+        self.assertEqual(self.queue.get_status(done)['itinerary_id'], '42')
+        self.assertEqual(self.queue.get_status(failed)['status'], STATUS_FAILED)
+        self.assertEqual(self.queue.get_status(failed)['error'], 'boom')
+
+    def test_stale_running_job_requeued(self):
+        """Test that a job left running by a dead worker is claimed again"""
+        job_id = self.queue.enqueue(1, self.request_data)
+        self.queue.dequeue(timeout=0)
+        self.assertEqual(self.queue.requeue_stale(), 0)
+
+        with mock.patch('itinerary_jobs.WORKER_TIMEOUT', -1):
+            self.assertEqual(self.queue.requeue_stale(), 1)
+        self.assertEqual(self.queue.get_status(job_id)['status'], STATUS_QUEUED)
+        self.assertEqual(self.queue.dequeue(timeout=0)['id'], job_id)
+
+    def test_running_job_kept_alive(self):
+        """Test that a job whose worker still refreshes it is not requeued"""
+        job_id = self.queue.enqueue(1, self.request_data)
+        self.queue.dequeue(timeout=0)
+        with sqlite3.connect(self.queue.backend.path) as conn:
+            conn.execute("UPDATE itinerary_job SET updated_at = '2000-01-01'")
+
+        self.queue.keep_alive(job_id)
+        self.assertEqual(self.queue.requeue_stale(), 0)
+        self.assertEqual(self.queue.get_status(job_id)['status'], STATUS_RUNNING)
+
+    def test_claims_counted(self):
+        """Test that every claim of a job counts as an attempt"""
+        job_id = self.queue.enqueue(1, self.request_data)
+        self.assertEqual(self.queue.dequeue(timeout=0)['attempts'], 1)
+        with mock.patch('itinerary_jobs.WORKER_TIMEOUT', -1):
+            self.queue.requeue_stale()
+        self.assertEqual(self.queue.dequeue(timeout=0)['attempts'], 2)
+
+    def test_keep_alive_thread(self):
+        """Test that the worker refreshes a job until told to stop"""
+        queue = mock.Mock()
+        stop = threading.Event()
+        queue.keep_alive.side_effect = lambda job_id: queue.keep_alive.call_count >= 2 and stop.set()
+
+        keep_alive(queue, 'job1', stop, 0.01)
+        queue.keep_alive.assert_called_with('job1')
+        self.assertEqual(queue.keep_alive.call_count, 2)
+
+    def test_unknown_job(self):
+        """Test status lookup for a job that does not exist"""
+        self.assertIsNone(self.queue.get_status('missing'))
+
+    def test_form_data_from_request(self):
+        """Test conversion of cached request data back into form data"""
+        data = form_data_from_request(self.request_data)
+        self.assertEqual(data['destinations'], 'japan')
+        self.assertNotIn('destination', data)
+        self.assertEqual(data['start_date'].isoformat(), '2025-03-01')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+class TestRedisJobBackend(unittest.TestCase):
+    def setUp(self):
+        self.redis = mock.Mock()
+        self.redis.hgetall.return_value = {'user_id': '1', 'payload': '{}', 'status': STATUS_QUEUED}
+        self.backend = RedisJobBackend(self.redis, worker_id='host:7')
+
+    def test_claimed_job_kept_until_acknowledged(self):
+        """Test that a claimed job moves to the worker's processing list until it finishes"""
+        self.redis.blmove.return_value = 'job1'
+        queue = ItineraryJobQueue(self.backend)
+
+        self.redis.hincrby.return_value = 2
+        job = queue.dequeue(timeout=5)
+        self.assertEqual(job['id'], 'job1')
+        self.assertEqual(job['attempts'], '2')
+        self.redis.blmove.assert_called_once_with(
+            RedisJobBackend.QUEUE_KEY, 'itinerary_jobs:processing:host:7', 5, 'RIGHT', 'LEFT')
+        self.redis.lrem.assert_not_called()
+
+        queue.mark_completed('job1', 42)
+        self.redis.lrem.assert_called_once_with('itinerary_jobs:processing:host:7', 1, 'job1')
+
+    def test_dead_workers_jobs_requeued(self):
+        """Test that only workers without a heartbeat, and this worker's last run, are drained"""
+        self.redis.smembers.return_value = {'host:7', 'host:8', 'host:9'}
+        self.redis.exists.side_effect = lambda key: key == 'itinerary_jobs:worker:host:9'
+        held = {'itinerary_jobs:processing:host:7': ['job1'],
+                'itinerary_jobs:processing:host:8': ['job2', 'job3'],
+                'itinerary_jobs:processing:host:9': ['job4']}
+        self.redis.lmove.side_effect = lambda source, *args: held[source].pop(0) if held[source] else None
+
+        self.assertEqual(self.backend.requeue_stale(), 3)
+        self.assertEqual(held['itinerary_jobs:processing:host:9'], ['job4'])
+        self.redis.srem.assert_called_once_with(RedisJobBackend.WORKERS_KEY, 'host:8')
+        statuses = [call.kwargs['mapping']['status'] for call in self.redis.hset.call_args_list]
+        self.assertEqual(statuses, [STATUS_QUEUED] * 3)
+
+class TestItineraryCredits(unittest.TestCase):
+    def setUp(self):
+        """In-memory database with a free-tier user allowed one itinerary a month"""
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SECRET_KEY'] = 'test'
+        db.init_app(self.app)
+        LoginManager(self.app).user_loader(lambda user_id: db.session.get(User, int(user_id)))
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.user = User(email='traveller@example.com', subscription_tier='solo_backpacker',
+                         itineraries_generated_this_month=0)
+        db.session.add(self.user)
+        db.session.commit()
+
+    def test_reservation_stops_at_monthly_limit(self):
+        """Test that queued jobs cannot take more credits than the plan allows"""
+        self.assertTrue(reserve_itinerary_credit(self.user))
+        self.assertFalse(reserve_itinerary_credit(self.user))
+        self.assertEqual(self.user.itineraries_generated_this_month, 1)
+
+    def test_failed_job_releases_credit(self):
+        """Test that the worker gives back the credit of a job it could not finish"""
+        reserve_itinerary_credit(self.user)
+        queue = mock.Mock()
+        job = {'id': 'job1', 'user_id': str(self.user.id), 'attempts': 1, 'payload': {}}
+
+        with mock.patch('views.generate_itinerary_content', side_effect=RuntimeError('boom')), \
+                mock.patch('itinerary_jobs.form_data_from_request', return_value={}):
+            process_job(self.app, queue, job)
+
+        queue.mark_failed.assert_called_once()
+        self.assertEqual(db.session.get(User, self.user.id).itineraries_generated_this_month, 0)
+
+    def test_exhausted_job_not_run(self):
+        """Test that a job past its attempt limit is failed without generating"""
+        reserve_itinerary_credit(self.user)
+        queue = mock.Mock()
+        job = {'id': 'job1', 'user_id': str(self.user.id), 'attempts': 4, 'payload': {}}
+
+        with mock.patch('views.generate_itinerary_content') as generate:
+            process_job(self.app, queue, job)
+
+        generate.assert_not_called()
+        queue.mark_failed.assert_called_once()
+        self.assertEqual(db.session.get(User, self.user.id).itineraries_generated_this_month, 0)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest import mock
+from flask import Flask
+import currency_routes
+from local_cache import MISSING, InvalidationBus, LocalCache
+from test_cache_invalidation import make_cache_manager
+
+NAMESPACES = {'rate:': (300, 2), 'destination_rules:': (3600, 10)}
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LocalCache(NAMESPACES)
+
+    def test_only_configured_namespaces(self):
+        """Test that keys outside the namespaces are never kept"""
+        self.cache.set('user:1', {'name': 'x'})
+        self.assertIs(self.cache.get('user:1'), MISSING)
+        self.cache.set('rate:USD:EUR', '0.85')
+        self.assertEqual(self.cache.get('rate:USD:EUR'), '0.85')
+        self.assertEqual(self.cache.get_stats()['misses'], 0)
+
+    def test_lru_eviction_per_namespace(self):
+        """Test that each namespace keeps its own size limit"""
+        self.cache.set('rate:USD:EUR', '0.85')
+        self.cache.set('rate:USD:GBP', '0.73')
+        self.cache.set('destination_rules:japan', {'min': 1})
+        self.cache.get('rate:USD:EUR')
+        self.cache.set('rate:USD:JPY', '110')
+
+        self.assertIs(self.cache.get('rate:USD:GBP'), MISSING)
+        self.assertEqual(self.cache.get('rate:USD:EUR'), '0.85')
+        self.assertEqual(self.cache.get('destination_rules:japan'), {'min': 1})
+        self.assertEqual(self.cache.get_stats()['evictions'], 1)
+
+    def test_ttl_capped(self):
+        """Test that entries expire at the shorter of the namespace and given TTL"""
+        with mock.patch('local_cache.time.monotonic', return_value=100.0):
+            self.cache.set('rate:USD:EUR', '0.85', ttl=5)
+            self.cache.set('destination_rules:japan', {'min': 1}, ttl=86400)
+        with mock.patch('local_cache.time.monotonic', return_value=106.0):
+            self.assertIs(self.cache.get('rate:USD:EUR'), MISSING)
+            self.assertEqual(self.cache.get('destination_rules:japan'), {'min': 1})
+        with mock.patch('local_cache.time.monotonic', return_value=100.0 + 3601):
+            self.assertIs(self.cache.get('destination_rules:japan'), MISSING)
+
+    def test_invalidate(self):
+        self.cache.set('rate:USD:EUR', '0.85')
+        self.cache.set('rate:USD:GBP', '0.73')
+        self.cache.set('destination_rules:japan', {'min': 1})
+        self.cache.invalidate('rate:USD:EUR')
+        self.assertIs(self.cache.get('rate:USD:EUR'), MISSING)
+        self.cache.invalidate('rate:*')
+        self.assertIs(self.cache.get('rate:USD:GBP'), MISSING)
+        self.assertEqual(self.cache.get('destination_rules:japan'), {'min': 1})
+        self.cache.invalidate('*')
+        self.assertIs(self.cache.get('destination_rules:japan'), MISSING)
+
+    def test_stale_read_not_stored(self):
+        """Test that a value read before an invalidation is not cached after it"""
+        generation = self.cache.generation
+        self.cache.invalidate('rate:USD:EUR')
+        self.cache.set('rate:USD:EUR', 'old', generation=generation)
+        self.assertIs(self.cache.get('rate:USD:EUR'), MISSING)
+
+class TestInvalidationBus(unittest.TestCase):
+    def test_publish_and_receive(self):
+        """Test that writes are published and other workers' messages applied"""
+        redis_client = mock.Mock()
+        local = LocalCache(NAMESPACES)
+        bus = InvalidationBus(local)
+        with mock.patch('local_cache.threading.Thread'):
+            bus.start(redis_client)
+
+        local.set('rate:USD:EUR', '0.85')
+        bus.publish('rate:USD:EUR')
+        redis_client.publish.assert_called_once_with('cache:invalidate', 'rate:USD:EUR')
+        self.assertIs(local.get('rate:USD:EUR'), MISSING)
+
+        local.set('destination_rules:japan', {'min': 1})
+        bus._handle(b'destination_rules:japan')
+        self.assertIs(local.get('destination_rules:japan'), MISSING)
+
+    def test_inactive_until_subscribed(self):
+        """Test that the L1 cache is not used until invalidations can be received"""
+        bus = InvalidationBus(LocalCache(NAMESPACES))
+        with mock.patch('local_cache.threading.Thread') as thread:
+            self.assertFalse(bus.active(mock.Mock()))
+        thread.return_value.start.assert_called_once()
+
+class TestCurrencyRatesRoute(unittest.TestCase):
+    def test_fresh_rates_invalidate_local_copies(self):
+        """Test that rates fetched by the API are written through CacheManager"""
+        redis_client = mock.Mock()
+        redis_client.get.return_value = None
+        cache_manager = make_cache_manager(redis_client)
+        cache_manager.l1_bus = mock.Mock()
+        cache_manager.l1_bus.local = LocalCache({'currency:': (300, 16)})
+        app = Flask(__name__)
+        app.register_blueprint(currency_routes.currency_routes)
+
+        with mock.patch.object(currency_routes, 'cache_manager', cache_manager):
+            response = app.test_client().get('/api/currencies/rates')
+
+        self.assertEqual(response.get_json()['rates'], currency_routes.fetch_fresh_rates())
+        cache_manager.l1_bus.publish.assert_any_call('currency:rates')
+
+if __name__ == '__main__':
+    unittest.main()
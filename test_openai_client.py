@@ -0,0 +1,62 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import httpx
+import openai_client
+
+class OKHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+class TestOpenAIClient(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), OKHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        openai_client.connection_stats = openai_client.ConnectionStats()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive_reuses_connection(self):
+        """Test that only the first request pays for connection setup"""
+        with httpx.Client(transport=openai_client.TimedTransport()) as client:
+            for _ in range(3):
+                client.get(self.url)
+
+        stats = openai_client.get_connection_stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 2)
+        self.assertFalse(openai_client.last_connection_timing().new_connection)
+
+    def test_client_is_shared_within_process(self):
+        """Test that the registry hands out one client per API key"""
+        with patch.object(openai_client, '_build_client', side_effect=lambda key, base_url=None: object()):
+            first = openai_client.get_openai_client('sk-test')
+            self.assertIs(first, openai_client.get_openai_client('sk-test'))
+
+            # A forked worker must not reuse the parent's pool
+            with patch.object(openai_client, '_clients_pid', os.getpid() + 1):
+                self.assertIsNot(first, openai_client.get_openai_client('sk-test'))
+        openai_client._clients.clear()
+
+    def test_per_model_timeouts(self):
+        """Test that slower models get a longer read timeout"""
+        self.assertGreater(openai_client.get_request_timeout('gpt-4').read,
+                           openai_client.get_request_timeout('gpt-3.5-turbo').read)
+        self.assertEqual(openai_client.get_request_timeout('gpt-4').connect, openai_client.CONNECT_TIMEOUT)
+
+if __name__ == '__main__':
+    unittest.main()
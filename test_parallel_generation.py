@@ -0,0 +1,56 @@
+import re
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from gpt_model_handler import GPTModelHandler
+from itinerary_generator import DAY_OUTLINE_HEADING, generate_itinerary_parallel
+from test_day_revision import make_form
+
+USER_CONTEXT = ('gpt-3.5-turbo', 'solo_backpacker', 7)
+
+def fake_completion(**kwargs):
+    """Overview with a day outline, or the single day the prompt asks for"""
+    prompt = kwargs['messages'][-1]['content']
+    day = re.search(r'schedule for Day (\d+) of', prompt)
+    if day:
+        content = f"## Day {day.group(1)}\n* 09:00 Sightseeing"
+    else:
+        content = f"# Trip Overview\n\n{DAY_OUTLINE_HEADING}\n" + '\n'.join(
+            f"Day {n}: Tokyo - temples" for n in range(1, 6))
+    return SimpleNamespace(
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason='stop')])
+
+@mock.patch('gpt_model_handler.get_redis', return_value=None)
+class TestParallelGeneration(unittest.TestCase):
+    def test_day_threads_do_not_read_current_user(self, _):
+        """Test that the user is resolved once and passed to every day thread"""
+        client = mock.Mock()
+        client.chat.completions.create.side_effect = fake_completion
+        threads = set()
+        original = GPTModelHandler._rate_limit_check.__func__
+
+        def rate_limit_check(cls, model, tier):
+            threads.add(threading.get_ident())
+            self.assertEqual((model, tier), USER_CONTEXT[:2])
+            return original(cls, model, tier)
+
+        # Outside a request context current_user is None, so any use of it would fail
+        with mock.patch.object(GPTModelHandler, 'get_user_context', return_value=USER_CONTEXT) as get_user_context, \
+                mock.patch.object(GPTModelHandler, '_rate_limit_check', classmethod(rate_limit_check)), \
+                mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client):
+            content = generate_itinerary_parallel(make_form(5))
+
+        get_user_context.assert_called_once()
+        self.assertEqual(client.chat.completions.create.call_count, 6)
+        self.assertGreater(len(threads), 1)
+        self.assertTrue(content.startswith('# Trip Overview'))
+        self.assertNotIn(DAY_OUTLINE_HEADING, content)
+        for day in range(1, 6):
+            self.assertIn(f"## Day {day}\n", content + '\n')
+
+if __name__ == '__main__':
+    unittest.main()
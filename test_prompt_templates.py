@@ -0,0 +1,51 @@
+import unittest
+from unittest import mock
+from prompt_templates import PromptTemplate, DAY_SCHEDULE, RELIGIOUS_ACCESSIBILITY, SYSTEM_PROMPT
+from itinerary_generator import assemble_final_prompt
+from token_budget import count_tokens
+from test_day_revision import make_form
+from test_token_budget import SmallTokenizerTestCase
+
+class TestPromptTemplates(unittest.TestCase):
+    def test_variants_are_compiled_once(self):
+        """Test that each flag combination is built once and then reused"""
+        calls = []
+
+        def build(halal=False):
+            calls.append(halal)
+            return 'Trip for $name' + (' (halal)' if halal else '')
+
+        template = PromptTemplate('test', build)
+        self.assertEqual(template.render({'name': 'Aisha'}, halal=True), 'Trip for Aisha (halal)')
+        self.assertEqual(template.render({'name': 'Ben'}, halal=True), 'Trip for Ben (halal)')
+        self.assertEqual(template.render({'name': 'Ben'}), 'Trip for Ben')
+        self.assertEqual(calls, [True, False])
+
+    def test_halal_flag_adds_prayer_details(self):
+        """Test that the halal variant carries the religious sections"""
+        self.assertIn('Religious Facilities', RELIGIOUS_ACCESSIBILITY.render(halal=True))
+        self.assertNotIn('Religious Facilities', RELIGIOUS_ACCESSIBILITY.render(halal=False))
+
+        day = DAY_SCHEDULE.render({'day_number': 2, 'day_label': 'Sunday, 2025-03-02'},
+                                  halal=True, currency='MYR')
+        self.assertIn('Day 2 - Sunday, 2025-03-02:', day)
+        self.assertIn('* Prayer facilities for Fajr', day)
+        self.assertIn('Exact costs in MYR', day)
+
+    def test_dynamic_fields_are_not_reinterpreted(self):
+        """Test that user text containing $ is spliced in verbatim"""
+        prompt = SYSTEM_PROMPT.render({'citizenship': '$citizenship', 'timestamp': 'now'},
+                                      currency='US$')
+        self.assertIn('itineraries for $citizenship citizens', prompt)
+        self.assertIn('All prices in US$', prompt)
+
+@mock.patch('itinerary_generator.GPTModelHandler.get_model_for_user', return_value='gpt-4')
+class TestAssembledPromptTokens(SmallTokenizerTestCase):
+    def test_reported_tokens_match_prompt(self, _):
+        """Test that report_tokens counts exactly the assembled prompt"""
+        prompt, token_count = assemble_final_prompt(make_form(3), report_tokens=True)
+        self.assertEqual(prompt, assemble_final_prompt(make_form(3)))
+        self.assertEqual(token_count, count_tokens(prompt, 'gpt-4'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+from rate_limiter import TokenBucketRateLimiter, RateLimitExceeded
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+    def setUp(self):
+        """Limiter without Redis, using the in-process fallback buckets"""
+        self.limiter = TokenBucketRateLimiter(
+            None,
+            model_limits={'gpt-4': 3},
+            tier_limits={('gpt-4', 'solo_backpacker'): 1}
+        )
+
+    def test_grants_up_to_capacity_then_returns_wait(self):
+        """Test that the bucket empties and reports a refill wait"""
+        for _ in range(3):
+            self.assertEqual(self.limiter.acquire('gpt-4', 'business'), 0.0)
+        wait = self.limiter.acquire('gpt-4', 'business')
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 20.0)  # one token every 20s at 3/minute
+
+    def test_tier_bucket_is_separate_but_shares_model_bucket(self):
+        """Test per-tier limits drawing from the model-wide bucket"""
+        self.assertEqual(self.limiter.acquire('gpt-4', 'solo_backpacker'), 0.0)
+        self.assertGreater(self.limiter.acquire('gpt-4', 'solo_backpacker'), 0)
+        # The denied call must not consume model tokens
+        self.assertEqual(self.limiter.acquire('gpt-4', 'business'), 0.0)
+        self.assertEqual(self.limiter.acquire('gpt-4', 'business'), 0.0)
+        self.assertGreater(self.limiter.acquire('gpt-4', 'business'), 0)
+
+    def test_unknown_model_uses_default_limit(self):
+        """Test default limit for unlisted models"""
+        self.assertEqual(self.limiter.get_buckets('gpt-4o', None), [('rate_limit:openai:gpt-4o', 50)])
+
+    def test_wait_raises_when_queue_too_long(self):
+        """Test that callers give up instead of waiting past max_wait"""
+        self.limiter.acquire('gpt-4', 'solo_backpacker')
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            self.limiter.wait('gpt-4', 'solo_backpacker', max_wait=1)
+        self.assertGreater(ctx.exception.retry_after, 1)
+
+    def test_wait_sleeps_for_short_delays(self):
+        """Test that short waits are queued rather than failed"""
+        self.limiter.acquire('gpt-4', 'solo_backpacker')
+        with patch('rate_limiter.time.sleep') as sleep, \
+                patch.object(self.limiter, 'acquire', side_effect=[0.5, 0.0]):
+            self.assertEqual(self.limiter.wait('gpt-4', 'solo_backpacker', max_wait=5), 0.5)
+            sleep.assert_called_once_with(0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+from unittest import mock
+import redis
+import redis_config
+from redis_config import ROLE_CACHE, ROLE_SESSION, get_redis, reset_redis
+
+class TestRedisProvider(unittest.TestCase):
+    def setUp(self):
+        reset_redis()
+        self.addCleanup(reset_redis)
+
+    def test_one_client_per_role(self):
+        """Test that each role's client is built once and then reused"""
+        clients = {ROLE_CACHE: mock.Mock(), ROLE_SESSION: mock.Mock()}
+        with mock.patch('redis_config._build_client', side_effect=lambda role: clients[role]) as build:
+            self.assertIs(get_redis(ROLE_CACHE), clients[ROLE_CACHE])
+            self.assertIs(get_redis(ROLE_CACHE), clients[ROLE_CACHE])
+            self.assertIs(get_redis(ROLE_SESSION), clients[ROLE_SESSION])
+        self.assertEqual(build.call_count, 2)
+
+    def test_unreachable_server_retried_later(self):
+        """Test that a failed connection is not retried on every call"""
+        with mock.patch('redis_config._build_client', side_effect=redis.ConnectionError('refused')) as build, \
+                mock.patch('redis_config.time.monotonic', return_value=1000.0):
+            self.assertIsNone(get_redis(ROLE_CACHE))
+            self.assertIsNone(get_redis(ROLE_CACHE))
+        self.assertEqual(build.call_count, 1)
+
+        client = mock.Mock()
+        with mock.patch('redis_config._build_client', return_value=client), \
+                mock.patch('redis_config.time.monotonic', return_value=1000.0 + redis_config.RETRY_INTERVAL):
+            self.assertIs(get_redis(ROLE_CACHE), client)
+
+    def test_forked_process_gets_new_clients(self):
+        """Test that a child process does not reuse its parent's connections"""
+        with mock.patch('redis_config._build_client', side_effect=lambda role: mock.Mock()):
+            parent_client = get_redis(ROLE_CACHE)
+            with mock.patch('redis_config.os.getpid', return_value=os.getpid() + 1):
+                child_client = get_redis(ROLE_CACHE)
+        self.assertIsNot(child_client, parent_client)
+        parent_client.connection_pool.disconnect.assert_not_called()
+
+    def test_role_options(self):
+        """Test that sessions get raw bytes and pool sizes can be set per role"""
+        with mock.patch.dict(os.environ, {'UPSTASH_REDIS_TOKEN': 'secret', 'REDIS_CACHE_POOL_SIZE': '4'}):
+            cache = redis_config._connection_options('rediss://example.upstash.io:6379', ROLE_CACHE)
+            session = redis_config._connection_options('redis://localhost:6380', ROLE_SESSION)
+        self.assertTrue(cache['decode_responses'])
+        self.assertFalse(session['decode_responses'])
+        self.assertEqual(cache['max_connections'], 4)
+        self.assertEqual(session['max_connections'], redis_config.POOL_SIZE)
+        self.assertEqual(cache['password'], 'secret')
+        self.assertIsNone(cache['ssl_cert_reqs'])
+        self.assertNotIn('ssl_cert_reqs', session)
+
+if __name__ == '__main__':
+    unittest.main()
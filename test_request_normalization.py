@@ -0,0 +1,73 @@
+import unittest
+from datetime import date
+from cache_keys import request_digest
+from request_normalization import (budget_band, date_pattern, canonical_locations,
+                                   normalize_request, rerender_itinerary)
+
+class TestRequestNormalization(unittest.TestCase):
+    def setUp(self):
+        """Set up a representative prepare_cache_data() payload"""
+        self.request_data = {
+            'citizenship': 'malaysia',
+            'destination': 'japan',
+            'specific_locations': 'Tokyo Tower, Senso-ji',
+            'budget': 5000.0,
+            'currency': 'MYR',
+            'num_adults': 2,
+            'start_date': '2025-03-01',
+            'end_date': '2025-03-03',
+            'halal_food': True,
+            'accommodation_location': 'Shinjuku',
+            'accommodation_name': 'Hotel Gracery'
+        }
+
+    def test_similar_requests_share_a_key(self):
+        """Test that budget, dates and spelling within a bucket do not change the key"""
+        similar = dict(self.request_data,
+                       budget=5500.0,
+                       start_date='2025-03-15',
+                       end_date='2025-03-17',
+                       specific_locations='senso-ji;  TOKYO tower ',
+                       accommodation_name='hotel  gracery')
+        self.assertEqual(
+            request_digest(normalize_request(self.request_data), 'gpt-4', 0.7),
+            request_digest(normalize_request(similar), 'gpt-4', 0.7)
+        )
+
+    def test_material_differences_change_key(self):
+        """Test that trip length, weekday, season and currency stay distinct"""
+        base = request_digest(normalize_request(self.request_data), 'gpt-4', 0.7)
+        for changes in ({'end_date': '2025-03-04'},
+                        {'start_date': '2025-03-02', 'end_date': '2025-03-04'},
+                        {'start_date': '2025-07-05', 'end_date': '2025-07-07'},
+                        {'currency': 'USD'},
+                        {'budget': 9000.0}):
+            other = dict(self.request_data, **changes)
+            self.assertNotEqual(base, request_digest(normalize_request(other), 'gpt-4', 0.7), changes)
+
+    def test_budget_bands(self):
+        """Test that bands are geometric"""
+        self.assertEqual(budget_band(5500, ratio=1.25), budget_band(5000, ratio=1.25))
+        self.assertNotEqual(budget_band(500, ratio=1.25), budget_band(5000, ratio=1.25))
+        self.assertEqual(budget_band(0), 0)
+
+    def test_date_pattern(self):
+        """Test the weekday, length and season description"""
+        self.assertEqual(date_pattern('2025-12-06', '2025-12-08'),
+                         {'start_weekday': 'Saturday', 'days': 3, 'season': 'winter'})
+
+    def test_canonical_locations(self):
+        """Test ordering, case and duplicate handling"""
+        self.assertEqual(canonical_locations('Senso-ji,\nTokyo  Tower, senso-ji'),
+                         ['senso-ji', 'tokyo tower'])
+
+    def test_rerender_shifts_dates_and_budget(self):
+        """Test that a cached itinerary is adapted to the new request"""
+        cached = 'Day 1 - Saturday, 2025-03-01\nDay 2 - Sunday, 2025-03-02\nBudget: RM5,000.00'
+        rendered = rerender_itinerary(cached, '2025-03-01', date(2025, 3, 15),
+                                      {'RM5,000.00': 'RM4,800.00'})
+        self.assertEqual(rendered,
+                         'Day 1 - Saturday, 2025-03-15\nDay 2 - Sunday, 2025-03-16\nBudget: RM4,800.00')
+
+if __name__ == '__main__':
+    unittest.main()
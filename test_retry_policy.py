@@ -0,0 +1,125 @@
+import threading
+import unittest
+from unittest.mock import Mock, patch
+import openai
+from gpt_model_handler import GPTModelHandler
+from retry_policy import (RetryPolicy, classify_error, InvalidRequestError, UpstreamAuthError,
+                          UpstreamQuotaError, UpstreamRateLimitError, TransientUpstreamError)
+
+def api_error(error_class, status_code, headers=None, code=None):
+    """Build an OpenAI status error without a real HTTP response"""
+    response = Mock(status_code=status_code, headers=headers or {})
+    body = {'code': code} if code else None
+    return error_class('upstream said no', response=response, body=body)
+
+class TestClassifyError(unittest.TestCase):
+    def test_rate_limit_with_retry_after(self):
+        """Test that 429s are retryable and carry Retry-After"""
+        error = classify_error(api_error(openai.RateLimitError, 429, {'retry-after': '7'}), 'gpt-4')
+        self.assertIsInstance(error, UpstreamRateLimitError)
+        self.assertTrue(error.retryable)
+        self.assertEqual(error.retry_after, 7.0)
+        self.assertEqual(error.model, 'gpt-4')
+
+    def test_permanent_errors_are_not_retryable(self):
+        """Test invalid keys, exhausted quota and bad requests"""
+        cases = [
+            (api_error(openai.AuthenticationError, 401), UpstreamAuthError),
+            (api_error(openai.RateLimitError, 429, code='insufficient_quota'), UpstreamQuotaError),
+            (api_error(openai.BadRequestError, 400, code='context_length_exceeded'), InvalidRequestError),
+            (ValueError('Prompt is too long'), InvalidRequestError)
+        ]
+        for raw, expected in cases:
+            error = classify_error(raw)
+            self.assertIsInstance(error, expected)
+            self.assertFalse(error.retryable)
+
+    def test_invalid_api_key_is_auth_error(self):
+        """Test that a malformed key is reported as an authentication problem"""
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-short'}):
+            with self.assertRaises(UpstreamAuthError) as raised:
+                GPTModelHandler.validate_api_key()
+        self.assertIs(classify_error(raised.exception), raised.exception)
+
+    def test_server_errors_are_retryable(self):
+        """Test 5xx responses"""
+        error = classify_error(api_error(openai.InternalServerError, 503, {'retry-after-ms': '1500'}))
+        self.assertIsInstance(error, TransientUpstreamError)
+        self.assertEqual(error.retry_after, 1.5)
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(None, max_attempts=3, base_delay=0.01, max_delay=0.05, min_retries=10)
+
+    @patch('retry_policy.time.sleep')
+    def test_retries_transient_errors(self, sleep):
+        """Test that transient failures are retried until success"""
+        func = Mock(side_effect=[api_error(openai.InternalServerError, 500), 'itinerary'])
+        self.assertEqual(self.policy.call(func), 'itinerary')
+        self.assertEqual(func.call_count, 2)
+
+    @patch('retry_policy.time.sleep')
+    def test_does_not_retry_permanent_errors(self, sleep):
+        """Test that an invalid key fails on the first attempt"""
+        func = Mock(side_effect=api_error(openai.AuthenticationError, 401))
+        with self.assertRaises(UpstreamAuthError):
+            self.policy.call(func)
+        func.assert_called_once()
+        sleep.assert_not_called()
+
+    @patch('retry_policy.time.sleep')
+    def test_honours_retry_after(self, sleep):
+        """Test that the server's Retry-After overrides a shorter backoff"""
+        func = Mock(side_effect=[api_error(openai.RateLimitError, 429, {'retry-after': '2'}), 'itinerary'])
+        self.policy.call(func)
+        self.assertEqual(sleep.call_args[0][0], 2.0)
+
+    @patch('retry_policy.time.sleep')
+    def test_deadline_stops_retries(self, sleep):
+        """Test that a wait past the deadline is not attempted"""
+        func = Mock(side_effect=api_error(openai.RateLimitError, 429, {'retry-after': '30'}))
+        with self.assertRaises(UpstreamRateLimitError):
+            self.policy.call(func, deadline=10)
+        func.assert_called_once()
+
+    @patch('retry_policy.time.sleep')
+    def test_budget_limits_retries(self, sleep):
+        """Test that retries stop once the shared budget is spent"""
+        policy = RetryPolicy(None, max_attempts=5, base_delay=0.01, budget_ratio=0, min_retries=1)
+        func = Mock(side_effect=api_error(openai.InternalServerError, 500))
+        with self.assertRaises(TransientUpstreamError):
+            policy.call(func)
+        self.assertEqual(func.call_count, 2)
+
+    def test_concurrent_retries_stay_within_budget(self):
+        """Test that retries racing for the last of the budget are not all granted"""
+        policy = RetryPolicy(None, budget_ratio=0, min_retries=5)
+        granted = []
+        threads = [threading.Thread(target=lambda: granted.append(policy.acquire_retry())) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(granted.count(True), 5)
+        self.assertEqual(policy._increment('retries', 0), (0, 5))
+
+    def test_redis_budget_refunds_overspend(self):
+        """Test that a retry counted past the shared budget is given back"""
+        redis_client = Mock()
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.return_value = [12, ['10', '12'], True]
+        policy = RetryPolicy(redis_client, budget_ratio=0.1, min_retries=10)
+
+        self.assertFalse(policy.acquire_retry())
+        self.assertEqual([call.args[1:] for call in pipe.hincrby.call_args_list], [('retries', 1), ('retries', -1)])
+
+    def test_passthrough_errors_are_not_wrapped(self):
+        """Test that errors the caller handles itself propagate unchanged"""
+        class CircuitOpen(Exception):
+            pass
+
+        with self.assertRaises(CircuitOpen):
+            self.policy.call(Mock(side_effect=CircuitOpen()), passthrough=(CircuitOpen,))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import Mock
+from single_flight import SingleFlight
+
+class FakeLockRedis:
+    """Just enough of the Redis API for lock handling"""
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.store)
+
+    def eval(self, script, numkeys, key, token):
+        if self.store.get(key) == token:
+            del self.store[key]
+            return 1
+        return 0
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeLockRedis()
+        self.flight = SingleFlight(self.redis, wait_timeout=0.2, poll_interval=0.01)
+
+    def test_leader_computes_and_releases_lock(self):
+        """Test that the first caller computes and frees the lock"""
+        compute = Mock(return_value='itinerary')
+        self.assertEqual(self.flight.do('trip', compute, load=Mock(return_value=None)), 'itinerary')
+        compute.assert_called_once()
+        self.assertEqual(self.redis.store, {})
+
+    def test_follower_waits_for_leader_result(self):
+        """Test that a caller finding the lock held reuses the published result"""
+        self.redis.set('single_flight:trip', 'other-worker')
+        compute = Mock(return_value='duplicate')
+        load = Mock(side_effect=[None, 'itinerary'])
+
+        self.assertEqual(self.flight.do('trip', compute, load), 'itinerary')
+        compute.assert_not_called()
+
+    def test_follower_takes_over_when_leader_fails(self):
+        """Test that a waiter computes once the lock disappears without a result"""
+        self.redis.set('single_flight:trip', 'other-worker')
+        compute = Mock(return_value='itinerary')
+
+        def load():
+            self.redis.store.pop('single_flight:trip', None)
+            return None
+
+        self.assertEqual(self.flight.do('trip', compute, load), 'itinerary')
+        compute.assert_called_once()
+
+    def test_follower_falls_back_after_timeout(self):
+        """Test that waiting is bounded"""
+        self.redis.set('single_flight:trip', 'other-worker')
+        compute = Mock(return_value='itinerary')
+
+        self.assertEqual(self.flight.do('trip', compute, load=Mock(return_value=None)), 'itinerary')
+        compute.assert_called_once()
+
+    def test_without_redis_computes_directly(self):
+        """Test degraded mode when Redis is unavailable"""
+        compute = Mock(return_value='itinerary')
+        self.assertEqual(SingleFlight(None).do('trip', compute, load=Mock()), 'itinerary')
+
+class TestDoIfIdle(unittest.TestCase):
+    def test_skips_when_another_worker_is_running(self):
+        """Test that a busy key is not recomputed and a free one is"""
+        redis_client = FakeLockRedis()
+        flight = SingleFlight(redis_client)
+        redis_client.set('single_flight:rates', 'other-worker')
+        compute = Mock(return_value='rates')
+        self.assertEqual(flight.do_if_idle('rates', compute), (False, None))
+        compute.assert_not_called()
+
+        del redis_client.store['single_flight:rates']
+        self.assertEqual(flight.do_if_idle('rates', compute), (True, 'rates'))
+        self.assertEqual(redis_client.store, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import unittest
+from datetime import date
+from decimal import Decimal
+from structured_itinerary import (TripPlan, STRUCTURED_OUTPUT, convert_trip_plan, parse_trip_plan,
+                                  render_markdown)
+
+RESPONSE = {
+    'title': '2-Day Itinerary for Japan',
+    'overview': 'Temples and street food in Tokyo.',
+    'days': [
+        {'day_number': 1, 'date': '2025-03-01', 'title': 'Asakusa', 'activities': [
+            {'time': '12:30', 'slot': 'afternoon', 'title': 'Lunch', 'cost': 120,
+             'location': {'name': 'Asakusa Halal Ramen'}, 'category': 'food'},
+            {'time': '09:00', 'slot': 'morning', 'title': 'Visit', 'cost': 0,
+             'location': {'name': 'Senso-ji', 'address': 'Asakusa, Tokyo'},
+             'transport': '10 min walk', 'notes': 'Arrive early'}
+        ]},
+        {'day_number': 2, 'date': '2025-03-02', 'title': 'Shibuya', 'activities': []}
+    ],
+    'cost_summary': {'food': 120, 'accommodation': 800.5, 'unknown': 3},
+    'tips': ['Carry cash']
+}
+
+class TestTripPlan(unittest.TestCase):
+    def test_parse_response(self):
+        """Test that model output is parsed into typed days and activities"""
+        text = f"Here is your plan:\n```json\n{json.dumps(RESPONSE)}\n```"
+        plan = parse_trip_plan(text, 'MYR')
+        self.assertEqual(plan.currency, 'MYR')
+        self.assertEqual(plan.days[0].date, date(2025, 3, 1))
+        self.assertEqual(plan.days[0].activities[0].cost, Decimal('120'))
+        self.assertEqual(plan.days[0].activities[1].location.address, 'Asakusa, Tokyo')
+        self.assertEqual(set(plan.cost_summary), {'food', 'accommodation'})
+        self.assertEqual(plan.total_cost, Decimal('920.5'))
+
+    def test_invalid_responses(self):
+        """Test that unusable output raises ValueError"""
+        for text in ('no json here', '{"title": "x"', json.dumps({'title': 'x', 'overview': 'y'}),
+                     json.dumps(dict(RESPONSE, days=[]))):
+            with self.assertRaises(ValueError):
+                parse_trip_plan(text, 'MYR')
+
+        bad_slot = json.loads(json.dumps(RESPONSE))
+        bad_slot['days'][0]['activities'][0]['slot'] = 'midnight'
+        with self.assertRaises(ValueError):
+            parse_trip_plan(json.dumps(bad_slot), 'MYR')
+
+    def test_malformed_shapes(self):
+        """Test that output of the wrong JSON types raises ValueError, not AttributeError"""
+        for path, value in ((('days', 0, 'activities', 0), 'Visit Senso-ji'),
+                            (('days', 0, 'activities'), 'Visit Senso-ji'),
+                            (('days', 0, 'day_number'), None),
+                            (('days',), 'two days'),
+                            (('cost_summary',), ['food'])):
+            data = json.loads(json.dumps(RESPONSE))
+            target = data
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = value
+            with self.subTest(path=path), self.assertRaises(ValueError):
+                parse_trip_plan(json.dumps(data), 'MYR')
+
+    def test_round_trip(self):
+        """Test that a stored plan loads back unchanged"""
+        plan = TripPlan.from_dict(RESPONSE, 'MYR')
+        stored = json.loads(json.dumps(plan.to_dict()))
+        self.assertEqual(TripPlan.from_dict(stored, 'MYR'), plan)
+
+    def test_convert(self):
+        """Test that conversion scales every amount and rounds to the currency"""
+        plan = TripPlan.from_dict(RESPONSE, 'MYR')
+        converted = convert_trip_plan(plan, 'JPY', '26.39')
+        self.assertEqual(converted.currency, 'JPY')
+        self.assertEqual(converted.days[0].activities[0].cost, Decimal('3167'))
+        self.assertEqual(converted.cost_summary['accommodation'], Decimal('21125'))
+        self.assertEqual(plan.days[0].activities[0].cost, Decimal('120'))
+
+    def test_render_markdown(self):
+        """Test that rendering orders activities by slot and adds map links"""
+        markdown = render_markdown(TripPlan.from_dict(RESPONSE, 'MYR'))
+        self.assertIn('## Day 1: Asakusa (Saturday, 2025-03-01)', markdown)
+        self.assertLess(markdown.index('### Morning'), markdown.index('### Afternoon'))
+        self.assertIn('* 09:00 Visit at [Senso-ji](https://www.google.com/maps/search/?api=1&query='
+                      'Senso-ji%2C%20Asakusa%2C%20Tokyo) - Free, 10 min walk', markdown)
+        self.assertIn('RM120.00', markdown)
+        self.assertIn('**Total: RM920.50**', markdown)
+        self.assertEqual(markdown, render_markdown(TripPlan.from_dict(RESPONSE, 'MYR')))
+
+    def test_prompt_includes_schema(self):
+        """Test that the structured prompt section carries the schema and currency"""
+        section = STRUCTURED_OUTPUT.render({'start_date': '2025-03-01'}, halal=True, currency='MYR')
+        self.assertIn('"cost_summary"', section)
+        self.assertIn('in MYR', section)
+        self.assertIn('starting 2025-03-01', section)
+        self.assertIn('prayer facilities', section)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from telemetry import CallMetrics, Telemetry, bucket_index, estimate_cost, estimate_percentile
+from gpt_model_handler import GPTModelHandler
+from hedging import HedgeCancelled, hedged_call
+from token_budget import count_message_tokens, count_tokens
+
+def usage(prompt_tokens, completion_tokens):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+class TestHistograms(unittest.TestCase):
+    def test_bucket_index(self):
+        self.assertEqual(bucket_index('latency_seconds', 0.3), 0)
+        self.assertEqual(bucket_index('latency_seconds', 5), 2)
+        self.assertEqual(bucket_index('latency_seconds', 500), 9)
+
+    def test_percentile(self):
+        """Test that percentiles are interpolated within their bucket"""
+        buckets = [0, 10, 10, 0, 0, 0, 0, 0, 0, 0]
+        self.assertEqual(estimate_percentile('latency_seconds', buckets, 0.5), 2)
+        self.assertEqual(estimate_percentile('latency_seconds', buckets, 0.75), 3.5)
+        self.assertEqual(estimate_percentile('latency_seconds', [0] * 9 + [3], 0.5), 120)
+        self.assertIsNone(estimate_percentile('latency_seconds', [0] * 10, 0.5))
+
+class TestCallMetrics(unittest.TestCase):
+    def test_usage_and_cost(self):
+        """Test that usage from several completions adds up, priced per model"""
+        call = CallMetrics('gpt-4', 'gold_wanderer')
+        call.add_usage('gpt-4', usage(1000, 2000))
+        call.add_usage('gpt-3.5-turbo', usage(1000, 1000))
+        call.add_usage('gpt-4', None)
+        self.assertEqual((call.prompt_tokens, call.completion_tokens), (2000, 3000))
+        self.assertAlmostEqual(call.cost_usd, 0.15 + 0.002)
+        self.assertAlmostEqual(estimate_cost('unknown', 1000, 0), 0.03)
+
+    def test_first_token_kept(self):
+        call = CallMetrics('gpt-4', None)
+        call.record_first_token(1.5)
+        call.record_first_token(0.5)
+        self.assertEqual(call.first_token_seconds, 1.5)
+
+class TestTelemetry(unittest.TestCase):
+    def test_snapshot(self):
+        """Test that calls are grouped by model and tier with totals"""
+        telemetry = Telemetry(None)
+        call = CallMetrics('gpt-4', 'gold_wanderer')
+        call.start_attempt()
+        call.start_attempt()
+        call.add_usage('gpt-4', usage(1000, 2000))
+        telemetry.observe(call, 'miss')
+        telemetry.observe(CallMetrics('gpt-4', 'gold_wanderer'), 'hit')
+        telemetry.observe(CallMetrics('gpt-3.5-turbo', None), 'error')
+
+        snapshot = telemetry.snapshot()
+        self.assertEqual(snapshot['totals']['calls'], 3)
+        self.assertEqual(snapshot['totals']['api_calls'], 2)
+        self.assertEqual(snapshot['totals']['completion_tokens'], 2000)
+        self.assertAlmostEqual(snapshot['totals']['cost_usd'], 0.15)
+
+        anonymous, gold = snapshot['groups']
+        self.assertEqual(anonymous['tier'], 'anonymous')
+        self.assertEqual(gold['calls'], {'hit': 1, 'miss': 1, 'error': 0})
+        self.assertEqual(gold['cache_hit_ratio'], 0.5)
+        # The cache hit is not part of the latency or retry figures
+        self.assertEqual(gold['metrics']['retries']['count'], 1)
+        self.assertEqual(gold['metrics']['retries']['mean'], 1.0)
+        self.assertNotIn('first_token_seconds', gold['metrics'])
+
+class TestHandlerUsage(unittest.TestCase):
+    def test_complete_once_records_usage(self):
+        """Test that API usage is added to the call being measured"""
+        response = SimpleNamespace(
+            usage=usage(800, 1200),
+            choices=[SimpleNamespace(message=SimpleNamespace(content='## Day 1'), finish_reason='stop')])
+        client = mock.Mock()
+        client.chat.completions.create.return_value = response
+        call = CallMetrics('gpt-4', 'gold_wanderer')
+        with mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client):
+            content, finish_reason = GPTModelHandler._complete_once(
+                'gpt-4', [], 1000, 0.7, call=call)
+
+        self.assertEqual((content, finish_reason), ('## Day 1', 'stop'))
+        self.assertEqual(call.completion_tokens, 1200)
+        self.assertAlmostEqual(call.cost_usd, 0.024 + 0.072)
+
+    def test_cancelled_hedge_usage_estimated(self):
+        """Test that a losing hedge stopped mid-stream still has its tokens counted"""
+        messages = [{'role': 'user', 'content': 'Plan three days in Tokyo'}]
+        first_token, cancelled = threading.Event(), threading.Event()
+
+        def chunks():
+            for text in ('## Day 1', '\n* 09:00 Senso-ji'):
+                yield SimpleNamespace(usage=None, choices=[
+                    SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content=text))])
+                cancelled.set()
+
+        stream = mock.MagicMock()
+        stream.__iter__.side_effect = chunks
+        client = mock.Mock()
+        client.chat.completions.create.return_value = stream
+        call = CallMetrics('gpt-4', 'gold_wanderer')
+        with mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client), \
+                mock.patch('gpt_model_handler.get_redis', return_value=None):
+            with self.assertRaises(HedgeCancelled):
+                GPTModelHandler._complete_once('gpt-4', messages, 1000, 0.7, first_token, cancelled, call=call)
+
+        stream.close.assert_called_once()
+        self.assertEqual(call.prompt_tokens, count_message_tokens(messages, 'gpt-4'))
+        self.assertEqual(call.completion_tokens, count_tokens('## Day 1', 'gpt-4'))
+        self.assertGreater(call.cost_usd, 0)
+
+    def test_losing_hedge_usage_reaches_telemetry(self):
+        """Test that a loser stopping after the call was observed still has its tokens recorded"""
+        messages = [{'role': 'user', 'content': 'Plan three days in Tokyo'}]
+        release, late = threading.Event(), threading.Event()
+
+        def slow_chunks():
+            # The primary only notices it lost on a chunk sent after the call was recorded
+            release.wait(5)
+            yield SimpleNamespace(usage=None, choices=[
+                SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content='## Day 1'))])
+
+        def fast_chunks():
+            yield SimpleNamespace(usage=None, choices=[
+                SimpleNamespace(finish_reason='stop', delta=SimpleNamespace(content='## Day 1'))])
+            yield SimpleNamespace(usage=usage(100, 50), choices=[])
+
+        primary, secondary = mock.MagicMock(), mock.MagicMock()
+        primary.__iter__.side_effect = slow_chunks
+        secondary.__iter__.side_effect = fast_chunks
+        client = mock.Mock()
+        client.chat.completions.create.side_effect = [primary, secondary]
+
+        telemetry = Telemetry(None)
+        add_late_usage = telemetry.add_late_usage
+        telemetry.add_late_usage = lambda *args: (add_late_usage(*args), late.set())
+        call = CallMetrics('gpt-4', 'gold_wanderer')
+
+        def complete(first_token, cancelled):
+            return GPTModelHandler._complete_once('gpt-4', messages, 1000, 0.7, first_token, cancelled, call=call)
+
+        with mock.patch.object(GPTModelHandler, 'validate_api_key', return_value='sk-test'), \
+                mock.patch('gpt_model_handler.get_openai_client', return_value=client), \
+                mock.patch('gpt_model_handler.get_redis', return_value=None):
+            result, winner = hedged_call(complete, complete, delay=0.05)
+            telemetry.observe(call, 'miss')
+            release.set()
+            self.assertTrue(late.wait(5))
+
+        self.assertEqual((result, winner), (('## Day 1', 'stop'), 'secondary'))
+        totals = telemetry.snapshot()['totals']
+        self.assertEqual(totals['prompt_tokens'], 100 + count_message_tokens(messages, 'gpt-4'))
+        self.assertEqual(totals['completion_tokens'], 50)
+        self.assertEqual(telemetry.snapshot()['groups'][0]['metrics']['prompt_tokens']['count'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
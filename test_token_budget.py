@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+import tiktoken
+import tiktoken_ext.openai_public
+import token_budget
+from token_budget import (
+    completion_budget,
+    count_message_tokens,
+    count_prompt_tokens,
+    count_segment_tokens,
+    count_tokens,
+    COMPLETION_OVERHEAD,
+    MAX_COMPLETION_TOKENS,
+    MIN_COMPLETION_TOKENS,
+    TOKENS_PER_DAY,
+    TokenizerUnavailableError
+)
+import prompt_templates
+
+def small_cl100k():
+    """cl100k_base's pre-tokenizer with a small vocabulary, so tests need no download"""
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    for piece in (b'\n\n', b'  ', b'   ', b' -', b':\n', b'th', b'the', b' t', b' th', b' the',
+                  b'in', b'ing', b'Da', b'Day', b'er', b'es'):
+        ranks[piece] = len(ranks)
+    with mock.patch.object(tiktoken_ext.openai_public, 'load_tiktoken_bpe', return_value=ranks):
+        return tiktoken.Encoding(**tiktoken_ext.openai_public.cl100k_base())
+
+class SmallTokenizerTestCase(unittest.TestCase):
+    """Counts tokens with small_cl100k() in place of the real vocabulary"""
+    def setUp(self):
+        patcher = mock.patch.object(token_budget, 'get_encoding', return_value=small_cl100k())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        count_segment_tokens.cache_clear()
+        self.addCleanup(count_segment_tokens.cache_clear)
+
+class TestTokenBudget(unittest.TestCase):
+    def test_budget_scales_with_trip_length_and_tier(self):
+        """Test that the completion budget follows tier and duration"""
+        one_day = completion_budget('gpt-3.5-turbo', 2000, 'solo_backpacker', 1)
+        self.assertEqual(one_day, COMPLETION_OVERHEAD + TOKENS_PER_DAY['solo_backpacker'])
+
+        gold = completion_budget('gpt-3.5-turbo', 2000, 'gold_wanderer', 2)
+        self.assertGreater(gold, completion_budget('gpt-3.5-turbo', 2000, 'tandem_trekker', 2))
+
+    def test_budget_is_capped_by_model_limits(self):
+        """Test that long trips never exceed the completion or context limit"""
+        self.assertEqual(completion_budget('gpt-4', 1000, 'business', 14), MAX_COMPLETION_TOKENS['gpt-4'])
+        self.assertEqual(completion_budget('gpt-4', 7000, 'business', 14), 8192 - 7000)
+
+    def test_budget_without_trip_days_uses_ceiling(self):
+        """Test fallback when the trip length is unknown"""
+        self.assertEqual(completion_budget('gpt-4', 1000), MAX_COMPLETION_TOKENS['gpt-4'])
+
+    def test_prompt_overflow_raises(self):
+        """Test that a prompt filling the context window is rejected"""
+        with self.assertRaises(ValueError):
+            completion_budget('gpt-4', 8192 - MIN_COMPLETION_TOKENS + 1, 'business', 3)
+
+    def test_message_tokens_include_overhead(self):
+        """Test chat message token accounting"""
+        messages = [{'role': 'system', 'content': 'You plan trips.'},
+                    {'role': 'user', 'content': 'Three days in Tokyo.'}]
+        content_tokens = sum(count_tokens(m['content'], 'gpt-4') for m in messages)
+        self.assertGreater(count_message_tokens(messages, 'gpt-4'), content_tokens)
+        self.assertEqual(count_tokens('', 'gpt-4'), 0)
+
+class TestPromptTokens(SmallTokenizerTestCase):
+    def test_segments_add_up_to_whole_prompt(self):
+        """Test that counting by segment matches encoding the whole prompt"""
+        prompt = (prompt_templates.SYSTEM_PROMPT.render({'citizenship': 'Malaysia', 'timestamp': 'now'},
+                                                        halal=True, currency='MYR')
+                  + "Trip for  two:\n\n\n  - the end\n"
+                  + prompt_templates.PRICE_BREAKDOWN.render()
+                  + prompt_templates.RELIGIOUS_ACCESSIBILITY.render(halal=True) + "   ")
+        self.assertEqual(count_prompt_tokens(prompt, 'gpt-4'), count_tokens(prompt, 'gpt-4'))
+        self.assertEqual(count_prompt_tokens('', 'gpt-4'), 0)
+
+    def test_static_sections_are_encoded_once(self):
+        """Test that a second request only encodes the segments that changed"""
+        static = prompt_templates.PRICE_BREAKDOWN.render()
+        count_prompt_tokens("Trip for Aisha\n" + static, 'gpt-4')
+        misses = count_segment_tokens.cache_info().misses
+
+        count_prompt_tokens("Trip for Ben\n" + static, 'gpt-4')
+        self.assertEqual(count_segment_tokens.cache_info().misses, misses + 1)
+
+class TestTokenizerUnavailable(unittest.TestCase):
+    def test_missing_vocabulary_fails_loudly(self):
+        """Test that counts are not silently approximated without the vocabulary"""
+        with mock.patch.object(token_budget, 'FALLBACK_ENABLED', False), \
+                mock.patch.object(token_budget, '_load_encoding', side_effect=OSError('offline')):
+            with self.assertRaises(TokenizerUnavailableError):
+                count_tokens('Three days in Tokyo.', 'gpt-4')
+
+        with mock.patch.object(token_budget, 'FALLBACK_ENABLED', True), \
+                mock.patch.object(token_budget, '_load_encoding', side_effect=OSError('offline')):
+            self.assertEqual(count_tokens('Three days in Tokyo.', 'gpt-4'), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""Token counting and completion budgets.
+
+Token counts come from tiktoken's BPE vocabularies, which tiktoken
+downloads on first use. Fetch them into VOCABULARY_DIR before starting
+the app so workers never need network access to count tokens:
+
+    python token_budget.py
+
+Without a vocabulary get_encoding raises TokenizerUnavailableError, unless
+TOKEN_COUNT_FALLBACK_ENABLED=true allows approximate counts (for tests and
+local development only).
+"""
+import os
+import re
+import sys
+import logging
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Keep the BPE vocabulary on local disk so encodings load without network access
+VOCABULARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'tiktoken')
+os.environ.setdefault('TIKTOKEN_CACHE_DIR', VOCABULARY_DIR)
+
+# Approximate counts skew every completion budget, so they must be asked for
+FALLBACK_ENABLED = os.getenv('TOKEN_COUNT_FALLBACK_ENABLED', 'false').lower() == 'true'
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Context window per model
+CONTEXT_WINDOWS = {
+    'gpt-3.5-turbo': 16385,
+    'gpt-4': 8192
+}
+
+# Maximum completion tokens the API accepts per model
+MAX_COMPLETION_TOKENS = {
+    'gpt-3.5-turbo': 4096,
+    'gpt-4': 4096
+}
+
+# Expected completion tokens per itinerary day for each subscription tier
+TOKENS_PER_DAY = {
+    'solo_backpacker': 700,
+    'tandem_trekker': 900,
+    'gold_wanderer': 1200,
+    'business': 1200
+}
+
+# Completion tokens for the trip overview, costs and requirements sections
+COMPLETION_OVERHEAD = 1000
+MIN_COMPLETION_TOKENS = 256
+
+# Chat format overhead (see OpenAI cookbook "How to count tokens")
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Rough characters per token when no tokenizer is available
+APPROX_CHARS_PER_TOKEN = 4
+
+# BPE never merges across a newline followed by a non-space character, so a
+# prompt can be counted as the sum of the pieces between those points. The
+# static template sections split into the same pieces on every request.
+SEGMENT_BOUNDARY = re.compile(r'(?<=\n)(?=\S)')
+SEGMENT_CACHE_SIZE = int(os.getenv('TOKEN_SEGMENT_CACHE_SIZE', 4096))
+
+class TokenizerUnavailableError(RuntimeError):
+    """The BPE vocabulary for a model could not be loaded"""
+
+@lru_cache(maxsize=8)
+def _load_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+def get_encoding(model):
+    """Get the BPE encoding for a model.
+
+    Returns None (approximate counts) only when FALLBACK_ENABLED; otherwise
+    a missing tokenizer raises TokenizerUnavailableError.
+    """
+    try:
+        if tiktoken is None:
+            raise ImportError("tiktoken is not installed")
+        return _load_encoding(model)
+    except Exception as e:
+        if FALLBACK_ENABLED:
+            logger.warning(f"Could not load tokenizer for {model}, using approximate counts: {str(e)}")
+            return None
+        raise TokenizerUnavailableError(
+            f"Could not load tokenizer for {model} from {os.environ['TIKTOKEN_CACHE_DIR']}: {str(e)}. "
+            f"Run 'python token_budget.py' to fetch it.") from e
+
+def count_tokens(text, model):
+    """Count tokens in text for the given model"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // APPROX_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def count_segment_tokens(segment, model):
+    """Count tokens in one prompt segment (memoized)"""
+    return count_tokens(segment, model)
+
+def count_prompt_tokens(text, model):
+    """Count tokens in a prompt, reusing the counts of segments seen before.
+
+    Equal to count_tokens(text, model); only the per-request parts of the
+    prompt are encoded again.
+    """
+    if not text:
+        return 0
+    if get_encoding(model) is None:
+        return count_tokens(text, model)
+    return sum(count_segment_tokens(segment, model) for segment in SEGMENT_BOUNDARY.split(text))
+
+def count_message_tokens(messages, model):
+    """Count prompt tokens for a list of chat messages, including format overhead"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        total += count_prompt_tokens(message.get('content', ''), model)
+        total += count_segment_tokens(message.get('role', ''), model)
+    return total
+
+def fetch_vocabularies():
+    """Download the vocabulary of every budgeted model into TIKTOKEN_CACHE_DIR"""
+    if tiktoken is None:
+        raise TokenizerUnavailableError("tiktoken is not installed")
+    os.makedirs(os.environ['TIKTOKEN_CACHE_DIR'], exist_ok=True)
+    for model in CONTEXT_WINDOWS:
+        encoding = _load_encoding(model)
+        logger.info(f"Tokenizer {encoding.name} for {model} is in {os.environ['TIKTOKEN_CACHE_DIR']}")
+
+def completion_budget(model, prompt_tokens, subscription_tier=None, trip_days=None):
+    """Pick max_tokens for a request based on the tier and trip length.
+
+    The budget covers what the itinerary actually needs rather than whatever
+    is left in the context window, which keeps generation time down. Raises
+    ValueError when the prompt leaves no room for a useful completion.
+    """
+    context_window = CONTEXT_WINDOWS.get(model, min(CONTEXT_WINDOWS.values()))
+    available = context_window - prompt_tokens
+    if available < MIN_COMPLETION_TOKENS:
+        raise ValueError(f"Prompt uses {prompt_tokens} tokens, exceeding the {model} context window")
+
+    ceiling = min(available, MAX_COMPLETION_TOKENS.get(model, available))
+    if not trip_days:
+        return ceiling
+
+    per_day = TOKENS_PER_DAY.get(subscription_tier, TOKENS_PER_DAY['solo_backpacker'])
+    wanted = COMPLETION_OVERHEAD + per_day * trip_days
+    return max(MIN_COMPLETION_TOKENS, min(wanted, ceiling))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    try:
+        fetch_vocabularies()
+    except Exception as e:
+        logger.error(f"Could not fetch tokenizer vocabularies: {str(e)}")
+        sys.exit(1)
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, stream_with_context, abort
 from flask_login import login_required, current_user
 import json
 import os
@@ -10,15 +10,19 @@ from decimal import Decimal
 from datetime import datetime
 from functools import wraps
 
-from models import User, Itinerary, AccessViolation
-from forms import ItineraryForm, ProfileForm
+from models import User, Itinerary, AccessViolation, StructuredItinerary
+from forms import ItineraryForm, ProfileForm, DayRevisionForm
 from extensions import db
-from itinerary_generator import generate_itinerary, is_openai_available
+from itinerary_generator import generate_itinerary, generate_structured_itinerary, stream_itinerary, post_process_itinerary, prepare_cache_data, is_openai_available, is_degraded_itinerary, regenerate_day, regenerate_structured_day
+from structured_itinerary import STRUCTURED_ENABLED, SCHEMA_VERSION, convert_trip_plan, render_markdown
+from itinerary_jobs import get_job_queue, STATUS_COMPLETED, STATUS_FAILED, form_data_from_request, request_data_from_itinerary
 from destination_validation import validate_budget_and_duration
 from gpt_model_handler import GPTModelHandler
 from currency_data import get_currency_info, format_currency
 from cache_manager import CacheManager
-from currency_routes import get_redis
+from currency_routes import get_conversion_rate, get_rates
+from circuit_breaker import CircuitOpenError
+from redis_config import get_redis_health
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -29,6 +33,9 @@ cache_manager = CacheManager()
 
 main_views = Blueprint('main_views', __name__)
 
+# Regenerating a single day is free, but capped per itinerary per day
+DAY_REVISIONS_PER_DAY = int(os.getenv('DAY_REVISIONS_PER_DAY', 10))
+
 def check_subscription_limits(f):
     """Decorator to check subscription limits before processing requests"""
     @wraps(f)
@@ -100,12 +107,37 @@ def diagnostic():
         violations = AccessViolation.get_recent_violations()
         return render_template('admin/diagnostic.html',
                             usage_stats=usage_stats,
-                            violations=violations)
+                            violations=violations,
+                            telemetry=GPTModelHandler.get_telemetry().snapshot(get_metrics_days()))
     except Exception as e:
         logger.error(f"Error in diagnostic view: {str(e)}")
         flash('Error loading diagnostic data', 'danger')
         return redirect(url_for('main_views.index'))
 
+def get_metrics_days():
+    """Days of telemetry to show, from ?days= (1 to the retention period)"""
+    days = request.args.get('days', 1, type=int) or 1
+    return max(1, min(days, GPTModelHandler.get_telemetry().RETENTION_DAYS))
+
+@main_views.route('/admin/metrics')
+@login_required
+def metrics():
+    """Generation latency, token and cost histograms for monitoring"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        return jsonify({
+            'generation': GPTModelHandler.get_telemetry().snapshot(get_metrics_days()),
+            'continuations': GPTModelHandler.get_continuation_tracker().get_stats(),
+            'response_cache': GPTModelHandler.get_cache_stats(),
+            'circuit_breaker': GPTModelHandler.get_circuit_breaker().get_state(),
+            'redis': get_redis_health(),
+            'l1_cache': cache_manager.get_l1_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting metrics: {str(e)}")
+        return jsonify({'error': 'Failed to get metrics'}), 500
+
 @main_views.route('/pricing')
 def pricing():
     """Render the pricing page with plan information"""
@@ -296,34 +328,203 @@ def profile():
                          model_features=model_features)
 
 
+def get_generation_block(cache_key):
+    """Check whether the current user may start a new itinerary generation.
+
+    Returns a (message, redirect_endpoint) tuple when blocked, otherwise None.
+    """
+    # Initial phone number check
+    if not current_user.phone_number:
+        return ('Please add your phone number to your profile before creating an itinerary.',
+                'main_views.profile')
+
+    # Check rate limiting from cache
+    if cache_manager.exists(cache_key):
+        return ('Please wait a moment before generating another itinerary.', 'main_views.index')
+
+    # Monthly limit check with violation tracking
+    if current_user.itineraries_generated_this_month >= current_user.max_itineraries_per_month:
+        violation = AccessViolation(
+            user_id=current_user.id,
+            violation_type='monthly_limit_exceeded',
+            details=f'Attempted to exceed monthly limit of {current_user.max_itineraries_per_month} itineraries'
+        )
+        db.session.add(violation)
+        db.session.commit()
+
+        return (f'You have reached your monthly limit of {current_user.max_itineraries_per_month} itineraries. Please upgrade your plan to create more.',
+                'main_views.pricing')
+
+    return None
+
+def check_plan_limits(form):
+    """Validate a submitted itinerary form against the user's plan and budget rules.
+
+    Returns a (messages, needs_upgrade) tuple. An empty message list means the
+    request may proceed; needs_upgrade is True when the user hit a plan limit.
+    """
+    total_travelers = (
+        form.num_adults.data +
+        form.num_youth.data +
+        form.num_children.data
+    )
+    num_infants = form.num_infants.data
+
+    # Validate against plan limits with violation tracking
+    if total_travelers > current_user.max_travelers:
+        violation = AccessViolation(
+            user_id=current_user.id,
+            violation_type='max_travelers_exceeded',
+            details=f'Attempted to create itinerary for {total_travelers} travelers (limit: {current_user.max_travelers})'
+        )
+        db.session.add(violation)
+        db.session.commit()
+
+        return [f'Your current plan allows a maximum of {current_user.max_travelers} travelers. Please upgrade your plan for larger groups.'], True
+
+    # Validate infants limit
+    if num_infants > current_user.max_infants:
+        return [f'Your current plan allows a maximum of {current_user.max_infants} infants.'], False
+
+    # Validate trip duration
+    trip_duration = (form.end_date.data - form.start_date.data).days + 1
+    if trip_duration > current_user.max_duration:
+        violation = AccessViolation(
+            user_id=current_user.id,
+            violation_type='max_duration_exceeded',
+            details=f'Attempted to create {trip_duration}-day itinerary (limit: {current_user.max_duration} days)'
+        )
+        db.session.add(violation)
+        db.session.commit()
+
+        return [f'Your current plan allows a maximum trip duration of {current_user.max_duration} days. Please upgrade your plan for longer trips.'], True
+
+    # Validate budget and duration
+    is_valid, messages = validate_budget_and_duration(
+        form.destinations.data,
+        form.budget.data,
+        total_travelers,
+        form.start_date.data,
+        form.end_date.data,
+        form.include_flights.data,
+        form.include_accommodation.data,
+        form.need_guide.data
+    )
+
+    if not is_valid:
+        return messages, False
+
+    return [], False
+
+def reserve_itinerary_credit(user):
+    """Count a queued generation against the user's monthly quota before it runs.
+
+    The increment is conditional in SQL so concurrent requests cannot pass
+    the limit. Returns False when no credit is left.
+    """
+    used = db.func.coalesce(User.itineraries_generated_this_month, 0)
+    query = User.query.filter_by(id=user.id)
+    if user.max_itineraries_per_month != float('inf'):
+        query = query.filter(used < user.max_itineraries_per_month)
+    reserved = query.update({User.itineraries_generated_this_month: used + 1}, synchronize_session=False)
+    if reserved and not user.last_reset_date:
+        user.last_reset_date = datetime.utcnow()
+    db.session.commit()
+    return bool(reserved)
+
+def release_itinerary_credit(user_id):
+    """Give back a credit reserved by reserve_itinerary_credit; the caller commits"""
+    User.query.filter(User.id == user_id, User.itineraries_generated_this_month > 0).update(
+        {User.itineraries_generated_this_month: User.itineraries_generated_this_month - 1},
+        synchronize_session=False)
+
+def create_itinerary_record(form, content, plan=None, credit_reserved=False):
+    """Persist a generated itinerary and count it against the monthly quota.
+
+    plan is the TripPlan from structured generation, stored alongside.
+    Fallback itineraries served while OpenAI is unavailable are not counted.
+    credit_reserved means the quota was already charged when the job was queued.
+    """
+    itinerary = Itinerary(
+        user_id=current_user.id,
+        destination=form.destinations.data,
+        specific_locations=form.specific_locations.data,
+        travel_focus=form.travel_focus.data,
+        budget=form.budget.data,
+        currency=form.currency.data,
+        include_flights=form.include_flights.data,
+        include_accommodation=form.include_accommodation.data,
+        num_adults=form.num_adults.data,
+        num_youth=form.num_youth.data,
+        num_children=form.num_children.data,
+        num_infants=form.num_infants.data,
+        accommodation_location=form.accommodation_location.data,
+        accommodation_name=form.accommodation_name.data,
+        need_guide=form.need_guide.data,
+        halal_food=form.halal_food.data,
+        vegan_food=form.vegan_food.data,
+        start_date=form.start_date.data,
+        end_date=form.end_date.data,
+        content=content,
+        citizenship=form.citizenship.data
+    )
+
+    logger.info(f"Creating new itinerary for user {current_user.id}")
+    db.session.add(itinerary)
+
+    if plan is not None:
+        db.session.add(StructuredItinerary(
+            itinerary=itinerary,
+            schema_version=SCHEMA_VERSION,
+            currency=plan.currency,
+            data=plan.to_dict()
+        ))
+
+    # Update user's monthly usage
+    if is_degraded_itinerary(content):
+        logger.info(f"Not counting fallback itinerary against user {current_user.id}'s quota")
+        if credit_reserved:
+            release_itinerary_credit(current_user.id)
+    elif not credit_reserved:
+        current_user.itineraries_generated_this_month += 1
+        if not current_user.last_reset_date:
+            current_user.last_reset_date = datetime.utcnow()
+
+    db.session.commit()
+    logger.info(f"Successfully created itinerary {itinerary.id}")
+    return itinerary
+
+def generate_itinerary_content(form):
+    """Generate an itinerary as (content, plan); plan is None unless structured mode is on"""
+    if STRUCTURED_ENABLED:
+        return generate_structured_itinerary(form)
+    return generate_itinerary(form), None
+
+def get_display_plan(itinerary, currency):
+    """The itinerary's TripPlan converted to currency, or None if it has no structured form"""
+    if not itinerary.structured:
+        return None
+    plan = itinerary.structured.plan
+    rates = get_rates()
+    if currency and currency != plan.currency and currency in rates and plan.currency in rates:
+        plan = convert_trip_plan(plan, currency, get_conversion_rate(plan.currency, currency))
+    return plan
+
+def format_sse(event, data):
+    """Format a Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @main_views.route('/itinerary', methods=['GET', 'POST'])
 @login_required
 @check_subscription_limits
 def itinerary_form():
     try:
-        # Initial phone number check
-        if not current_user.phone_number:
-            flash('Please add your phone number to your profile before creating an itinerary.', 'warning')
-            return redirect(url_for('main_views.profile'))
-
-        # Check rate limiting from cache
         cache_key = f"rate_limit:user:{current_user.id}"
-        if cache_manager.exists(cache_key):
-            flash('Please wait a moment before generating another itinerary.', 'warning')
-            return redirect(url_for('main_views.index'))
-
-        # Monthly limit check with violation tracking
-        if current_user.itineraries_generated_this_month >= current_user.max_itineraries_per_month:
-            violation = AccessViolation(
-                user_id=current_user.id,
-                violation_type='monthly_limit_exceeded',
-                details=f'Attempted to exceed monthly limit of {current_user.max_itineraries_per_month} itineraries'
-            )
-            db.session.add(violation)
-            db.session.commit()
-
-            flash(f'You have reached your monthly limit of {current_user.max_itineraries_per_month} itineraries. Please upgrade your plan to create more.', 'warning')
-            return redirect(url_for('main_views.pricing'))
+        blocked = get_generation_block(cache_key)
+        if blocked:
+            message, endpoint = blocked
+            flash(message, 'warning')
+            return redirect(url_for(endpoint))
 
         form = ItineraryForm()
 
@@ -337,61 +538,12 @@ def itinerary_form():
             # Update exchange rates if needed
             update_exchange_rates()
 
-            total_travelers = (
-                form.num_adults.data +
-                form.num_youth.data +
-                form.num_children.data
-            )
-            num_infants = form.num_infants.data
-
-            # Validate against plan limits with violation tracking
-            if total_travelers > current_user.max_travelers:
-                violation = AccessViolation(
-                    user_id=current_user.id,
-                    violation_type='max_travelers_exceeded',
-                    details=f'Attempted to create itinerary for {total_travelers} travelers (limit: {current_user.max_travelers})'
-                )
-                db.session.add(violation)
-                db.session.commit()
-
-                flash(f'Your current plan allows a maximum of {current_user.max_travelers} travelers. Please upgrade your plan for larger groups.', 'warning')
-                return redirect(url_for('main_views.pricing'))
-
-            # Validate infants limit
-            if num_infants > current_user.max_infants:
-                flash(f'Your current plan allows a maximum of {current_user.max_infants} infants.', 'warning')
-                return render_template('itinerary_form.html', form=form, 
-                                    openai_api_available=openai_api_available)
-
-            # Validate trip duration
-            trip_duration = (form.end_date.data - form.start_date.data).days + 1
-            if trip_duration > current_user.max_duration:
-                violation = AccessViolation(
-                    user_id=current_user.id,
-                    violation_type='max_duration_exceeded',
-                    details=f'Attempted to create {trip_duration}-day itinerary (limit: {current_user.max_duration} days)'
-                )
-                db.session.add(violation)
-                db.session.commit()
-
-                flash(f'Your current plan allows a maximum trip duration of {current_user.max_duration} days. Please upgrade your plan for longer trips.', 'warning')
-                return redirect(url_for('main_views.pricing'))
-
-            # Validate budget and duration
-            is_valid, messages = validate_budget_and_duration(
-                form.destinations.data,
-                form.budget.data,
-                total_travelers,
-                form.start_date.data,
-                form.end_date.data,
-                form.include_flights.data,
-                form.include_accommodation.data,
-                form.need_guide.data
-            )
-
-            if not is_valid:
+            messages, needs_upgrade = check_plan_limits(form)
+            if messages:
                 for message in messages:
                     flash(message, 'warning')
+                if needs_upgrade:
+                    return redirect(url_for('main_views.pricing'))
                 return render_template('itinerary_form.html', form=form,
                                     openai_api_available=openai_api_available)
 
@@ -400,48 +552,31 @@ def itinerary_form():
                 flash('Cannot generate itinerary at this time. The service is temporarily unavailable.', 'danger')
                 return redirect(url_for('main_views.itinerary_form'))
 
+            # Hand generation to the worker pool when background jobs are enabled
+            if current_app.config.get('ITINERARY_JOBS_ENABLED'):
+                cache_manager.set(cache_key, 1, timeout=30)  # 30 seconds cooldown
+                # Charge the quota now; the worker gives the credit back if the job fails
+                if not reserve_itinerary_credit(current_user):
+                    flash(f'You have reached your monthly limit of {current_user.max_itineraries_per_month} itineraries. Please upgrade your plan to create more.', 'warning')
+                    return redirect(url_for('main_views.pricing'))
+                try:
+                    job_id = get_job_queue().enqueue(current_user.id, prepare_cache_data(form))
+                except Exception:
+                    release_itinerary_credit(current_user.id)
+                    db.session.commit()
+                    raise
+                return render_template('itinerary_pending.html', job_id=job_id)
+
             try:
                 # Set rate limiting in cache
                 cache_manager.set(cache_key, 1, timeout=30)  # 30 seconds cooldown
 
                 # Generate itinerary content
-                content = generate_itinerary(form)
-
-                # Create itinerary object
-                itinerary = Itinerary(
-                    user_id=current_user.id,
-                    destination=form.destinations.data,
-                    specific_locations=form.specific_locations.data,
-                    travel_focus=form.travel_focus.data,
-                    budget=form.budget.data,
-                    currency=form.currency.data,
-                    include_flights=form.include_flights.data,
-                    include_accommodation=form.include_accommodation.data,
-                    num_adults=form.num_adults.data,
-                    num_youth=form.num_youth.data,
-                    num_children=form.num_children.data,
-                    num_infants=form.num_infants.data,
-                    accommodation_location=form.accommodation_location.data,
-                    accommodation_name=form.accommodation_name.data,
-                    need_guide=form.need_guide.data,
-                    halal_food=form.halal_food.data,
-                    vegan_food=form.vegan_food.data,
-                    start_date=form.start_date.data,
-                    end_date=form.end_date.data,
-                    content=content,
-                    citizenship=form.citizenship.data
-                )
-
-                logger.info(f"Creating new itinerary for user {current_user.id}")
-                db.session.add(itinerary)
+                content, plan = generate_itinerary_content(form)
 
-                # Update user's monthly usage
-                current_user.itineraries_generated_this_month += 1
-                if not current_user.last_reset_date:
-                    current_user.last_reset_date = datetime.utcnow()
-
-                db.session.commit()
-                logger.info(f"Successfully created itinerary {itinerary.id}")
+                itinerary = create_itinerary_record(form, content, plan)
+                if is_degraded_itinerary(content):
+                    flash('Our itinerary planner is busy, so this is a simplified plan. It does not count toward your monthly limit.', 'warning')
 
                 # Track GPT model usage for analytics
                 model_used = GPTModelHandler.get_model_for_user()
@@ -449,6 +584,7 @@ def itinerary_form():
 
                 return render_template('itinerary_result.html', 
                                     itinerary=itinerary,
+                                    revision_form=DayRevisionForm(),
                                     currency_info=get_currency_info(itinerary.currency))
 
             except Exception as e:
@@ -474,6 +610,190 @@ def itinerary_form():
         flash('An unexpected error occurred. Please try again.', 'danger')
         return redirect(url_for('main_views.index'))
 
+@main_views.route('/itinerary/stream', methods=['POST'])
+@login_required
+@check_subscription_limits
+def itinerary_stream():
+    """Generate an itinerary and push tokens to the browser over Server-Sent Events"""
+    cache_key = f"rate_limit:user:{current_user.id}"
+    blocked = get_generation_block(cache_key)
+    if blocked:
+        message, endpoint = blocked
+        return jsonify({'error': message, 'redirect': url_for(endpoint)}), 429
+
+    form = ItineraryForm()
+    if not form.validate_on_submit():
+        return jsonify({'error': 'Invalid itinerary request', 'fields': form.errors}), 400
+
+    update_exchange_rates()
+
+    messages, needs_upgrade = check_plan_limits(form)
+    if messages:
+        return jsonify({
+            'error': messages[0],
+            'messages': messages,
+            'redirect': url_for('main_views.pricing') if needs_upgrade else None
+        }), 403 if needs_upgrade else 400
+
+    if not is_openai_available():
+        return jsonify({'error': 'Cannot generate itinerary at this time. The service is temporarily unavailable.'}), 503
+
+    cache_manager.set(cache_key, 1, timeout=30)  # 30 seconds cooldown
+
+    def generate():
+        chunks = []
+        try:
+            for chunk in stream_itinerary(form):
+                chunks.append(chunk)
+                yield format_sse('token', {'content': chunk})
+
+            content = post_process_itinerary(''.join(chunks), form)
+            itinerary = create_itinerary_record(form, content)
+            yield format_sse('done', {
+                'itinerary_id': itinerary.id,
+                'url': url_for('main_views.view_itinerary', itinerary_id=itinerary.id)
+            })
+
+        except Exception as e:
+            logger.error(f"Error streaming itinerary: {str(e)}", exc_info=True)
+            db.session.rollback()
+            yield format_sse('error', {'error': 'Error generating itinerary. Please try again.'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@main_views.route('/itinerary/<int:itinerary_id>')
+@login_required
+def view_itinerary(itinerary_id):
+    """Show a previously generated itinerary owned by the current user"""
+    itinerary = Itinerary.query.filter_by(id=itinerary_id, user_id=current_user.id).first()
+    if not itinerary:
+        abort(404)
+
+    # Structured itineraries can be shown in another currency without regenerating
+    plan = get_display_plan(itinerary, request.args.get('currency', '').upper())
+    if plan is not None:
+        return render_template('itinerary_result.html',
+                            itinerary=itinerary,
+                            content=render_markdown(plan),
+                            revision_form=DayRevisionForm(),
+                            currency_info=get_currency_info(plan.currency))
+
+    return render_template('itinerary_result.html',
+                        itinerary=itinerary,
+                        revision_form=DayRevisionForm(),
+                        currency_info=get_currency_info(itinerary.currency))
+
+@main_views.route('/itinerary/<int:itinerary_id>/days/<int:day_number>/regenerate', methods=['POST'])
+@login_required
+def regenerate_itinerary_day(itinerary_id, day_number):
+    """Rewrite one day of a stored itinerary; does not use a monthly itinerary credit"""
+    itinerary = Itinerary.query.filter_by(id=itinerary_id, user_id=current_user.id).first()
+    if not itinerary:
+        abort(404)
+    redirect_to_itinerary = redirect(url_for('main_views.view_itinerary', itinerary_id=itinerary.id))
+
+    revision_form = DayRevisionForm()
+    if not revision_form.validate_on_submit():
+        flash('Please describe the change you want (up to 500 characters).', 'warning')
+        return redirect_to_itinerary
+
+    # SET NX, so concurrent requests cannot all pass the cooldown
+    cache_key = f"rate_limit:user:{current_user.id}"
+    if cache_manager.add(cache_key, 1, timeout=10) is False:  # 10 seconds cooldown
+        flash('Please wait a moment before changing your itinerary again.', 'warning')
+        return redirect_to_itinerary
+
+    if not is_openai_available():
+        flash('Cannot change the itinerary at this time. The service is temporarily unavailable.', 'danger')
+        return redirect_to_itinerary
+
+    # Reserve one of today's revisions; it is given back unless the day is changed
+    revisions_key = f"day_revisions:{itinerary.id}"
+    revisions = cache_manager.increment(revisions_key) or 0
+    if revisions == 1:
+        cache_manager.expire(revisions_key, 86400)
+    if revisions > DAY_REVISIONS_PER_DAY:
+        cache_manager.decrement(revisions_key)
+        flash(f'You can change up to {DAY_REVISIONS_PER_DAY} days of an itinerary per day. Please try again tomorrow.', 'warning')
+        return redirect_to_itinerary
+
+    revised = False
+    try:
+        form = ItineraryForm(formdata=None, data=form_data_from_request(request_data_from_itinerary(itinerary)),
+                             meta={'csrf': False})
+        change_request = revision_form.change_request.data
+
+        if itinerary.structured:
+            plan = regenerate_structured_day(form, itinerary.structured.plan, day_number, change_request)
+            itinerary.structured.data = plan.to_dict()
+            itinerary.content = render_markdown(plan)
+        else:
+            itinerary.content = regenerate_day(form, itinerary.content, day_number, change_request)
+
+        db.session.commit()
+        revised = True
+        logger.info(f"Regenerated day {day_number} of itinerary {itinerary.id} for user {current_user.id}")
+        flash(f'Day {day_number} has been updated.', 'success')
+
+    except CircuitOpenError:
+        flash('Our itinerary planner is busy right now. Please try changing this day again shortly.', 'warning')
+    except ValueError as e:
+        logger.warning(f"Cannot regenerate day {day_number} of itinerary {itinerary.id}: {str(e)}")
+        db.session.rollback()
+        flash(f'Day {day_number} could not be changed in this itinerary.', 'warning')
+    except Exception as e:
+        logger.error(f"Error regenerating day {day_number} of itinerary {itinerary.id}: {str(e)}", exc_info=True)
+        db.session.rollback()
+        flash('Error changing the itinerary. Please try again.', 'danger')
+
+    if not revised:
+        cache_manager.decrement(revisions_key)
+    return redirect_to_itinerary
+
+@main_views.route('/api/itinerary/<int:itinerary_id>/structured', methods=['GET'])
+@login_required
+def structured_itinerary(itinerary_id):
+    """The structured itinerary as JSON, optionally converted with ?currency="""
+    itinerary = Itinerary.query.filter_by(id=itinerary_id, user_id=current_user.id).first()
+    if not itinerary or not itinerary.structured:
+        return jsonify({'error': 'Structured itinerary not found'}), 404
+
+    plan = get_display_plan(itinerary, request.args.get('currency', '').upper())
+    return jsonify(plan.to_dict())
+
+@main_views.route('/api/itinerary/jobs/<job_id>', methods=['GET'])
+@login_required
+def itinerary_job_status(job_id):
+    """Report the status of a queued itinerary generation job"""
+    try:
+        job = get_job_queue().get_status(job_id)
+        if not job or job.get('user_id') != str(current_user.id):
+            return jsonify({'error': 'Job not found'}), 404
+
+        response = {
+            'job_id': job_id,
+            'status': job['status'],
+            'created_at': job.get('created_at'),
+            'updated_at': job.get('updated_at')
+        }
+        if job['status'] == STATUS_COMPLETED:
+            response['itinerary_id'] = int(job['itinerary_id'])
+            response['url'] = url_for('main_views.view_itinerary', itinerary_id=response['itinerary_id'])
+        elif job['status'] == STATUS_FAILED:
+            response['error'] = job.get('error')
+
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error getting itinerary job status: {str(e)}")
+        return jsonify({'error': 'Failed to get job status'}), 500
+
 @main_views.route('/about')
 def about():
     return render_template('about.html')